@@ -0,0 +1,256 @@
+#include "mcsplayer.h"
+
+#include <k273/util.h>
+#include <k273/logging.h>
+#include <k273/strutils.h>
+#include <k273/exception.h>
+
+#include <cmath>
+
+using namespace K273;
+using namespace GGPLib;
+using namespace MCSPlayer;
+
+///////////////////////////////////////////////////////////////////////////////
+
+Player::Player(StateMachineInterface* sm, int our_role_index,
+               double max_run_time, long max_iterations, double ucb_constant) :
+    PlayerBase(sm, our_role_index),
+    max_run_time(max_run_time),
+    max_iterations(max_iterations),
+    ucb_constant(ucb_constant),
+    rollout(nullptr),
+    current_state(nullptr),
+    next_state(nullptr),
+    joint_move(nullptr) {
+
+    this->rollout = new DepthChargeRollout(this->sm->dupe());
+    this->current_state = this->sm->newBaseState();
+    this->next_state = this->sm->newBaseState();
+    this->joint_move = this->sm->getJointMove();
+
+    this->telemetry.reset();
+}
+
+Player::~Player() {
+    delete this->rollout;
+    free(this->current_state);
+    free(this->next_state);
+    free(this->joint_move);
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+int Player::selectMove(int root_visits) {
+    // here we build up a list of possible candidates, and then return one of them randomly.
+    // Most of the time there will only be one candidate.
+    this->candidates.clear();
+
+    // add any choices, where it hasn't played at least 3 times
+    for (int ii=0; ii<(int) this->root.size(); ii++) {
+        if (this->root[ii].visits < 3) {
+            this->candidates.push_back(ii);
+        }
+    }
+
+    if (this->candidates.empty()) {
+        double best_score = -1;
+        const double log_visits = std::log(root_visits);
+
+        for (int ii=0; ii<(int) this->root.size(); ii++) {
+            const MoveStat& stat = this->root[ii];
+
+            // we can be assured that having no candidates means stat.visits >= 3
+            const double score = (stat.get(this->our_role_index) +
+                                  this->ucb_constant * std::sqrt(log_visits / stat.visits));
+            if (score < best_score) {
+                continue;
+            }
+
+            if (score > best_score) {
+                best_score = score;
+                this->candidates.clear();
+            }
+
+            this->candidates.push_back(ii);
+        }
+    }
+
+    ASSERT (!this->candidates.empty());
+    return this->candidates[this->random.getWithMax(this->candidates.size())];
+}
+
+void Player::performMcs(double end_time) {
+    const int role_count = this->sm->getRoleCount();
+    const double start_time = get_time();
+
+    this->current_state->assign(this->sm->getCurrentState());
+
+    this->root.clear();
+    LegalState* ls = this->sm->getLegalState(this->our_role_index);
+    for (int ii=0; ii<ls->getCount(); ii++) {
+        MoveStat stat;
+        stat.choice = ls->getLegal(ii);
+        stat.visits = 0;
+        stat.scores.resize(role_count, 0.0);
+        this->root.push_back(stat);
+    }
+
+    int root_visits = 1;
+    while (true) {
+        // only check the time every so often (and publish the best choice, in case the caller
+        // has to send a move before we return)
+        if (root_visits % 16 == 0) {
+            this->setBestChoiceSoFar(this->bestChoice());
+            if (get_time() > end_time) {
+                break;
+            }
+        }
+
+        if (this->max_iterations > 0 && root_visits > this->max_iterations) {
+            break;
+        }
+
+        if (this->root.size() == 1 && root_visits > 100) {
+            break;
+        }
+
+        // return to current state
+        this->sm->updateBases(this->current_state);
+        ASSERT (!this->sm->isTerminal());
+
+        // select and set our move, and a random move for the other players
+        const int index = this->selectMove(root_visits);
+        MoveStat& stat = this->root[index];
+
+        for (int ri=0; ri<role_count; ri++) {
+            if (ri == this->our_role_index) {
+                this->joint_move->set(ri, stat.choice);
+            } else {
+                LegalState* other = this->sm->getLegalState(ri);
+                this->joint_move->set(ri, other->getLegal(this->random.getWithMax(other->getCount())));
+            }
+        }
+
+        // create a new state, and do a depth charge from it
+        this->sm->nextState(this->joint_move, this->next_state);
+        this->sm->updateBases(this->next_state);
+
+        if (this->sm->isTerminal()) {
+            for (int ri=0; ri<role_count; ri++) {
+                stat.scores[ri] += this->sm->getGoalValue(ri);
+            }
+
+        } else {
+            this->rollout->doRollout(this->next_state, 0);
+            for (int ri=0; ri<role_count; ri++) {
+                stat.scores[ri] += this->rollout->getScore(ri);
+            }
+        }
+
+        stat.visits++;
+
+        // and update the number of visits
+        root_visits++;
+    }
+
+    // leave the statemachine as we found it
+    this->sm->updateBases(this->current_state);
+
+    const double search_time = get_time() - start_time;
+    K273::l_debug("Total visits: %d in %.2f seconds (%.1f p/sec)",
+                  root_visits, search_time, root_visits / std::max(search_time, 0.001));
+
+    this->telemetry.reset();
+    this->telemetry.search_time = search_time;
+    this->telemetry.rollouts = root_visits - 1;
+    this->telemetry.tree_playouts = root_visits - 1;
+
+    for (const MoveStat& stat : this->root) {
+        this->telemetry.children.push_back({stat.choice, stat.visits, stat.get(this->our_role_index)});
+    }
+}
+
+int Player::bestChoice() const {
+    double best_score = -1;
+    int best_choice = -1;
+    for (const MoveStat& stat : this->root) {
+        const double score = stat.get(this->our_role_index);
+        if (score > best_score) {
+            best_score = score;
+            best_choice = stat.choice;
+        }
+    }
+
+    return best_choice;
+}
+
+int Player::choose() {
+    const int role_count = this->sm->getRoleCount();
+
+    double best_score = -1;
+    const MoveStat* best_selection = nullptr;
+
+    for (const MoveStat& stat : this->root) {
+        std::string score_str;
+        for (int ri=0; ri<role_count; ri++) {
+            if (ri > 0) {
+                score_str += " / ";
+            }
+
+            score_str += K273::fmtString("%.2f", stat.get(ri));
+        }
+
+        K273::l_info("Move %s, visits %d, scored %s",
+                     this->sm->legalToMove(this->our_role_index, stat.choice),
+                     stat.visits, score_str.c_str());
+
+        const double score = stat.get(this->our_role_index);
+        if (score > best_score) {
+            best_score = score;
+            best_selection = &stat;
+        }
+    }
+
+    ASSERT (best_selection != nullptr);
+    return best_selection->choice;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+std::string Player::beforeApplyInfo() {
+    std::string res = "{\"candidates\": [";
+    for (int ii=0; ii<(int) this->root.size(); ii++) {
+        const MoveStat& stat = this->root[ii];
+        if (ii > 0) {
+            res += ", ";
+        }
+
+        res += K273::fmtString("{\"choice\": %d, \"visits\": %d, \"score\": %.4f}",
+                               stat.choice, stat.visits, stat.get(this->our_role_index));
+    }
+
+    res += "]}";
+    return res;
+}
+
+void Player::onApplyMove(JointMove* move) {
+    this->root.clear();
+}
+
+int Player::onNextMove(double end_time) {
+    this->setBestChoiceSoFar(-1);
+
+    const double enter_time = get_time();
+    if (this->max_run_time > 0 && enter_time + this->max_run_time < end_time) {
+        end_time = enter_time + this->max_run_time;
+    }
+
+    // run monte carlo sims
+    this->performMcs(end_time);
+    return this->choose();
+}
+
+const Telemetry* Player::getTelemetry() const {
+    return &this->telemetry;
+}
@@ -0,0 +1,70 @@
+#pragma once
+
+#include "player/player.h"
+#include "player/rollout.h"
+
+#include "statemachine/basestate.h"
+#include "statemachine/jointmove.h"
+#include "statemachine/statemachine.h"
+
+#include <k273/util.h>
+
+#include <vector>
+
+namespace MCSPlayer {
+
+    class Player : public GGPLib::PlayerBase {
+        /* Flat monte carlo search, with UCB1 selection at the root (see player/mcs.py). */
+
+    public:
+        Player(GGPLib::StateMachineInterface* sm, int our_role_index,
+               double max_run_time, long max_iterations, double ucb_constant);
+        virtual ~Player();
+
+    private:
+        struct MoveStat {
+            int choice;
+            int visits;
+
+            // sum of scores for each role
+            std::vector <double> scores;
+
+            double get(int role_index) const {
+                // avoid division by zero
+                if (this->visits == 0) {
+                    return 0.0;
+                }
+
+                return (this->scores[role_index] / this->visits) / 100.0;
+            }
+        };
+
+        int selectMove(int root_visits);
+        void performMcs(double end_time);
+        int bestChoice() const;
+        int choose();
+
+    public:
+        // interface:
+        virtual std::string beforeApplyInfo();
+        virtual void onApplyMove(GGPLib::JointMove* move);
+        virtual int onNextMove(double end_time);
+        virtual const GGPLib::Telemetry* getTelemetry() const;
+
+    private:
+        double max_run_time;
+        long max_iterations;
+        double ucb_constant;
+
+        GGPLib::DepthChargeRollout* rollout;
+        GGPLib::BaseState* current_state;
+        GGPLib::BaseState* next_state;
+        GGPLib::JointMove* joint_move;
+
+        std::vector <MoveStat> root;
+        std::vector <int> candidates;
+
+        GGPLib::Telemetry telemetry;
+        K273::Random random;
+    };
+}
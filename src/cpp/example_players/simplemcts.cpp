@@ -8,6 +8,8 @@
 #include <k273/exception.h>
 
 #include <cmath>
+#include <cstring>
+#include <algorithm>
 #include <unistd.h>
 
 using namespace K273;
@@ -19,21 +21,55 @@ using namespace GGPLib::SimpleMcts;
 Player::Player(StateMachineInterface* sm, int player_role_index, Config* config) :
     PlayerBase(sm, player_role_index),
     config(config),
+    search_sm(nullptr),
     rollout(nullptr),
     static_base_state(nullptr),
+    replay_base_state(nullptr),
+    rollout_pool(nullptr),
+    time_manager(nullptr),
     root(nullptr),
     number_of_nodes(0),
-    node_allocated_memory(0) {
-
+    number_of_decoupled_nodes(0),
+    node_allocated_memory(0),
+    leaf_evaluator(nullptr),
+    evaluation_batch_size(0),
+    evaluation_policy_size(0),
+    virtual_loss(0),
+    state_byte_count(0),
+    amaf_stamp(0),
+    ponder_thread(nullptr),
+    ponder_stop(false),
+    ponder_start_time(0.0) {
+
+    this->search_sm = this->sm->dupe();
     this->rollout = new DepthChargeRollout(this->sm->dupe());
     this->static_base_state = this->sm->newBaseState();
+    this->replay_base_state = this->sm->newBaseState();
+    this->state_byte_count = this->static_base_state->byte_count * BaseState::ARRAYTYPE_BYTES;
+
+    if (this->config->rollout_threads > 0) {
+        this->rollout_pool = new RolloutWorkerPool(this->sm, this->config->rollout_threads);
+    }
+
+    if (this->config->adaptive_time) {
+        this->time_manager = new TimeManager(this->config->min_search_fraction,
+                                             this->config->dominant_visit_share);
+    }
+
+    this->amaf_seen.resize(this->sm->getRoleCount());
 
     this->playout_stats.reset();
+    this->telemetry.reset();
 }
 
 Player::~Player() {
+    this->stopPondering();
+
     delete this->rollout;
+    delete this->rollout_pool;
+    delete this->time_manager;
     free(this->static_base_state);
+    free(this->replay_base_state);
 
     if (this->root != nullptr) {
         this->removeNode(this->root);
@@ -48,28 +84,68 @@ Player::~Player() {
         K273::l_warning("Leaked memory %ld", this->node_allocated_memory);
     }
 
+    delete this->search_sm;
     delete this->config;
 }
 
 ///////////////////////////////////////////////////////////////////////////////
 
+void Player::setLeafEvaluator(LeafEvaluator evaluator, int batch_size, int policy_size, int virtual_loss) {
+    this->stopPondering();
+
+    const int role_count = this->sm->getRoleCount();
+    batch_size = std::max(1, batch_size);
+
+    this->leaf_evaluator = evaluator;
+    this->evaluation_batch_size = batch_size;
+    this->evaluation_policy_size = policy_size;
+    this->virtual_loss = virtual_loss;
+
+    this->batch_paths.resize(batch_size);
+    this->batch_states.resize(batch_size * this->state_byte_count);
+    this->batch_values.resize(batch_size * role_count);
+    this->batch_priors.resize(batch_size * role_count * policy_size);
+
+    // any existing tree has no priors
+    if (this->root != nullptr) {
+        this->removeNode(this->root);
+        this->root = nullptr;
+    }
+
+    K273::l_info("SimpleMCTS: leaf evaluator batch size %d, policy size %d, virtual loss %d",
+                 batch_size, policy_size, virtual_loss);
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
 Node* Player::createNode(const BaseState* bs) {
     // update the statemachine
-    this->sm->updateBases(bs);
+    this->search_sm->updateBases(bs);
 
-    const int role_count = this->sm->getRoleCount();
+    // decoupled nodes move their children in memory as they are created, which would invalidate
+    // the paths waiting on a batched evaluation
+    const bool evaluated = this->leaf_evaluator != nullptr;
+
+    const int role_count = this->search_sm->getRoleCount();
     Node* new_node = Node::create(role_count,
                                   this->our_role_index,
-                                  0,  // ucb_constant not used
                                   bs,
-                                  this->sm);
+                                  this->search_sm,
+                                  this->config->decoupled && !evaluated,
+                                  this->config->compact_basestates,
+                                  this->config->rave_equivalence > 0,
+                                  evaluated);
 
     this->number_of_nodes++;
+    if (new_node->is_decoupled) {
+        this->number_of_decoupled_nodes++;
+    }
+
     this->node_allocated_memory += new_node->allocated_size;
 
     if (new_node->is_finalised) {
         for (int ii=0; ii<role_count; ii++) {
-            int score = this->sm->getGoalValue(ii);
+            int score = this->search_sm->getGoalValue(ii);
             new_node->setScore(ii, score / 100.0);
         }
     }
@@ -91,76 +167,373 @@ void Player::removeNode(Node* node) {
     }
 
     this->node_allocated_memory -= node->allocated_size;
+    if (node->is_decoupled) {
+        this->number_of_decoupled_nodes--;
+    }
 
-    free(node);
+    Node::release(node);
     this->number_of_nodes--;
 }
 
 ///////////////////////////////////////////////////////////////////////////////
 
+// Scans [start, end) of the child statistics.  Nothing but contiguous floats are touched, so the
+// compiler is free to vectorise it.  While exploring, every child is scored as unvisited.
+template <bool Exploring>
+static void bestUcbChild(const Score* child_scores, const float* child_inv_sqrts, const float exploration,
+                         int start, int end, float& best_score, int& best_index) {
+    for (int ii=start; ii<end; ii++) {
+        const float search_score = Exploring ? 1.0f : child_scores[ii];
+        const float score = search_score + exploration * child_inv_sqrts[ii];
+        if (score > best_score) {
+            best_score = score;
+            best_index = ii;
+        }
+    }
+}
+
+// As bestUcbChild(), but the child's score is blended with its amaf score.  The weight of the amaf
+// score falls away as the child is visited: beta = sqrt(k / (3n + k)).
+static void bestRaveChild(const Score* child_scores, const float* child_inv_sqrts,
+                          const Score* amaf_scores, const float* amaf_visits,
+                          const float equivalence, const float exploration,
+                          int start, int end, float& best_score, int& best_index) {
+    for (int ii=start; ii<end; ii++) {
+        const float visits = 1.0f / (child_inv_sqrts[ii] * child_inv_sqrts[ii]) - 1.0f;
+        const float beta = std::sqrt(equivalence / (3.0f * visits + equivalence));
+        const float amaf_score = amaf_visits[ii] > 0.0f ? amaf_scores[ii] : child_scores[ii];
+
+        const float search_score = (1.0f - beta) * child_scores[ii] + beta * amaf_score;
+        const float score = search_score + exploration * child_inv_sqrts[ii];
+        if (score > best_score) {
+            best_score = score;
+            best_index = ii;
+        }
+    }
+}
+
+// PUCT: the exploration of each child is in proportion to its prior, and falls away with visits
+// (1 / (visits + 1), which is the square of the inverse sqrt).
+static void bestPuctChild(const Score* child_scores, const float* child_inv_sqrts, const float* child_priors,
+                          const float exploration, int start, int end, float& best_score, int& best_index) {
+    for (int ii=start; ii<end; ii++) {
+        const float inv_visits = child_inv_sqrts[ii] * child_inv_sqrts[ii];
+        const float score = child_scores[ii] + exploration * child_priors[ii] * inv_visits;
+        if (score > best_score) {
+            best_score = score;
+            best_index = ii;
+        }
+    }
+}
+
 void Player::selectChild(Node* node) {
     ASSERT (!node->is_finalised);
 
+    if (node->is_decoupled) {
+        this->selectDecoupledChild(node);
+        return;
+    }
+
     const int role_count = this->sm->getRoleCount();
-    int lead_role_index = node->lead_role_index;
-    if (lead_role_index < 0) {
-        lead_role_index = this->our_role_index;
+    const int random_counts = std::max(this->config->select_random_move_count, node->num_children / 4);
+
+    const Score* child_scores = node->getChildScores();
+    const float* child_inv_sqrts = node->getChildInvSqrts();
+    const float exploration = this->config->ucb_constant * node->sqrt_log_visits;
+
+    // scan from a random start, so ties are broken randomly
+    const int start = this->random.getWithMax(node->num_children);
+
+    float best_score = -1000000;
+    int best_index = -1;
+
+    if (node->has_priors) {
+        const float* child_priors = node->getChildPriors();
+        const float total_visits = node->visits + node->inflight_visits * (float) this->virtual_loss;
+        const float puct_exploration = this->config->ucb_constant * std::sqrt(total_visits + 1.0f);
+
+        bestPuctChild(child_scores, child_inv_sqrts, child_priors, puct_exploration,
+                      start, node->num_children, best_score, best_index);
+        bestPuctChild(child_scores, child_inv_sqrts, child_priors, puct_exploration,
+                      0, start, best_score, best_index);
+
+    } else if (node->visits > random_counts && node->has_amaf) {
+        const Score* amaf_scores = node->getChildAmafScores();
+        const float* amaf_visits = node->getChildAmafVisits();
+        const float equivalence = this->config->rave_equivalence;
+
+        bestRaveChild(child_scores, child_inv_sqrts, amaf_scores, amaf_visits, equivalence,
+                      exploration, start, node->num_children, best_score, best_index);
+        bestRaveChild(child_scores, child_inv_sqrts, amaf_scores, amaf_visits, equivalence,
+                      exploration, 0, start, best_score, best_index);
+
+    } else if (node->visits > random_counts) {
+        bestUcbChild<false>(child_scores, child_inv_sqrts, exploration,
+                            start, node->num_children, best_score, best_index);
+        bestUcbChild<false>(child_scores, child_inv_sqrts, exploration,
+                            0, start, best_score, best_index);
+
+    } else {
+        bestUcbChild<true>(child_scores, child_inv_sqrts, exploration,
+                           start, node->num_children, best_score, best_index);
+        bestUcbChild<true>(child_scores, child_inv_sqrts, exploration,
+                           0, start, best_score, best_index);
     }
 
-    double best_explore_score = -1000000;
+    ASSERT (best_index != -1);
+    this->path.add(node, node->getNodeChild(role_count, best_index));
+}
 
-    NodeChild* best_child = nullptr;
+void Player::selectDecoupledChild(Node* node) {
+    // each role selects its own move independently, using its own statistics.  The joint move
+    // child is then found/created lazily.
 
-    const int random_counts = std::max(this->config->select_random_move_count, node->num_children / 4);
+    const int role_count = this->sm->getRoleCount();
+
+    char buf[JointMove::mallocSize(role_count)];
+    JointMove* joint_move = (JointMove*) buf;
+    joint_move->setSize(role_count);
+
+    for (int ri=0; ri<role_count; ri++) {
+        double best_explore_score = -1000000;
+        const DecoupledStat* best_stat = nullptr;
+
+        for (int ii=0; ii<node->getDecoupledCount(ri); ii++) {
+            const DecoupledStat* stat = node->getDecoupledStat(role_count, ri, ii);
+
+            const double sqrt_visits = ::sqrt(stat->visits + 1);
+            const double exploration_bonus = this->config->ucb_constant * node->sqrt_log_visits / sqrt_visits;
+
+            double search_score;
+            if (stat->visits > 0) {
+                search_score = stat->score;
+
+            } else {
+                // max score, with some randomness
+                const double rand_size = 100 * (this->random.getWithMax(1000) + 1);
+                search_score = 1.0 + 1.0 / rand_size;
+            }
+
+            const double score = search_score + exploration_bonus;
+            if (score > best_explore_score) {
+                best_explore_score = score;
+                best_stat = stat;
+            }
+        }
+
+        ASSERT (best_stat != nullptr);
+        joint_move->set(ri, best_stat->legal);
+    }
+
+    const int allocated_size_before = node->allocated_size;
+    NodeChild* child = node->getOrCreateDecoupledChild(role_count, joint_move);
+    this->node_allocated_memory += node->allocated_size - allocated_size_before;
+
+    this->path.add(node, child);
+}
+
+void Player::markAmafMove(const JointMove* move) {
+    const int role_count = this->sm->getRoleCount();
+    for (int ri=0; ri<role_count; ri++) {
+        std::vector <int>& seen = this->amaf_seen[ri];
+        const int legal = move->get(ri);
+        if (legal >= (int) seen.size()) {
+            seen.resize(legal + 1, 0);
+        }
+
+        seen[legal] = this->amaf_stamp;
+    }
+}
+
+void Player::updateAmaf(Node* node, int role_index, double score) {
+    // every child whose move (for role_index) was played from here on gets the score
+    const int role_count = this->sm->getRoleCount();
+    const std::vector <int>& seen = this->amaf_seen[role_index];
+
+    Score* amaf_scores = node->getChildAmafScores();
+    float* amaf_visits = node->getChildAmafVisits();
 
     for (int ii=0; ii<node->num_children; ii++) {
-        NodeChild* c = node->getNodeChild(role_count, ii);
+        const int legal = node->getNodeChild(role_count, ii)->move.get(role_index);
+        if (legal < (int) seen.size() && seen[legal] == this->amaf_stamp) {
+            amaf_scores[ii] = (amaf_visits[ii] * amaf_scores[ii] + score) / (amaf_visits[ii] + 1.0f);
+            amaf_visits[ii] += 1.0f;
+        }
+    }
+}
 
-        const double sqrt_visits = c->to_node != nullptr ? ::sqrt(c->to_node->visits + 1) : 1;
-        const double exploration_bonus = this->config->ucb_constant * node->sqrt_log_visits / sqrt_visits;
+void Player::refreshChildStats(Node* node, const NodeChild* selection) {
+    const Node* child = selection->to_node;
+    const int lead_role_index = node->lead_role_index < 0 ? this->our_role_index : node->lead_role_index;
+    const int child_index = selection->child_index;
 
-        double search_score;
-        if (node->visits > random_counts && c->to_node != nullptr) {
-            search_score = c->to_node->getScore(lead_role_index);
+    // inflight playouts (of a batched evaluation) count as losses, so the rest of the batch is
+    // spread over the tree
+    const float visits = child->visits + child->inflight_visits * (float) this->virtual_loss;
+    if (visits > 0.0f) {
+        node->getChildScores()[child_index] = child->getScore(lead_role_index) * child->visits / visits;
+    }
 
-        } else {
-            // max score
-            search_score = 1.0;
+    node->getChildInvSqrts()[child_index] = 1.0f / std::sqrt(visits + 1.0f);
+}
 
-            // add some randomness
-            const double rand_size = 100 * (this->random.getWithMax(1000) + 1);
-            search_score = 1.0 + 1.0 / rand_size;
+void Player::addVirtualLoss(int delta) {
+    // to every node in the current path
+    for (int index=0; index<this->path.size(); index++) {
+        Path::Element* element = this->path.get(index);
+        element->node->inflight_visits += delta;
+    }
+
+    for (int index=0; index<this->path.size(); index++) {
+        Path::Element* element = this->path.get(index);
+        if (element->selection != nullptr && !element->node->is_decoupled) {
+            this->refreshChildStats(element->node, element->selection);
         }
+    }
+}
 
-        const double score = search_score + exploration_bonus;
+void Player::applyEvaluation(Node* node, const float* values, const float* priors) {
+    if (!node->has_priors) {
+        return;
+    }
 
-        if (score > best_explore_score) {
-            best_explore_score = score;
-            best_child = c;
+    const int role_count = this->sm->getRoleCount();
+    const int lead_role_index = node->lead_role_index;
+    const int policy_size = this->evaluation_policy_size;
+
+    // the prior of a joint move is that of the lead role's move (or the product, if simultaneous)
+    float* child_priors = node->getChildPriors();
+    double total = 0.0;
+    for (int ii=0; ii<node->num_children; ii++) {
+        const NodeChild* child = node->getNodeChild(role_count, ii);
+
+        float prior = 1.0f;
+        for (int ri=0; ri<role_count; ri++) {
+            if (lead_role_index != LEAD_ROLE_INDEX_SIMULTANEOUS && ri != lead_role_index) {
+                continue;
+            }
+
+            const int choice = child->move.get(ri);
+            prior *= choice < policy_size ? priors[ri * policy_size + choice] : 0.0f;
         }
+
+        child_priors[ii] = prior;
+        total += prior;
     }
 
-    this->path.add(node, best_child);
+    for (int ii=0; ii<node->num_children; ii++) {
+        child_priors[ii] = total > 0.0 ? child_priors[ii] / total : 1.0f / node->num_children;
+    }
+
+    // unvisited children start with the value of the node
+    const int score_role_index = lead_role_index < 0 ? this->our_role_index : lead_role_index;
+    Score* child_scores = node->getChildScores();
+    for (int ii=0; ii<node->num_children; ii++) {
+        if (node->getNodeChild(role_count, ii)->to_node == nullptr) {
+            child_scores[ii] = values[score_role_index];
+        }
+    }
+}
+
+void Player::backPropagateAmaf(const double* scores, const RolloutBase* trajectory) {
+    // all moves as first: the moves of the rollout (if known), and then each selection as we walk
+    // up the tree.  Once per rollout, with the scores of that rollout.
+    this->amaf_stamp++;
+    if (trajectory != nullptr) {
+        for (int ii=0; ii<trajectory->getDepth(); ii++) {
+            this->markAmafMove(trajectory->getMove(ii));
+        }
+    }
+
+    for (int index=this->path.size() - 1; index >= 0; index--) {
+        const Path::Element* element = this->path.get(index);
+        if (element->selection == nullptr) {
+            continue;
+        }
+
+        this->markAmafMove(&element->selection->move);
+
+        Node* node = element->node;
+        if (node->has_amaf) {
+            const int lead_role_index = node->lead_role_index < 0 ? this->our_role_index : node->lead_role_index;
+            this->updateAmaf(node, lead_role_index, scores[lead_role_index]);
+        }
+    }
 }
 
-void Player::backPropagate(double* new_scores) {
+void Player::backPropagate(double* new_scores, int rollout_depth, bool update_amaf) {
     const int role_count = this->sm->getRoleCount();
     const int start_index = this->path.size() - 1;
 
+    // (from the path only, inline rollouts update amaf themselves - see doPlayout())
+    if (update_amaf && this->config->rave_equivalence > 0) {
+        this->backPropagateAmaf(new_scores, nullptr);
+    }
+
+    // number of moves from the node to the end of the game, for this playout
+    int depth = rollout_depth;
+
     // back propagation:
     for (int index=start_index; index >= 0; index--) {
-        Node* node = this->path.get(index)->node;
+        const Path::Element* element = this->path.get(index);
+        Node* node = element->node;
+
+        if (node->is_decoupled && element->selection != nullptr) {
+            for (int ri=0; ri<role_count; ri++) {
+                DecoupledStat* stat = node->findDecoupledStat(role_count, ri,
+                                                              element->selection->move.get(ri));
+                ASSERT (stat != nullptr);
+                stat->score = (stat->visits * stat->score + new_scores[ri]) / (stat->visits + 1.0);
+                stat->visits++;
+            }
+
+        } else if (element->selection != nullptr) {
+            // the child has already been updated, refresh the statistics used for selection
+            this->refreshChildStats(node, element->selection);
+        }
 
         for (int ii=0; ii<role_count; ii++) {
             double score = (node->visits * node->getScore(ii) + new_scores[ii]) / (node->visits + 1.0);
             node->setScore(ii, score);
         }
 
+        node->expected_depth = (node->visits * node->expected_depth + depth) / (node->visits + 1.0);
+
         node->visits++;
         node->sqrt_log_visits = std::sqrt(std::log((double) node->visits + 1.0));
+
+        depth++;
     }
 }
 
+void Player::releaseLeafBaseState(Node* leaf) {
+    // once evaluated, the base state is only needed to expand the leaf (when it is replayed, see
+    // replayBaseState()).  Decoupled nodes expand a little at a time, so keep theirs.
+    if (!leaf->has_inline_state && !leaf->is_decoupled && leaf != this->root) {
+        this->node_allocated_memory -= leaf->releaseBaseState();
+    }
+}
+
+const BaseState* Player::replayBaseState() {
+    // the last node in the path has released its base state.  Replay the moves from the nearest
+    // node in the path that still has one (the root always does).
+    int index = this->path.size() - 1;
+    while (this->path.get(index)->node->getBaseState() == nullptr) {
+        index--;
+        ASSERT (index >= 0);
+    }
+
+    this->replay_base_state->assign(this->path.get(index)->node->getBaseState());
+
+    for (; index < this->path.size() - 1; index++) {
+        this->search_sm->updateBases(this->replay_base_state);
+        this->search_sm->nextState(&this->path.get(index)->selection->move, this->static_base_state);
+        this->replay_base_state->assign(this->static_base_state);
+    }
+
+    return this->replay_base_state;
+}
+
 int Player::treePlayout() {
     int tree_playout_depth = 0;
 
@@ -187,12 +560,18 @@ int Player::treePlayout() {
         if (current == nullptr) {
             auto* last = this->path.getLast();
 
+            const BaseState* bs = last->node->getBaseState();
+            if (bs == nullptr) {
+                bs = this->replayBaseState();
+            }
+
             // ask the statemachine for the next state
-            this->sm->updateBases(last->node->getBaseState());
-            this->sm->nextState(&last->selection->move, this->static_base_state);
+            this->search_sm->updateBases(bs);
+            this->search_sm->nextState(&last->selection->move, this->static_base_state);
 
             // create node...
             last->selection->to_node = this->createNode(this->static_base_state);
+            last->node->num_expanded++;
 
             // add the newly created node to the path (so can backPropagate)
             this->path.add(last->selection->to_node);
@@ -204,22 +583,289 @@ int Player::treePlayout() {
     return tree_playout_depth;
 }
 
+bool Player::doPlayout() {
+    // returns false if no playout was possible (the root is terminal)
+
+    if (this->leaf_evaluator != nullptr) {
+        return this->doBatchedPlayouts();
+    }
+
+    const int role_count = this->sm->getRoleCount();
+
+    // do tree playout and gather stats
+    const double tree_playout_start_time = get_time();
+    const int tree_playout_depth = this->treePlayout();
+    this->playout_stats.total_tree_playout_depth += tree_playout_depth;
+    this->playout_stats.tree_playouts++;
+    this->playout_stats.tree_playout_accumulative_time += get_time() - tree_playout_start_time;
+
+    if (tree_playout_depth == 0) {
+        return false;
+    }
+
+    ASSERT (this->path.size() >= 1);
+    Node* last = this->path.getLast()->node;
+    ASSERT (last != nullptr);
+
+    // get the scores
+    double new_scores[role_count];
+    int rollout_depth = 0;
+
+    // amaf statistics are updated once per rollout, with the moves of that rollout (only known for
+    // inline rollouts)
+    const bool rave = this->config->rave_equivalence > 0;
+    bool amaf_updated = false;
+
+    // perform a rollout from current node? (to obtain scores):
+    if (!last->is_finalised) {
+
+        // do the rollout(s) and gather stats.  With more than one rollout, the results are
+        // averaged.
+        const int number_of_rollouts = std::max(1, this->config->rollouts_per_leaf);
+        const double rollout_start_time = get_time();
+
+        if (this->rollout_pool != nullptr) {
+            this->rollout_pool->doRollouts(last->getBaseState(), number_of_rollouts);
+
+            for (int ii=0; ii<role_count; ii++) {
+                new_scores[ii] = this->rollout_pool->getAverageScore(ii) / 100.0;
+            }
+
+            rollout_depth = this->rollout_pool->getAverageDepth();
+
+        } else {
+            int depth_sum = 0;
+            for (int ii=0; ii<role_count; ii++) {
+                new_scores[ii] = 0.0;
+            }
+
+            double rollout_scores[role_count];
+            for (int jj=0; jj<number_of_rollouts; jj++) {
+                this->rollout->doRollout(last->getBaseState(), 0);
+                depth_sum += this->rollout->getDepth();
+
+                for (int ii=0; ii<role_count; ii++) {
+                    rollout_scores[ii] = this->rollout->getScore(ii) / 100.0;
+                    new_scores[ii] += rollout_scores[ii] / number_of_rollouts;
+                }
+
+                // before the next rollout overwrites the moves
+                if (rave) {
+                    this->backPropagateAmaf(rollout_scores, this->rollout);
+                }
+            }
+
+            rollout_depth = depth_sum / number_of_rollouts;
+            amaf_updated = true;
+        }
+
+        this->playout_stats.rollout_accumulative_time += get_time() - rollout_start_time;
+        this->playout_stats.rollouts += number_of_rollouts;
+
+        this->releaseLeafBaseState(last);
+
+    } else {
+        // simply set score from the finalised node
+        for (int ii=0; ii<role_count; ii++) {
+            new_scores[ii] = last->getScore(ii);
+        }
+    }
+
+    const double back_propagate_start_time = get_time();
+    this->backPropagate(new_scores, rollout_depth, !amaf_updated);
+    this->playout_stats.back_propagate_accumulative_time += get_time() - back_propagate_start_time;
+
+    return true;
+}
+
+bool Player::doBatchedPlayouts() {
+    // selects up to evaluation_batch_size new leaves (with virtual loss), evaluates them all in
+    // one call of the leaf evaluator, and then back propagates each.  Returns false if no playout
+    // was possible (the root is terminal).
+
+    const int role_count = this->sm->getRoleCount();
+    const int policy_size = this->evaluation_policy_size;
+
+    if (this->root->is_finalised) {
+        return false;
+    }
+
+    const double tree_playout_start_time = get_time();
+
+    int count = 0;
+    auto gather = [this, &count]() {
+        this->addVirtualLoss(1);
+
+        const BaseState* bs = this->path.getLast()->node->getBaseState();
+        std::memcpy(&this->batch_states[count * this->state_byte_count], bs->data, this->state_byte_count);
+
+        // the path is swapped back for back propagation
+        this->path.swap(this->batch_paths[count]);
+        count++;
+    };
+
+    if (this->root->visits == 0 && this->root->inflight_visits == 0) {
+        // the root is evaluated on its own, for its priors
+        this->path.clear();
+        this->path.add(this->root);
+        gather();
+
+    } else {
+        for (int ii=0; ii<this->evaluation_batch_size; ii++) {
+            const int tree_playout_depth = this->treePlayout();
+            this->playout_stats.total_tree_playout_depth += tree_playout_depth;
+            this->playout_stats.tree_playouts++;
+
+            Node* last = this->path.getLast()->node;
+            if (last->is_finalised) {
+                double new_scores[role_count];
+                for (int ri=0; ri<role_count; ri++) {
+                    new_scores[ri] = last->getScore(ri);
+                }
+
+                this->backPropagate(new_scores, 0, true);
+
+            } else {
+                gather();
+            }
+        }
+    }
+
+    this->playout_stats.tree_playout_accumulative_time += get_time() - tree_playout_start_time;
+
+    if (count == 0) {
+        return true;
+    }
+
+    // neutral values and no priors, if the evaluator does not fill them in
+    std::fill(this->batch_values.begin(), this->batch_values.begin() + count * role_count, 0.5f);
+    std::fill(this->batch_priors.begin(), this->batch_priors.begin() + count * role_count * policy_size, 0.0f);
+
+    const double evaluation_start_time = get_time();
+    const int evaluated = this->leaf_evaluator(count, this->batch_states.data(),
+                                               this->batch_values.data(), this->batch_priors.data());
+    this->playout_stats.rollout_accumulative_time += get_time() - evaluation_start_time;
+
+    if (!evaluated) {
+        // take back the inflight visits, rather than back propagating values that mean nothing
+        for (int ii=0; ii<count; ii++) {
+            this->path.swap(this->batch_paths[ii]);
+            this->addVirtualLoss(-1);
+        }
+
+        K273::l_error("Leaf evaluator failed, stopping search");
+        return false;
+    }
+
+    this->playout_stats.rollouts += count;
+
+    const double back_propagate_start_time = get_time();
+    for (int ii=0; ii<count; ii++) {
+        this->path.swap(this->batch_paths[ii]);
+        this->addVirtualLoss(-1);
+
+        const float* values = &this->batch_values[ii * role_count];
+        this->applyEvaluation(this->path.getLast()->node, values,
+                              &this->batch_priors[ii * role_count * policy_size]);
+        this->releaseLeafBaseState(this->path.getLast()->node);
+
+        double new_scores[role_count];
+        for (int ri=0; ri<role_count; ri++) {
+            new_scores[ri] = values[ri];
+        }
+
+        this->backPropagate(new_scores, 0, true);
+    }
+
+    this->playout_stats.back_propagate_accumulative_time += get_time() - back_propagate_start_time;
+    return true;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+void Player::startPondering() {
+    if (!this->config->ponder || this->ponder_thread != nullptr) {
+        return;
+    }
+
+    // this->sm is in the current state of the game (see ProxyPlayer)
+    if (this->root == nullptr) {
+        this->root = this->createNode(this->sm->getCurrentState());
+    }
+
+    if (this->root->is_finalised) {
+        return;
+    }
+
+    this->playout_stats.reset();
+    this->ponder_stop = false;
+    this->ponder_start_time = get_time();
+    this->ponder_thread = new std::thread(&Player::ponderLoop, this);
+}
+
+void Player::stopPondering() {
+    if (this->ponder_thread == nullptr) {
+        return;
+    }
+
+    this->ponder_stop = true;
+    this->ponder_thread->join();
+
+    delete this->ponder_thread;
+    this->ponder_thread = nullptr;
+
+    K273::l_info("Pondered %d tree-playouts in %.2f seconds, nodes: %d",
+                 this->playout_stats.tree_playouts,
+                 get_time() - this->ponder_start_time,
+                 this->number_of_nodes);
+}
+
+void Player::ponderLoop() {
+    // runs on the ponder thread, until told to stop (or there is nothing more to do)
+    while (!this->ponder_stop) {
+        if (this->node_allocated_memory > this->config->max_memory ||
+            this->number_of_nodes > this->config->max_number_of_nodes) {
+            break;
+        }
+
+        if (!this->doPlayout()) {
+            break;
+        }
+    }
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 
 NodeChild* Player::chooseBest(Node* node) {
-    // no child in finalised nodes
+    // no child in finalised nodes (or decoupled nodes that have not been visited)
     if (node->num_children == 0) {
-        ASSERT (node->is_finalised);
+        ASSERT (node->is_finalised || node->is_decoupled);
         return nullptr;
     }
 
     const int role_count = this->sm->getRoleCount();
 
+    // decoupled nodes: our most visited move, then the most visited joint move containing it
+    int our_legal = -1;
+    if (node->is_decoupled) {
+        int best_stat_visits = -1;
+        for (int ii=0; ii<node->getDecoupledCount(this->our_role_index); ii++) {
+            const DecoupledStat* stat = node->getDecoupledStat(role_count, this->our_role_index, ii);
+            if (stat->visits > best_stat_visits) {
+                best_stat_visits = stat->visits;
+                our_legal = stat->legal;
+            }
+        }
+    }
+
     int best_visits = -1;
     NodeChild* selection = nullptr;
 
     for (int ii=0; ii<node->num_children; ii++) {
         NodeChild* c = node->getNodeChild(role_count, ii);
+        if (our_legal != -1 && c->move.get(this->our_role_index) != our_legal) {
+            continue;
+        }
 
         if (c->to_node != nullptr && c->to_node->visits > best_visits) {
             best_visits = c->to_node->visits;
@@ -235,6 +881,52 @@ NodeChild* Player::chooseBest(Node* node) {
     return selection;
 }
 
+bool Player::checkTimeManager(double now) {
+    // gather visits of our moves at the root, and ask the time manager whether to stop
+    const int role_count = this->sm->getRoleCount();
+
+    int best_choice = -1;
+    int best_visits = 0;
+    int second_visits = 0;
+    int total_visits = 0;
+
+    auto update = [&](int choice, int visits) {
+        total_visits += visits;
+        if (visits > best_visits) {
+            second_visits = best_visits;
+            best_visits = visits;
+            best_choice = choice;
+
+        } else if (visits > second_visits) {
+            second_visits = visits;
+        }
+    };
+
+    if (this->root->is_decoupled) {
+        for (int ii=0; ii<this->root->getDecoupledCount(this->our_role_index); ii++) {
+            const DecoupledStat* stat = this->root->getDecoupledStat(role_count, this->our_role_index, ii);
+            update(stat->legal, stat->visits);
+        }
+
+    } else {
+        for (int ii=0; ii<this->root->num_children; ii++) {
+            const NodeChild* c = this->root->getNodeChild(role_count, ii);
+            if (c->to_node != nullptr) {
+                update(c->move.get(this->our_role_index), c->to_node->visits);
+            }
+        }
+    }
+
+    double tree_depth = 0.0;
+    if (this->playout_stats.tree_playouts > 0) {
+        tree_depth = this->playout_stats.total_tree_playout_depth / (double) this->playout_stats.tree_playouts;
+    }
+
+    return this->time_manager->shouldStop(now, this->playout_stats.tree_playouts,
+                                          best_choice, best_visits, second_visits, total_visits,
+                                          this->root->expected_depth, tree_depth);
+}
+
 void Player::logDebug(double total_time_seconds) {
     double allocated_megs = this->node_allocated_memory / (1024.0 * 1024.0);
     double av_node_size = this->node_allocated_memory / (double) this->number_of_nodes;
@@ -287,6 +979,86 @@ void Player::logDebug(double total_time_seconds) {
     }
 }
 
+void Player::updateTelemetry(double total_time_seconds) {
+    this->telemetry.reset();
+
+    this->telemetry.search_time = total_time_seconds;
+    this->telemetry.tree_playout_time = this->playout_stats.tree_playout_accumulative_time;
+    this->telemetry.rollout_time = this->playout_stats.rollout_accumulative_time;
+    this->telemetry.back_propagate_time = this->playout_stats.back_propagate_accumulative_time;
+
+    this->telemetry.tree_playouts = this->playout_stats.tree_playouts;
+    this->telemetry.rollouts = this->playout_stats.rollouts;
+    this->telemetry.number_of_nodes = this->number_of_nodes;
+    this->telemetry.allocated_memory = this->node_allocated_memory;
+    this->telemetry.decoupled_nodes = this->number_of_decoupled_nodes;
+
+    if (this->playout_stats.tree_playouts > 0) {
+        this->telemetry.average_depth = (this->playout_stats.total_tree_playout_depth /
+                                         (double) this->playout_stats.tree_playouts);
+    }
+
+    if (this->root == nullptr) {
+        return;
+    }
+
+    // one entry for each of our moves at the root (joint moves are merged)
+    const int role_count = this->sm->getRoleCount();
+    auto add = [this](int choice, int visits, double score, int amaf_visits, double amaf_score) {
+        for (ChildTelemetry& child : this->telemetry.children) {
+            if (child.choice == choice) {
+                const int total_visits = child.visits + visits;
+                if (total_visits > 0) {
+                    child.score = (child.score * child.visits + score * visits) / total_visits;
+                }
+
+                const int total_amaf_visits = child.amaf_visits + amaf_visits;
+                if (total_amaf_visits > 0) {
+                    child.amaf_score = ((child.amaf_score * child.amaf_visits + amaf_score * amaf_visits) /
+                                        total_amaf_visits);
+                }
+
+                child.visits = total_visits;
+                child.amaf_visits = total_amaf_visits;
+                return;
+            }
+        }
+
+        this->telemetry.children.push_back({choice, visits, score, amaf_visits, amaf_score});
+    };
+
+    if (this->root->is_decoupled) {
+        for (int ii=0; ii<this->root->getDecoupledCount(this->our_role_index); ii++) {
+            const DecoupledStat* stat = this->root->getDecoupledStat(role_count, this->our_role_index, ii);
+            add(stat->legal, stat->visits, stat->score, 0, 0.0);
+        }
+
+    } else {
+        for (int ii=0; ii<this->root->num_children; ii++) {
+            const NodeChild* c = this->root->getNodeChild(role_count, ii);
+            const int choice = c->move.get(this->our_role_index);
+
+            int amaf_visits = 0;
+            double amaf_score = 0.0;
+            if (this->root->has_amaf) {
+                amaf_visits = (int) this->root->getChildAmafVisits()[ii];
+                amaf_score = this->root->getChildAmafScores()[ii];
+            }
+
+            if (c->to_node != nullptr) {
+                add(choice, c->to_node->visits, c->to_node->getScore(this->our_role_index),
+                    amaf_visits, amaf_score);
+            } else {
+                add(choice, 0, 0.0, amaf_visits, amaf_score);
+            }
+        }
+    }
+}
+
+const Telemetry* Player::getTelemetry() const {
+    return &this->telemetry;
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 
 void Player::onMetaGaming(double end_time) {
@@ -298,6 +1070,8 @@ void Player::onMetaGaming(double end_time) {
 }
 
 void Player::onApplyMove(JointMove* last_move) {
+    // the tree is about to change underneath the ponder thread
+    this->stopPondering();
 
     this->game_depth++;
     K273::l_info("SimpleMCTS: game depth %d", this->game_depth);
@@ -309,13 +1083,22 @@ void Player::onApplyMove(JointMove* last_move) {
     if (this->root != nullptr) {
         NodeChild* found_child = nullptr;
 
-        // find the child in the root
-        for (int ii=0; ii<this->root->num_children; ii++) {
-            NodeChild* child = this->root->getNodeChild(role_count, ii);
-            if (child->move.equals(last_move)) {
-                K273::l_debug("Found next state");
-                found_child = child;
-                break;
+        if (this->root->is_decoupled) {
+            // decoupled nodes only have the joint moves that were selected, the per role
+            // statistics cover the rest
+            const int allocated_size_before = this->root->allocated_size;
+            found_child = this->root->getOrCreateDecoupledChild(role_count, last_move);
+            this->node_allocated_memory += this->root->allocated_size - allocated_size_before;
+
+        } else {
+            // find the child in the root
+            for (int ii=0; ii<this->root->num_children; ii++) {
+                NodeChild* child = this->root->getNodeChild(role_count, ii);
+                if (child->move.equals(last_move)) {
+                    K273::l_debug("Found next state");
+                    found_child = child;
+                    break;
+                }
             }
         }
 
@@ -324,6 +1107,20 @@ void Player::onApplyMove(JointMove* last_move) {
             Node* new_root = found_child->to_node;
             K273::l_debug("Removing root node");
 
+            // a joint move that was never selected (decoupled only)
+            if (new_root == nullptr && this->root->is_decoupled) {
+                this->search_sm->updateBases(this->root->getBaseState());
+                this->search_sm->nextState(last_move, this->static_base_state);
+                new_root = this->createNode(this->static_base_state);
+            }
+
+            // the root always keeps its base state
+            if (new_root != nullptr && new_root->getBaseState() == nullptr) {
+                this->search_sm->updateBases(this->root->getBaseState());
+                this->search_sm->nextState(last_move, this->static_base_state);
+                this->node_allocated_memory += new_root->restoreBaseState(this->static_base_state);
+            }
+
             // removeNode() is recursive, we must disconnect it from the tree here before calling
             found_child->to_node = nullptr;
             this->removeNode(this->root);
@@ -340,14 +1137,32 @@ void Player::onApplyMove(JointMove* last_move) {
     K273::l_info("deleted %d nodes", number_of_nodes_before - this->number_of_nodes);
 }
 
+void Player::publishBestChoice() {
+    // (chooseBest() falls back to a random child, which is not worth publishing)
+    NodeChild* best = this->chooseBest(this->root);
+    if (best != nullptr && best->to_node != nullptr) {
+        this->setBestChoiceSoFar(best->move.get(this->our_role_index));
+    }
+}
+
 int Player::onNextMove(double end_time) {
-    const int role_count = this->sm->getRoleCount();
+    this->stopPondering();
+    this->setBestChoiceSoFar(-1);
 
-    if (this->config->skip_single_moves) {
+    if (this->config->skip_single_moves || this->config->adaptive_time) {
         LegalState* ls = this->sm->getLegalState(this->our_role_index);
         if (ls->getCount() == 1) {
             int choice = ls->getLegal(0);
             K273::l_info("Only one move - playing it : %s", this->sm->legalToMove(this->our_role_index, choice));
+
+            this->telemetry.reset();
+            this->telemetry.number_of_nodes = this->number_of_nodes;
+            this->telemetry.allocated_memory = this->node_allocated_memory;
+            this->telemetry.children.push_back({choice, 0, 0.0});
+            this->setBestChoiceSoFar(choice);
+
+            // use the opponent's time
+            this->startPondering();
             return choice;
         }
     }
@@ -361,6 +1176,10 @@ int Player::onNextMove(double end_time) {
 
     K273::l_debug("searching for %.1f seconds", end_time - enter_time);
 
+    if (this->time_manager != nullptr) {
+        this->time_manager->start(enter_time, end_time);
+    }
+
     // we create a node for the root (if does not exist already)
     if (this->root == nullptr) {
         K273::l_info("Creating root node");
@@ -377,6 +1196,8 @@ int Player::onNextMove(double end_time) {
 
     double next_time = enter_time + this->config->next_time;
     double next_check_time = enter_time + 0.5;
+    double next_time_manager_check = enter_time + 0.05;
+    double next_publish_time = enter_time + 0.1;
 
     while (true) {
         // check elapsed time
@@ -405,6 +1226,15 @@ int Player::onNextMove(double end_time) {
 
             next_time = float_time + this->config->next_time;
 
+        } else if (this->time_manager != nullptr && float_time > next_time_manager_check) {
+            if (this->checkTimeManager(float_time)) {
+                K273::l_info("Time manager finished search after %.2f seconds (of %.2f)",
+                             float_time - enter_time, end_time - enter_time);
+                break;
+            }
+
+            next_time_manager_check = float_time + 0.05;
+
         } else if (float_time > next_check_time) {
             // early breaking checks
 
@@ -426,53 +1256,23 @@ int Player::onNextMove(double end_time) {
             next_check_time = float_time + 0.5;
         }
 
-        // do tree playout and gather stats
-        const double tree_playout_start_time = get_time();
-        const int tree_playout_depth = this->treePlayout();
-        this->playout_stats.total_tree_playout_depth += tree_playout_depth;
-        this->playout_stats.tree_playouts++;
-        this->playout_stats.tree_playout_accumulative_time += get_time() - tree_playout_start_time;
+        // in case the caller runs out of time, and has to send a move before we return
+        if (float_time > next_publish_time) {
+            this->publishBestChoice();
+            next_publish_time = float_time + 0.1;
+        }
 
         // can we break early - since game finalised?
-        if (tree_playout_depth == 0) {
+        if (!this->doPlayout()) {
             K273::l_warning("Breaking early from tree playouts since root is in terminal state");
             break;
         }
-
-        ASSERT (this->path.size() >= 1);
-        Node* last = this->path.getLast()->node;
-        ASSERT (last != nullptr);
-
-        // get the scores
-        double new_scores[role_count];
-
-        // perform a rollout from current node? (to obtain scores):
-        if (!last->is_finalised) {
-
-            // do the rollout and gather stats
-            const double rollout_start_time = get_time();
-            this->rollout->doRollout(last->getBaseState(), 0);
-            this->playout_stats.rollout_accumulative_time += get_time() - rollout_start_time;
-            this->playout_stats.rollouts++;
-
-            for (int ii=0; ii<role_count; ii++) {
-                new_scores[ii] = this->rollout->getScore(ii) / 100.0;
-            }
-
-        } else {
-            // simply set score from the finalised node
-            for (int ii=0; ii<role_count; ii++) {
-                new_scores[ii] = last->getScore(ii);
-            }
-        }
-
-        const double back_propagate_start_time = get_time();
-        this->backPropagate(new_scores);
-        this->playout_stats.back_propagate_accumulative_time += get_time() - back_propagate_start_time;
     }
 
     // dump bunch of information to log file
-    this->logDebug(get_time() - enter_time);
+    const double total_time_seconds = get_time() - enter_time;
+    this->logDebug(total_time_seconds);
+    this->updateTelemetry(total_time_seconds);
 
     // Choose best move from root (with the most visits)
     NodeChild* winner = this->chooseBest(this->root);
@@ -481,5 +1281,9 @@ int Player::onNextMove(double end_time) {
     // and return choice
     int choice = winner->move.get(this->our_role_index);
     K273::l_info("Selected: %s", this->sm->legalToMove(this->our_role_index, choice));
+    this->setBestChoiceSoFar(choice);
+
+    // keep searching while the gamemaster/other players are busy
+    this->startPondering();
     return choice;
 }
@@ -5,16 +5,26 @@
 #include "player/node.h"
 #include "player/path.h"
 #include "player/rollout.h"
+#include "player/rolloutpool.h"
+#include "player/timemanager.h"
 
 #include "statemachine/basestate.h"
 #include "statemachine/jointmove.h"
 #include "statemachine/statemachine.h"
 
+#include <atomic>
+#include <thread>
 #include <vector>
 
 namespace GGPLib {
     namespace SimpleMcts {
 
+    // Evaluates a batch of count leaves.  states are the packed base states of the leaves (one
+    // after the other).  Fills in values[count * role_count] (0 to 1) and
+    // priors[count * role_count * policy_size] (per role, indexed by legal choice).  Returns 0 if
+    // the evaluation failed, which stops the search (nothing is back propagated).
+    typedef int (*LeafEvaluator)(int count, const char* states, float* values, float* priors);
+
     struct Config {
         bool skip_single_moves;
         double max_tree_search_time;
@@ -29,6 +39,28 @@ namespace GGPLib {
 
         int dump_depth;
         double next_time;
+
+        // continue searching on a background thread in between moves
+        bool ponder;
+
+        // simultaneous nodes keep per role statistics, rather than creating every joint move
+        bool decoupled;
+
+        // let the time manager decide when to stop searching
+        bool adaptive_time;
+        double min_search_fraction;
+        double dominant_visit_share;
+
+        // batch of rollouts from each new leaf, optionally on a pool of threads
+        int rollouts_per_leaf;
+        int rollout_threads;
+
+        // only keep base states on the root (and decoupled nodes).  Other nodes release theirs once
+        // evaluated, and are replayed from the path when expanded.
+        bool compact_basestates;
+
+        // all moves as first statistics, blended in selection (0 disables)
+        double rave_equivalence;
     };
 
     class Player : public PlayerBase {
@@ -36,34 +68,73 @@ namespace GGPLib {
         Player(StateMachineInterface*, int player_role_index, Config*);
         virtual ~Player();
 
+    public:
+        // replaces rollouts with batches of leaves evaluated by evaluator.  Up to batch_size
+        // leaves are selected before evaluating, spread out with virtual_loss visits per
+        // inflight playout.
+        void setLeafEvaluator(LeafEvaluator evaluator, int batch_size, int policy_size, int virtual_loss);
+
     private:
         Node* createNode(const BaseState* bs);
         void removeNode(Node* n);
 
         void selectChild(Node* node);
+        void selectDecoupledChild(Node* node);
+
+        void markAmafMove(const JointMove* move);
+        void updateAmaf(Node* node, int role_index, double score);
 
-        void backPropagate(double* new_scores);
+        void refreshChildStats(Node* node, const NodeChild* selection);
+        void addVirtualLoss(int delta);
+        void applyEvaluation(Node* node, const float* values, const float* priors);
+
+        void backPropagateAmaf(const double* scores, const RolloutBase* trajectory);
+        void backPropagate(double* new_scores, int rollout_depth, bool update_amaf);
+        void releaseLeafBaseState(Node* leaf);
+        const BaseState* replayBaseState();
         int treePlayout();
+        bool doPlayout();
+        bool doBatchedPlayouts();
+
+        void startPondering();
+        void stopPondering();
+        void ponderLoop();
 
         NodeChild* chooseBest(Node* node);
+        void publishBestChoice();
+        bool checkTimeManager(double now);
 
         void logDebug(double total_time_seconds);
+        void updateTelemetry(double total_time_seconds);
 
     public:
         // interface:
         virtual void onMetaGaming(double end_time);
         virtual void onApplyMove(JointMove* move);
         virtual int onNextMove(double end_time);
+        virtual const Telemetry* getTelemetry() const;
 
     private:
         Config* config;
 
+        // the tree is only ever expanded with search_sm, so that the background thread never
+        // shares a statemachine with the caller
+        StateMachineInterface* search_sm;
+
         DepthChargeRollout* rollout;
         BaseState* static_base_state;
+        BaseState* replay_base_state;
+
+        // only if config->rollout_threads > 0
+        RolloutWorkerPool* rollout_pool;
+
+        // only if config->adaptive_time
+        TimeManager* time_manager;
 
         // tree stuff
         Node* root;
         int number_of_nodes;
+        int number_of_decoupled_nodes;
         long node_allocated_memory;
 
         Path::Selected path;
@@ -83,7 +154,30 @@ namespace GGPLib {
         };
 
         PlayoutStats playout_stats;
+
+        // only if a leaf evaluator is set
+        LeafEvaluator leaf_evaluator;
+        int evaluation_batch_size;
+        int evaluation_policy_size;
+        int virtual_loss;
+        int state_byte_count;
+
+        std::vector <Path::Selected> batch_paths;
+        std::vector <char> batch_states;
+        std::vector <float> batch_values;
+        std::vector <float> batch_priors;
+
+        // per role, the stamp of the last back propagation each legal was played in
+        std::vector <std::vector <int>> amaf_seen;
+        int amaf_stamp;
+
+        Telemetry telemetry;
         K273::Random random;
+
+        // pondering
+        std::thread* ponder_thread;
+        std::atomic <bool> ponder_stop;
+        double ponder_start_time;
     };
 
     }
@@ -4,10 +4,12 @@
 #include "example_players/simplemcts.h"
 #include "example_players/legalplayer.h"
 #include "example_players/randomplayer.h"
+#include "example_players/mcsplayer.h"
 
 #include "player/player.h"
 
 #include "perf_test.h"
+#include "player/trajectory.h"
 
 #include "statemachine/goalless_sm.h"
 #include "statemachine/combined.h"
@@ -91,6 +93,21 @@ void BaseState__delete(void* _bs) {
     ::free(bs);
 }
 
+int BaseState__byteCount(void* _bs) {
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    return bs->byte_count * GGPLib::BaseState::ARRAYTYPE_BYTES;
+}
+
+void BaseState__getBytes(void* _bs, char* buf) {
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    std::memcpy(buf, bs->data, bs->byte_count * GGPLib::BaseState::ARRAYTYPE_BYTES);
+}
+
+void BaseState__setBytes(void* _bs, const char* buf) {
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    std::memcpy(bs->data, buf, bs->byte_count * GGPLib::BaseState::ARRAYTYPE_BYTES);
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 
 void StateMachine__setInitialState(void* _sm, void* _bs) {
@@ -222,6 +239,16 @@ void* Player__createLegalPlayer(void* _sm, int our_role_index) {
     return (void *) player;
 }
 
+void* Player__createMCSPlayer(void* _sm, int our_role_index,
+                              double max_run_time,
+                              long max_iterations,
+                              double ucb_constant) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachine*> (_sm);
+    GGPLib::PlayerBase* player = new MCSPlayer::Player(sm, our_role_index,
+                                                       max_run_time, max_iterations, ucb_constant);
+    return (void *) player;
+}
+
 void* Player__createSimpleMCTSPlayer(void* _sm, int our_role_index,
                                      int skip_single_moves,
                                      double max_tree_search_time,
@@ -231,7 +258,16 @@ void* Player__createSimpleMCTSPlayer(void* _sm, int our_role_index,
                                      double ucb_constant,
                                      int select_random_move_count,
                                      int dump_depth,
-                                     double next_time) {
+                                     double next_time,
+                                     int ponder,
+                                     int decoupled,
+                                     int adaptive_time,
+                                     double min_search_fraction,
+                                     double dominant_visit_share,
+                                     int rollouts_per_leaf,
+                                     int rollout_threads,
+                                     int compact_basestates,
+                                     double rave_equivalence) {
 
     GGPLib::SimpleMcts::Config* config = new GGPLib::SimpleMcts::Config;
     config->skip_single_moves = (bool) skip_single_moves;
@@ -243,12 +279,28 @@ void* Player__createSimpleMCTSPlayer(void* _sm, int our_role_index,
     config->select_random_move_count = select_random_move_count;
     config->dump_depth = dump_depth;
     config->next_time = next_time;
+    config->ponder = (bool) ponder;
+    config->decoupled = (bool) decoupled;
+    config->adaptive_time = (bool) adaptive_time;
+    config->min_search_fraction = min_search_fraction;
+    config->dominant_visit_share = dominant_visit_share;
+    config->rollouts_per_leaf = rollouts_per_leaf;
+    config->rollout_threads = rollout_threads;
+    config->compact_basestates = (bool) compact_basestates;
+    config->rave_equivalence = rave_equivalence;
 
     GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachine*> (_sm);
     GGPLib::PlayerBase* player = new GGPLib::SimpleMcts::Player(sm, our_role_index, config);
     return (void *) player;
 }
 
+void Player__setSimpleMCTSLeafEvaluator(void* _player, LeafEvaluator evaluator,
+                                        int batch_size, int policy_size, int virtual_loss) {
+    GGPLib::PlayerBase* base = static_cast<GGPLib::PlayerBase*> (_player);
+    GGPLib::SimpleMcts::Player* player = static_cast<GGPLib::SimpleMcts::Player*> (base);
+    player->setLeafEvaluator(evaluator, batch_size, policy_size, virtual_loss);
+}
+
 void PlayerBase__cleanup(void* _player) {
     GGPLib::PlayerBase* player = static_cast<GGPLib::PlayerBase*> (_player);
     delete player;
@@ -299,6 +351,57 @@ int PlayerBase__onNextMove(void* _player, double end_time) {
     return -1;
 }
 
+int PlayerBase__getTelemetry(void* _player, PlayerTelemetry* res) {
+    try {
+        GGPLib::PlayerBase* player = static_cast<GGPLib::PlayerBase*> (_player);
+        const GGPLib::Telemetry* telemetry = player->getTelemetry();
+        if (telemetry == nullptr) {
+            return 0;
+        }
+
+        res->search_time = telemetry->search_time;
+        res->tree_playout_time = telemetry->tree_playout_time;
+        res->rollout_time = telemetry->rollout_time;
+        res->back_propagate_time = telemetry->back_propagate_time;
+
+        res->tree_playouts = telemetry->tree_playouts;
+        res->rollouts = telemetry->rollouts;
+        res->number_of_nodes = telemetry->number_of_nodes;
+        res->allocated_memory = telemetry->allocated_memory;
+        res->average_depth = telemetry->average_depth;
+        res->decoupled_nodes = telemetry->decoupled_nodes;
+
+        res->number_of_children = telemetry->children.size();
+        return 1;
+
+    } catch (...) {
+        logExceptionWrapper(__PRETTY_FUNCTION__);
+    }
+
+    return 0;
+}
+
+int PlayerBase__getChildTelemetry(void* _player, int index, PlayerChildTelemetry* res) {
+    GGPLib::PlayerBase* player = static_cast<GGPLib::PlayerBase*> (_player);
+    const GGPLib::Telemetry* telemetry = player->getTelemetry();
+    if (telemetry == nullptr || index < 0 || index >= (int) telemetry->children.size()) {
+        return 0;
+    }
+
+    const GGPLib::ChildTelemetry& child = telemetry->children[index];
+    res->choice = child.choice;
+    res->visits = child.visits;
+    res->score = child.score;
+    res->amaf_visits = child.amaf_visits;
+    res->amaf_score = child.amaf_score;
+    return 1;
+}
+
+int PlayerBase__getBestChoiceSoFar(void* _player) {
+    GGPLib::PlayerBase* player = static_cast<GGPLib::PlayerBase*> (_player);
+    return player->getBestChoiceSoFar();
+}
+
 void* DepthChargeTest__create(void* _sm) {
     GGPLib::StateMachine* sm = static_cast<GGPLib::StateMachine*> (_sm);
     GGPLib::DepthChargeTest* dct = new GGPLib::DepthChargeTest(sm);
@@ -320,6 +423,33 @@ void DepthChargeTest__delete(void* _dct) {
     delete dct;
 }
 
+void* TrajectoryGenerator__create(void* _sm) {
+    GGPLib::StateMachineInterface* sm = static_cast<GGPLib::StateMachine*> (_sm);
+    GGPLib::TrajectoryGenerator* gen = new GGPLib::TrajectoryGenerator(sm->dupe());
+    return (void *) gen;
+}
+
+void TrajectoryGenerator__setWeights(void* _gen, int role_index, const float* weights, int count) {
+    GGPLib::TrajectoryGenerator* gen = static_cast<GGPLib::TrajectoryGenerator*> (_gen);
+    gen->setWeights(role_index, weights, count);
+}
+
+int TrajectoryGenerator__generate(void* _gen, void* _bs) {
+    GGPLib::TrajectoryGenerator* gen = static_cast<GGPLib::TrajectoryGenerator*> (_gen);
+    GGPLib::BaseState* bs = static_cast<GGPLib::BaseState*> (_bs);
+    return gen->generate(bs);
+}
+
+const char* TrajectoryGenerator__getBuffer(void* _gen) {
+    GGPLib::TrajectoryGenerator* gen = static_cast<GGPLib::TrajectoryGenerator*> (_gen);
+    return gen->getBuffer();
+}
+
+void TrajectoryGenerator__delete(void* _gen) {
+    GGPLib::TrajectoryGenerator* gen = static_cast<GGPLib::TrajectoryGenerator*> (_gen);
+    delete gen;
+}
+
 void Log_verbose(const char* msg) {
     K273::l_verbose("%s", msg);
 }
@@ -6,6 +6,7 @@
 #define JointMove void
 #define PlayerBase void
 #define DepthChargeTest void
+#define TrajectoryGenerator void
 
 #define boolean int
 
@@ -29,6 +30,11 @@ extern "C" {
     int BaseState__len(BaseState*);
     void BaseState__delete(BaseState*);
 
+    // packed bytes of a BaseState (buf must be at least BaseState__byteCount() bytes)
+    int BaseState__byteCount(BaseState*);
+    void BaseState__getBytes(BaseState*, char* buf);
+    void BaseState__setBytes(BaseState*, const char* buf);
+
     // StateMachine initialisation:
     void StateMachine__setInitialState(StateMachine*, BaseState* intial_state);
 
@@ -68,6 +74,10 @@ extern "C" {
 
     PlayerBase* Player__createRandomPlayer(StateMachine*, int our_role_index);
     PlayerBase* Player__createLegalPlayer(StateMachine*, int our_role_index);
+    PlayerBase* Player__createMCSPlayer(StateMachine*, int our_role_index,
+                                        double max_run_time,
+                                        long max_iterations,
+                                        double ucb_constant);
 
     // pass everything in
     PlayerBase* Player__createSimpleMCTSPlayer(void* _sm, int our_role_index,
@@ -79,13 +89,58 @@ extern "C" {
                                                double ucb_constant,
                                                int select_random_move_count,
                                                int dump_depth,
-                                               double next_time);
+                                               double next_time,
+                                               boolean ponder,
+                                               boolean decoupled,
+                                               boolean adaptive_time,
+                                               double min_search_fraction,
+                                               double dominant_visit_share,
+                                               int rollouts_per_leaf,
+                                               int rollout_threads,
+                                               boolean compact_basestates,
+                                               double rave_equivalence);
+
+    // batched leaf evaluation for the simple mcts player, instead of rollouts (see
+    // example_players/simplemcts.h).  Returns 0 if the evaluation failed.
+    typedef int (*LeafEvaluator)(int count, const char* states, float* values, float* priors);
+    void Player__setSimpleMCTSLeafEvaluator(PlayerBase*, LeafEvaluator evaluator,
+                                            int batch_size, int policy_size, int virtual_loss);
+
+    // structured information about the last move (see player/player.h)
+    typedef struct {
+        double search_time;
+        double tree_playout_time;
+        double rollout_time;
+        double back_propagate_time;
+
+        int tree_playouts;
+        int rollouts;
+        int number_of_nodes;
+        long allocated_memory;
+        double average_depth;
+        int decoupled_nodes;
+
+        int number_of_children;
+    } PlayerTelemetry;
+
+    typedef struct {
+        int choice;
+        int visits;
+        double score;
+        int amaf_visits;
+        double amaf_score;
+    } PlayerChildTelemetry;
 
     void PlayerBase__cleanup(PlayerBase*);
     void PlayerBase__onMetaGaming(PlayerBase*, double end_time);
     const char* PlayerBase__beforeApplyInfo(PlayerBase*);
     void PlayerBase__onApplyMove(PlayerBase*, JointMove*);
     int PlayerBase__onNextMove(PlayerBase*, double end_time);
+    boolean PlayerBase__getTelemetry(PlayerBase*, PlayerTelemetry* telemetry);
+    boolean PlayerBase__getChildTelemetry(PlayerBase*, int index, PlayerChildTelemetry* child);
+
+    // thread safe, may be called while PlayerBase__onNextMove() is running.  -1 if not known.
+    int PlayerBase__getBestChoiceSoFar(PlayerBase*);
 
 
     // DepthChargeTest operations:
@@ -94,6 +149,13 @@ extern "C" {
     int DepthChargeTest__getResult(DepthChargeTest*, int index);
     void DepthChargeTest__delete(DepthChargeTest*);
 
+    // TrajectoryGenerator operations (see player/trajectory.h for the buffer layout):
+    TrajectoryGenerator* TrajectoryGenerator__create(StateMachine*);
+    void TrajectoryGenerator__setWeights(TrajectoryGenerator*, int role_index, const float* weights, int count);
+    int TrajectoryGenerator__generate(TrajectoryGenerator*, BaseState* start_state);
+    const char* TrajectoryGenerator__getBuffer(TrajectoryGenerator*);
+    void TrajectoryGenerator__delete(TrajectoryGenerator*);
+
     void Log_verbose(const char*);
     void Log_debug(const char*);
     void Log_info(const char*);
@@ -119,3 +181,4 @@ extern "C" {
 #undef ComponentType
 #undef PlayerBase
 #undef DepthChargeTest
+#undef TrajectoryGenerator
@@ -50,52 +50,117 @@ static string scoreString(const Node* node, StateMachineInterface* sm) {
 static Node* createNode(const BaseState* base_state,
                         bool is_finalised,
                         int lead_role_index,
-                        double select_ucb_constant,
                         int num_children,
+                        int num_decoupled_stats,
+                        bool detach_state,
+                        bool amaf,
+                        bool priors,
                         int role_count) {
 
 #define round_up_4(x) ((((x) / 4) + 1) * 4)
 
     const int child_size = sizeof(NodeChild);
     int score_bytes = round_up_4(role_count * sizeof(Score));
-    int base_state_bytes = round_up_4(sizeof(BaseState) + base_state->byte_count);
+
+    // child scores + child inverse sqrt visits (+ amaf scores and visits) (+ priors)
+    int stats_bytes = num_children * (sizeof(Score) + sizeof(float));
+    if (amaf) {
+        stats_bytes *= 2;
+    }
+
+    if (priors) {
+        stats_bytes += num_children * sizeof(float);
+    }
+
+    int base_state_bytes = 0;
+    if (!detach_state) {
+        base_state_bytes = round_up_4(sizeof(BaseState) + base_state->byte_count);
+    }
 
     // remember that the JointMove is inline, so we only need to count the indices
     int node_child_bytes = round_up_4(child_size + sizeof(JointMove::IndexType) * role_count);
 
+    // starts for each role + stats
+    int decoupled_bytes = 0;
+    if (num_decoupled_stats > 0) {
+        decoupled_bytes = round_up_4((role_count + 1) * sizeof(uint16_t));
+        decoupled_bytes += num_decoupled_stats * sizeof(DecoupledStat);
+    }
+
 #undef round_up_4
-    int total_bytes = sizeof(Node) + score_bytes + base_state_bytes + (num_children * node_child_bytes);
+    int total_bytes = (sizeof(Node) + score_bytes + stats_bytes + base_state_bytes +
+                       decoupled_bytes + (num_children * node_child_bytes));
 
     //k_debug("total_bytes %d #child %d (%d / %d / %d)", total_bytes, num_children, score_bytes, base_state_bytes, (num_children * node_child_bytes));
 
     Node* node = static_cast<Node*> (malloc(total_bytes));
     node->visits = 0;
     node->sqrt_log_visits = 1;
-    node->select_ucb_constant = select_ucb_constant;
     node->inflight_visits = 0;
 
     node->ref_count = 1;
     node->is_finalised = is_finalised;
     node->lead_role_index = lead_role_index;
-    node->expected_depth = 0.0;
+    node->expected_depth = 0.0f;
     node->num_children = num_children;
+    node->num_expanded = 0;
     node->unselectable_count = 0;
 
-    node->basestate_ptr_incr = score_bytes;
-    node->children_ptr_incr = score_bytes + base_state_bytes;
+    node->stats_ptr_incr = score_bytes;
+    node->basestate_ptr_incr = node->stats_ptr_incr + stats_bytes;
+    node->decoupled_ptr_incr = node->basestate_ptr_incr + base_state_bytes;
+    node->children_ptr_incr = node->decoupled_ptr_incr + decoupled_bytes;
+
+    node->is_decoupled = num_decoupled_stats > 0;
+    node->has_amaf = amaf;
+    node->has_priors = priors;
+    node->decoupled_capacity = 0;
+    node->decoupled_children = nullptr;
 
     // store the allocated size
     node->allocated_size = total_bytes;
 
     // initialise all scores to zero
     for (int ii=0; ii<role_count; ii++) {
-        node->setScore(ii, 0.0);
+        node->setScore(ii, 0.0f);
+    }
+
+    // unvisited children get the max score, and no visits
+    Score* child_scores = node->getChildScores();
+    float* child_inv_sqrts = node->getChildInvSqrts();
+    for (int ii=0; ii<num_children; ii++) {
+        child_scores[ii] = 1.0f;
+        child_inv_sqrts[ii] = 1.0f;
+    }
+
+    if (amaf) {
+        Score* amaf_scores = node->getChildAmafScores();
+        float* amaf_visits = node->getChildAmafVisits();
+        for (int ii=0; ii<num_children; ii++) {
+            amaf_scores[ii] = 0.0f;
+            amaf_visits[ii] = 0.0f;
+        }
+    }
+
+    // uniform, until the node is evaluated
+    if (priors) {
+        float* child_priors = node->getChildPriors();
+        for (int ii=0; ii<num_children; ii++) {
+            child_priors[ii] = 1.0f / num_children;
+        }
     }
 
     // copy the base state
-    BaseState* node_bs = node->getBaseState();
-    node_bs->init(base_state->size);
-    node_bs->assign(base_state);
+    node->has_inline_state = !detach_state;
+    node->detached_state = nullptr;
+    if (detach_state) {
+        node->restoreBaseState(base_state);
+
+    } else {
+        BaseState* node_bs = node->getBaseState();
+        node_bs->init(base_state->size);
+        node_bs->assign(base_state);
+    }
 
     // children initialised in initialiseChildHelper()...
     return node;
@@ -112,11 +177,11 @@ static int initialiseChildHelper(Node* node, int role_index, int child_index,
         joint_move->set(role_index, choice);
 
         if (final_role) {
-            NodeChild* child = node->getNodeChild(role_count, child_index++);
+            NodeChild* child = node->getNodeChild(role_count, child_index);
             child->to_node = nullptr;
+            child->child_index = child_index++;
             child->unselectable = false;
             child->traversals = 0;
-            child->inv_sqrt_traversals = 1.0;
             child->move.setSize(role_count);
             child->move.assign(joint_move);
 
@@ -131,12 +196,37 @@ static int initialiseChildHelper(Node* node, int role_index, int child_index,
 }
 
 
+static void initialiseDecoupledHelper(Node* node, int role_count, StateMachineInterface* sm) {
+    uint16_t* starts = reinterpret_cast<uint16_t*> (node->data + node->decoupled_ptr_incr);
+
+    int start = 0;
+    for (int ri=0; ri<role_count; ri++) {
+        starts[ri] = start;
+        start += sm->getLegalState(ri)->getCount();
+    }
+
+    starts[role_count] = start;
+
+    for (int ri=0; ri<role_count; ri++) {
+        LegalState* ls = sm->getLegalState(ri);
+        for (int ii=0; ii<ls->getCount(); ii++) {
+            DecoupledStat* stat = node->getDecoupledStat(role_count, ri, ii);
+            stat->legal = ls->getLegal(ii);
+            stat->visits = 0;
+            stat->score = 0.0f;
+        }
+    }
+}
+
 // This is a static method.
 Node* Node::create(int role_count,
                    int our_role_index,
-                   double select_ucb_constant,
                    const BaseState* base_state,
-                   StateMachineInterface* sm) {
+                   StateMachineInterface* sm,
+                   bool decoupled,
+                   bool detach_state,
+                   bool amaf,
+                   bool priors) {
 
     sm->updateBases(base_state);
 
@@ -184,15 +274,43 @@ Node* Node::create(int role_count,
         //k_debug("node is final");
     }
 
+    // decoupled - the number of statistics is the sum (rather than the product) of the moves
+    int num_decoupled_stats = 0;
+    if (decoupled && !is_finalised && lead_role_index == LEAD_ROLE_INDEX_SIMULTANEOUS) {
+        for (int ri=0; ri<role_count; ri++) {
+            num_decoupled_stats += sm->getLegalState(ri)->getCount();
+        }
+
+        total_children = 0;
+    }
+
+    // not for decoupled nodes, each role's DecoupledStat are used instead
+    if (num_decoupled_stats > 0 || is_finalised) {
+        amaf = false;
+        priors = false;
+    }
+
     //k_debug("before createNode total_children %d", total_children);
 
+    // finalised nodes never need their state again
+    if (is_finalised) {
+        detach_state = false;
+    }
+
     Node* node = createNode(base_state,
                             is_finalised,
                             lead_role_index,
-                            select_ucb_constant,
                             total_children,
+                            num_decoupled_stats,
+                            detach_state,
+                            amaf,
+                            priors,
                             role_count);
-    if (!node->is_finalised) {
+
+    if (node->is_decoupled) {
+        initialiseDecoupledHelper(node, role_count, sm);
+
+    } else if (!node->is_finalised) {
         char buf[JointMove::mallocSize(role_count)];
         JointMove* move = (JointMove*) buf;
         int count = initialiseChildHelper(node, 0, 0, role_count, sm, move);
@@ -202,6 +320,82 @@ Node* Node::create(int role_count,
     return node;
 }
 
+// This is a static method.
+void Node::release(Node* node) {
+    if (node->decoupled_children != nullptr) {
+        free(node->decoupled_children);
+    }
+
+    if (node->detached_state != nullptr) {
+        free(node->detached_state);
+    }
+
+    free(node);
+}
+
+int Node::releaseBaseState() {
+    ASSERT (!this->has_inline_state);
+    if (this->detached_state == nullptr) {
+        return 0;
+    }
+
+    const int bytes = BaseState::mallocSize(this->detached_state->size);
+    free(this->detached_state);
+    this->detached_state = nullptr;
+
+    this->allocated_size -= bytes;
+    return bytes;
+}
+
+int Node::restoreBaseState(const BaseState* base_state) {
+    ASSERT (!this->has_inline_state);
+    if (this->detached_state != nullptr) {
+        return 0;
+    }
+
+    const int bytes = BaseState::mallocSize(base_state->size);
+    this->detached_state = static_cast<BaseState*> (malloc(bytes));
+    this->detached_state->init(base_state->size);
+    this->detached_state->assign(base_state);
+
+    this->allocated_size += bytes;
+    return bytes;
+}
+
+NodeChild* Node::getOrCreateDecoupledChild(const int role_count, const JointMove* move) {
+    ASSERT (this->is_decoupled);
+
+    for (int ii=0; ii<this->num_children; ii++) {
+        NodeChild* child = this->getNodeChild(role_count, ii);
+        if (child->move.equals(move)) {
+            return child;
+        }
+    }
+
+    int node_child_bytes = sizeof(NodeChild) + role_count * sizeof(JointMove::IndexType);
+    node_child_bytes = ((node_child_bytes / 4) + 1) * 4;
+
+    // grow (doubling)
+    if (this->num_children == this->decoupled_capacity) {
+        int new_capacity = std::max(4, this->decoupled_capacity * 2);
+        this->decoupled_children = static_cast<uint8_t*> (realloc(this->decoupled_children,
+                                                                  new_capacity * node_child_bytes));
+        this->allocated_size += (new_capacity - this->decoupled_capacity) * node_child_bytes;
+        this->decoupled_capacity = new_capacity;
+    }
+
+    // decoupled nodes have no child statistics (each role's DecoupledStat are used instead)
+    NodeChild* child = this->getNodeChild(role_count, this->num_children);
+    child->to_node = nullptr;
+    child->child_index = this->num_children++;
+    child->unselectable = false;
+    child->traversals = 0;
+    child->move.setSize(role_count);
+    child->move.assign(move);
+
+    return child;
+}
+
 ///////////////////////////////////////////////////////////////////////////////
 
 void Node::dumpNode(const Node* node, const NodeChild* highlight,
@@ -215,13 +409,13 @@ void Node::dumpNode(const Node* node, const NodeChild* highlight,
     }
 
     string finalised_top = node->is_finalised ? "[Final]" : ".";
-    K273::l_debug("%s(%d) :: %s == %.4f / #childs %d, ucb %.2f / %s / depth: %.2f / Lead : %d",
+    K273::l_debug("%s(%d) :: %s == %.4f / #childs %d, expanded %d / %s / depth: %.2f / Lead : %d",
                   indent.c_str(),
                   node->visits,
                   scoreString(node, sm).c_str(),
                   total_score,
                   node->num_children,
-                  node->select_ucb_constant,
+                  node->num_expanded,
                   finalised_top.c_str(),
                   node->expected_depth,
                   node->lead_role_index);
@@ -260,4 +454,18 @@ void Node::dumpNode(const Node* node, const NodeChild* highlight,
             }
         }
     }
+
+    if (node->is_decoupled) {
+        for (int ri=0; ri<role_count; ri++) {
+            for (int ii=0; ii<node->getDecoupledCount(ri); ii++) {
+                const DecoupledStat* stat = node->getDecoupledStat(role_count, ri, ii);
+                K273::l_debug("%sRole %d, move %s score %.4f / visits %d",
+                              indent.c_str(),
+                              ri,
+                              sm->legalToMove(ri, stat->legal),
+                              stat->score,
+                              stat->visits);
+            }
+        }
+    }
 }
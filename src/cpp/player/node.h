@@ -16,22 +16,49 @@ namespace GGPLib {
 
     struct NodeChild {
         Node* to_node;
+
+        // index into the parent's child statistics (see Node::getChildScores())
+        uint16_t child_index;
         bool unselectable;
         int traversals;
-        double inv_sqrt_traversals;
 
         JointMove move;
     };
 
-    typedef double Score;
+    typedef float Score;
+
+    // per role, per move statistics for decoupled (simultaneous) nodes
+    struct DecoupledStat {
+        JointMove::IndexType legal;
+        int visits;
+        Score score;
+    };
 
     struct Node {
+        // only used if the base state is not inline (see Node::create()).  nullptr once released.
+        BaseState* detached_state;
+
+        // Decoupled nodes do not create the cross product of joint moves up front.  Instead they
+        // keep statistics per role / per move (inline, at decoupled_ptr_incr) and the children
+        // are created lazily as joint moves are selected (out of line, in decoupled_children).
+        uint8_t* decoupled_children;
+        int decoupled_capacity;
+
         // actual visits
         int visits;
-        double sqrt_log_visits;
+        float sqrt_log_visits;
 
-        // The initial ucb constant
-        double select_ucb_constant;
+        // prediction of how long to reach a terminal state
+        float expected_depth;
+
+        // actual size of this node (including anything out of line)
+        int allocated_size;
+
+        // internal pointers into data
+        uint32_t stats_ptr_incr;
+        uint32_t basestate_ptr_incr;
+        uint32_t decoupled_ptr_incr;
+        uint32_t children_ptr_incr;
 
         // visited count, but not been added back in yet (decremented when applying updates)
         uint16_t inflight_visits;
@@ -40,24 +67,23 @@ namespace GGPLib {
         uint16_t ref_count;
 
         uint16_t num_children;
+        uint16_t num_expanded;
         uint16_t unselectable_count;
 
-        // whether this node has a finalised scores or not (can also release children if so)
-        bool is_finalised;
-
         // we don't really know which player it really it is for each node, but this is our best guess
         int16_t lead_role_index;
 
-        // prediction of how long to reach a terminal state
-        double expected_depth;
-
-        // internal pointer to scores
-        uint16_t basestate_ptr_incr;
-        uint16_t children_ptr_incr;
-
-        // actual size of this node
-        int allocated_size;
-
+        // whether this node has a finalised scores or not (can also release children if so)
+        bool is_finalised;
+        bool is_decoupled;
+        bool has_inline_state;
+        bool has_amaf;
+        bool has_priors;
+
+        // layout of data:
+        //   scores[role_count] | child scores[num_children] | child inverse sqrt visits[num_children] |
+        //   child amaf scores/visits[num_children] (if has_amaf) | child priors[num_children] (if has_priors) |
+        //   base state (if inline) | decoupled stats | children
         uint8_t data[0];
 
         Score getScore(int role_index) const {
@@ -70,12 +96,62 @@ namespace GGPLib {
             *(scores + role_index) = score;
         }
 
+        // Structure of arrays for the children, so selection does a straight scan over
+        // contiguous floats without touching the child nodes.  The score is that of the child
+        // for the lead role (or our role if simultaneous).  Not used for decoupled nodes.
+        Score* getChildScores() {
+            return reinterpret_cast<Score*> (this->data + this->stats_ptr_incr);
+        }
+
+        const Score* getChildScores() const {
+            return reinterpret_cast<const Score*> (this->data + this->stats_ptr_incr);
+        }
+
+        // 1 / sqrt(visits + 1) of each child
+        float* getChildInvSqrts() {
+            return reinterpret_cast<float*> (this->data + this->stats_ptr_incr) + this->num_children;
+        }
+
+        const float* getChildInvSqrts() const {
+            return reinterpret_cast<const float*> (this->data + this->stats_ptr_incr) + this->num_children;
+        }
+
+        // all moves as first statistics of each child (only if has_amaf)
+        Score* getChildAmafScores() {
+            return reinterpret_cast<Score*> (this->data + this->stats_ptr_incr) + 2 * this->num_children;
+        }
+
+        const Score* getChildAmafScores() const {
+            return reinterpret_cast<const Score*> (this->data + this->stats_ptr_incr) + 2 * this->num_children;
+        }
+
+        float* getChildAmafVisits() {
+            return reinterpret_cast<float*> (this->data + this->stats_ptr_incr) + 3 * this->num_children;
+        }
+
+        const float* getChildAmafVisits() const {
+            return reinterpret_cast<const float*> (this->data + this->stats_ptr_incr) + 3 * this->num_children;
+        }
+
+        // prior probability of each child, from a leaf evaluator (only if has_priors)
+        float* getChildPriors() {
+            return reinterpret_cast<float*> (this->data + this->stats_ptr_incr) + (this->has_amaf ? 4 : 2) * this->num_children;
+        }
+
+        const float* getChildPriors() const {
+            return reinterpret_cast<const float*> (this->data + this->stats_ptr_incr) + (this->has_amaf ? 4 : 2) * this->num_children;
+        }
+
         NodeChild* getNodeChild(const int role_count, const int child_index) {
             int node_child_bytes = sizeof(NodeChild) + role_count * sizeof(JointMove::IndexType);
             node_child_bytes = ((node_child_bytes / 4) + 1) * 4;
 
             uint8_t* mem = this->data;
             mem += this->children_ptr_incr;
+            if (this->is_decoupled) {
+                mem = this->decoupled_children;
+            }
+
             mem += node_child_bytes * child_index;
             return reinterpret_cast<NodeChild*> (mem);
         }
@@ -86,31 +162,88 @@ namespace GGPLib {
 
             const uint8_t* mem = this->data;
             mem += this->children_ptr_incr;
+            if (this->is_decoupled) {
+                mem = this->decoupled_children;
+            }
+
             mem += node_child_bytes * child_index;
             return reinterpret_cast<const NodeChild*> (mem);
         }
 
+        // decoupled statistics: [role_count + 1] start indices, followed by the stats
+        int getDecoupledCount(const int role_index) const {
+            const uint16_t* starts = reinterpret_cast<const uint16_t*> (this->data + this->decoupled_ptr_incr);
+            return starts[role_index + 1] - starts[role_index];
+        }
+
+        DecoupledStat* getDecoupledStat(const int role_count, const int role_index, const int index) {
+            uint16_t* starts = reinterpret_cast<uint16_t*> (this->data + this->decoupled_ptr_incr);
+            int starts_bytes = (((role_count + 1) * sizeof(uint16_t) / 4) + 1) * 4;
+            DecoupledStat* stats = reinterpret_cast<DecoupledStat*> (this->data + this->decoupled_ptr_incr + starts_bytes);
+            return stats + starts[role_index] + index;
+        }
+
+        const DecoupledStat* getDecoupledStat(const int role_count, const int role_index, const int index) const {
+            const uint16_t* starts = reinterpret_cast<const uint16_t*> (this->data + this->decoupled_ptr_incr);
+            int starts_bytes = (((role_count + 1) * sizeof(uint16_t) / 4) + 1) * 4;
+            const DecoupledStat* stats = reinterpret_cast<const DecoupledStat*> (this->data + this->decoupled_ptr_incr + starts_bytes);
+            return stats + starts[role_index] + index;
+        }
+
+        DecoupledStat* findDecoupledStat(const int role_count, const int role_index, const int legal) {
+            for (int ii=0; ii<this->getDecoupledCount(role_index); ii++) {
+                DecoupledStat* stat = this->getDecoupledStat(role_count, role_index, ii);
+                if (stat->legal == legal) {
+                    return stat;
+                }
+            }
+
+            return nullptr;
+        }
+
+        // lazily creates the child if it doesn't exist.  Note this may move all the children in
+        // memory (any NodeChild pointers into this node are invalidated).
+        NodeChild* getOrCreateDecoupledChild(const int role_count, const JointMove* move);
+
+        // may return nullptr if the base state was detached and has since been released
         BaseState* getBaseState() {
-            uint8_t* mem = this->data;
-            mem += this->basestate_ptr_incr;
-            return reinterpret_cast<BaseState*> (mem);
+            if (!this->has_inline_state) {
+                return this->detached_state;
+            }
+
+            return reinterpret_cast<BaseState*> (this->data + this->basestate_ptr_incr);
         }
 
         const BaseState* getBaseState() const {
-            const uint8_t* mem = this->data;
-            mem += this->basestate_ptr_incr;
-            return reinterpret_cast<const BaseState*> (mem);
+            if (!this->has_inline_state) {
+                return this->detached_state;
+            }
+
+            return reinterpret_cast<const BaseState*> (this->data + this->basestate_ptr_incr);
         }
 
+        // For detached base states only.  Frees the base state, after which it has to be replayed
+        // from an ancestor to expand the node (returns the number of bytes freed).
+        int releaseBaseState();
+
+        // For detached base states only, restores a released base state (returns the number of
+        // bytes allocated).
+        int restoreBaseState(const BaseState* base_state);
+
         bool isTerminal() const {
             return this->num_children == 0;
         }
 
         static Node* create(int role_count,
                             int our_role_index,
-                            double select_ucb_constant,
                             const BaseState* base_state,
-                            StateMachineInterface* sm);
+                            StateMachineInterface* sm,
+                            bool decoupled=false,
+                            bool detach_state=false,
+                            bool amaf=false,
+                            bool priors=false);
+
+        static void release(Node* node);
 
         static void dumpNode(const Node* node, const NodeChild* highlight,
                              const std::string& indent, StateMachineInterface* sm);
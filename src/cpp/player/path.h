@@ -40,6 +40,10 @@ namespace GGPLib {
                 this->elements.clear();
             }
 
+            void swap(Selected& other) {
+                this->elements.swap(other.elements);
+            }
+
             void add(Node* n, NodeChild* s=nullptr, bool e=false) {
                 this->elements.emplace_back(n, s, e);
             }
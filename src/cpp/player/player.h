@@ -7,10 +7,60 @@
 #include <k273/logging.h>
 #include <k273/strutils.h>
 
+#include <atomic>
 #include <string>
+#include <vector>
 
 namespace GGPLib {
 
+    struct ChildTelemetry {
+        // our legal for the move
+        int choice;
+        int visits;
+
+        // our score
+        double score;
+
+        // all moves as first statistics, for the role moving (if the player keeps them)
+        int amaf_visits;
+        double amaf_score;
+    };
+
+    struct Telemetry {
+        // statistics of the last search
+        double search_time;
+        double tree_playout_time;
+        double rollout_time;
+        double back_propagate_time;
+
+        int tree_playouts;
+        int rollouts;
+        int number_of_nodes;
+        long allocated_memory;
+        double average_depth;
+
+        // nodes with per role statistics, for simultaneous moves
+        int decoupled_nodes;
+
+        std::vector <ChildTelemetry> children;
+
+        void reset() {
+            this->search_time = 0.0;
+            this->tree_playout_time = 0.0;
+            this->rollout_time = 0.0;
+            this->back_propagate_time = 0.0;
+
+            this->tree_playouts = 0;
+            this->rollouts = 0;
+            this->number_of_nodes = 0;
+            this->allocated_memory = 0;
+            this->average_depth = 0.0;
+            this->decoupled_nodes = 0;
+
+            this->children.clear();
+        }
+    };
+
     class PlayerBase {
         /* abstract interface. */
 
@@ -18,7 +68,8 @@ namespace GGPLib {
         PlayerBase(StateMachineInterface* sm, int player_role_index) :
             sm(sm),
             our_role_index(player_role_index),
-            game_depth(0) {
+            game_depth(0),
+            best_choice_so_far(-1) {
         }
 
         virtual ~PlayerBase() {
@@ -39,13 +90,32 @@ namespace GGPLib {
         virtual void onApplyMove(JointMove* move) {
         }
 
+        // structured information about the last move, or nullptr if not supported
+        virtual const Telemetry* getTelemetry() const {
+            return nullptr;
+        }
+
 
         virtual int onNextMove(double end_time) = 0;
 
+        // the best choice of the search in onNextMove(), or -1 if not known.  Safe to call from
+        // another thread while onNextMove() is running (players publish it as they search).
+        int getBestChoiceSoFar() const {
+            return this->best_choice_so_far.load();
+        }
+
+    protected:
+        void setBestChoiceSoFar(int choice) {
+            this->best_choice_so_far.store(choice);
+        }
+
     protected:
         StateMachineInterface* sm;
         int our_role_index;
         int game_depth;
+
+    private:
+        std::atomic <int> best_choice_so_far;
     };
 
 }
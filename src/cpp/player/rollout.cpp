@@ -86,3 +86,80 @@ void DepthChargeRollout::doRollout(const BaseState* start_state, int game_depth)
         this->scores.emplace_back(this->sm->getGoalValue(ii));
     }
 }
+
+///////////////////////////////////////////////////////////////////////////////
+
+void WeightedRollout::setWeights(int role_index, const float* role_weights, int count) {
+    this->weights[role_index].assign(role_weights, role_weights + count);
+}
+
+int WeightedRollout::chooseLegal(int role_index, const LegalState* ls) {
+    const std::vector <float>& role_weights = this->weights[role_index];
+    if (role_weights.empty() || ls->getCount() == 1) {
+        return ls->getLegal(this->random.getWithMax(ls->getCount()));
+    }
+
+    // choices past the end of the weights have no weight
+    auto weight = [&role_weights](int choice) {
+        return choice < (int) role_weights.size() ? role_weights[choice] : 0.0f;
+    };
+
+    double total = 0.0;
+    for (int ii=0; ii<ls->getCount(); ii++) {
+        total += weight(ls->getLegal(ii));
+    }
+
+    if (total <= 0.0) {
+        return ls->getLegal(this->random.getWithMax(ls->getCount()));
+    }
+
+    const int resolution = 1 << 24;
+    double pick = total * (this->random.getWithMax(resolution) / (double) resolution);
+    for (int ii=0; ii<ls->getCount(); ii++) {
+        pick -= weight(ls->getLegal(ii));
+        if (pick < 0.0) {
+            return ls->getLegal(ii);
+        }
+    }
+
+    // rounding
+    return ls->getLegal(ls->getCount() - 1);
+}
+
+void WeightedRollout::doRollout(const BaseState* start_state, int game_depth) {
+    // game_depth not used
+
+    this->initial_state->assign(start_state);
+    this->sm->updateBases(this->initial_state);
+    ASSERT (!this->sm->isTerminal());
+
+    this->truncated = false;
+    this->depth = 0;
+    while (true) {
+        if (this->sm->isTerminal()) {
+            break;
+        }
+
+        if (this->depth == RolloutBase::MAX_NUMBER_STATES) {
+            this->truncated = true;
+            break;
+        }
+
+        JointMove* joint_move = this->getMove(this->depth);
+        BaseState* next_state = this->getBaseState(this->depth);
+
+        for (int ii=0; ii<this->sm->getRoleCount(); ii++) {
+            joint_move->set(ii, this->chooseLegal(ii, this->sm->getLegalState(ii)));
+        }
+
+        this->sm->nextState(joint_move, next_state);
+        this->sm->updateBases(next_state);
+
+        this->depth++;
+    }
+
+    this->scores.clear();
+    for (int ii=0; ii<this->sm->getRoleCount(); ii++) {
+        this->scores.emplace_back(this->truncated ? -1 : this->sm->getGoalValue(ii));
+    }
+}
@@ -35,6 +35,10 @@ namespace GGPLib {
             return reinterpret_cast <BaseState*> (this->states + (index * this->basestate_size));
         }
 
+        const BaseState* getInitialState() const {
+            return this->initial_state;
+        }
+
         const BaseState* getFinalBaseState() const {
             int idx = std::max(0, this->depth - 1);
             return this->getBaseState(idx);
@@ -80,5 +84,39 @@ namespace GGPLib {
         void doRollout(const BaseState* start_state, int game_depth);
     };
 
+
+    class WeightedRollout : public RolloutBase {
+        /* As DepthChargeRollout, but moves are chosen in proportion to per role weights over the
+           role's legals (uniform for roles without weights).  Stops rather than asserts at
+           MAX_NUMBER_STATES. */
+
+    public:
+        WeightedRollout(StateMachineInterface* sm) :
+            RolloutBase(sm),
+            truncated(false),
+            weights(sm->getRoleCount()) {
+        }
+
+        virtual ~WeightedRollout() {
+        }
+
+    public:
+        void setWeights(int role_index, const float* role_weights, int count);
+        void doRollout(const BaseState* start_state, int game_depth);
+
+        bool isTruncated() const {
+            return this->truncated;
+        }
+
+    private:
+        int chooseLegal(int role_index, const LegalState* ls);
+
+    private:
+        bool truncated;
+
+        // empty for uniform
+        std::vector <std::vector <float>> weights;
+    };
+
 }
 
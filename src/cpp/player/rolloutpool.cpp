@@ -0,0 +1,93 @@
+#include "player/rolloutpool.h"
+
+#include <k273/logging.h>
+#include <k273/exception.h>
+
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+RolloutWorkerPool::RolloutWorkerPool(const StateMachineInterface* sm, int number_of_threads) :
+    quit(false),
+    start_state(nullptr),
+    requested(0),
+    remaining(0),
+    completed(0),
+    depth_sum(0) {
+
+    ASSERT (number_of_threads > 0);
+
+    this->score_sums.resize(sm->getRoleCount(), 0);
+
+    for (int ii=0; ii<number_of_threads; ii++) {
+        this->rollouts.push_back(new DepthChargeRollout(sm->dupe()));
+    }
+
+    for (RolloutBase* rollout : this->rollouts) {
+        this->threads.emplace_back(&RolloutWorkerPool::workerLoop, this, rollout);
+    }
+
+    K273::l_info("Created RolloutWorkerPool with %d threads", number_of_threads);
+}
+
+RolloutWorkerPool::~RolloutWorkerPool() {
+    {
+        std::lock_guard <std::mutex> lock(this->mutex);
+        this->quit = true;
+    }
+
+    this->work_cv.notify_all();
+    for (std::thread& t : this->threads) {
+        t.join();
+    }
+
+    for (RolloutBase* rollout : this->rollouts) {
+        delete rollout;
+    }
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+void RolloutWorkerPool::doRollouts(const BaseState* start_state, int count) {
+    std::unique_lock <std::mutex> lock(this->mutex);
+
+    this->start_state = start_state;
+    this->requested = count;
+    this->remaining = count;
+    this->completed = 0;
+
+    std::fill(this->score_sums.begin(), this->score_sums.end(), 0);
+    this->depth_sum = 0;
+
+    this->work_cv.notify_all();
+    this->done_cv.wait(lock, [this] { return this->completed == this->requested; });
+}
+
+void RolloutWorkerPool::workerLoop(RolloutBase* rollout) {
+    std::unique_lock <std::mutex> lock(this->mutex);
+
+    while (true) {
+        this->work_cv.wait(lock, [this] { return this->quit || this->remaining > 0; });
+        if (this->quit) {
+            break;
+        }
+
+        this->remaining--;
+
+        // do the rollout without the lock
+        lock.unlock();
+        rollout->doRollout(this->start_state, 0);
+        lock.lock();
+
+        for (size_t ii=0; ii<this->score_sums.size(); ii++) {
+            this->score_sums[ii] += rollout->getScore(ii);
+        }
+
+        this->depth_sum += rollout->getDepth();
+
+        this->completed++;
+        if (this->completed == this->requested) {
+            this->done_cv.notify_one();
+        }
+    }
+}
@@ -0,0 +1,58 @@
+#pragma once
+
+#include "player/rollout.h"
+
+#include "statemachine/statemachine.h"
+#include "statemachine/basestate.h"
+
+#include <mutex>
+#include <thread>
+#include <vector>
+#include <condition_variable>
+
+namespace GGPLib {
+
+    class RolloutWorkerPool {
+        /* Runs a batch of rollouts from the same state on a number of worker threads.  Each
+           worker has its own rollout (and duped statemachine). */
+
+    public:
+        RolloutWorkerPool(const StateMachineInterface* sm, int number_of_threads);
+        ~RolloutWorkerPool();
+
+    public:
+        // blocks until all rollouts are done
+        void doRollouts(const BaseState* start_state, int count);
+
+        // results of the last batch
+        double getAverageScore(int role_index) const {
+            return this->score_sums[role_index] / (double) this->completed;
+        }
+
+        double getAverageDepth() const {
+            return this->depth_sum / (double) this->completed;
+        }
+
+    private:
+        void workerLoop(RolloutBase* rollout);
+
+    private:
+        std::vector <RolloutBase*> rollouts;
+        std::vector <std::thread> threads;
+
+        std::mutex mutex;
+        std::condition_variable work_cv;
+        std::condition_variable done_cv;
+        bool quit;
+
+        // current batch
+        const BaseState* start_state;
+        int requested;
+        int remaining;
+        int completed;
+
+        std::vector <long> score_sums;
+        long depth_sum;
+    };
+
+}
@@ -0,0 +1,71 @@
+#include "player/timemanager.h"
+
+#include <k273/logging.h>
+
+#include <algorithm>
+
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+void TimeManager::start(double enter_time, double end_time) {
+    this->enter_time = enter_time;
+    this->end_time = end_time;
+    this->soft_end_time = enter_time + (end_time - enter_time) * this->min_search_fraction;
+    this->last_best_choice = -1;
+}
+
+bool TimeManager::shouldStop(double now, int playouts,
+                             int best_choice, int best_visits, int second_visits, int total_visits,
+                             double expected_depth, double tree_depth) {
+
+    if (now >= this->end_time) {
+        return true;
+    }
+
+    const double elapsed = now - this->enter_time;
+    const double available = this->end_time - this->enter_time;
+
+    // always do a minimum amount of search (10% of the time available), for the stats to mean
+    // something
+    if (elapsed < available * 0.1 || total_visits == 0) {
+        return false;
+    }
+
+    // at the current rate, can the second best move catch up before time runs out?
+    const double playouts_per_second = playouts / std::max(elapsed, 0.001);
+    const double remaining_playouts = playouts_per_second * (this->end_time - now);
+    if (best_visits - second_visits > remaining_playouts) {
+        K273::l_info("TimeManager: best move cannot be overtaken (%d/%d, remaining %.0f)",
+                     best_visits, second_visits, remaining_playouts);
+        return true;
+    }
+
+    // the tree is already reaching the end of the game, more search is not going to help much
+    if (expected_depth > 0 && tree_depth >= expected_depth) {
+        K273::l_info("TimeManager: tree depth %.1f reaches expected end of game %.1f",
+                     tree_depth, expected_depth);
+        return true;
+    }
+
+    if (now < this->soft_end_time) {
+        return false;
+    }
+
+    // one move dominates
+    const double best_share = best_visits / (double) total_visits;
+    if (best_share >= this->dominant_visit_share) {
+        K273::l_info("TimeManager: dominant move (share %.2f)", best_share);
+        return true;
+    }
+
+    // stable since last time we checked?  Otherwise extend the search a little.
+    if (best_choice == this->last_best_choice) {
+        K273::l_info("TimeManager: best move stable (share %.2f)", best_share);
+        return true;
+    }
+
+    this->last_best_choice = best_choice;
+    this->soft_end_time = std::min(this->end_time, now + available * 0.1);
+    return false;
+}
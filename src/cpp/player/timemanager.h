@@ -0,0 +1,45 @@
+#pragma once
+
+namespace GGPLib {
+
+    class TimeManager {
+        /* Decides when a search should finish, rather than always using all of the time given.
+           Uses the rate of playouts, the stability of the best move at the root and an estimate
+           of how much of the game is left. */
+
+    public:
+        TimeManager(double min_search_fraction, double dominant_visit_share) :
+            min_search_fraction(min_search_fraction),
+            dominant_visit_share(dominant_visit_share),
+            enter_time(0.0),
+            end_time(0.0),
+            soft_end_time(0.0),
+            last_best_choice(-1) {
+        }
+
+    public:
+        // called at the start of every search
+        void start(double enter_time, double end_time);
+
+        // called periodically during a search.  total_visits/best_visits/second_visits are for the
+        // moves at the root, and tree_depth is the average depth of the tree playouts.
+        bool shouldStop(double now, int playouts,
+                        int best_choice, int best_visits, int second_visits, int total_visits,
+                        double expected_depth, double tree_depth);
+
+        double getSoftEndTime() const {
+            return this->soft_end_time;
+        }
+
+    private:
+        double min_search_fraction;
+        double dominant_visit_share;
+
+        double enter_time;
+        double end_time;
+        double soft_end_time;
+
+        int last_best_choice;
+    };
+
+}
@@ -0,0 +1,70 @@
+#include "player/trajectory.h"
+
+#include <k273/logging.h>
+#include <k273/exception.h>
+
+#include <cstring>
+
+using namespace K273;
+using namespace GGPLib;
+
+///////////////////////////////////////////////////////////////////////////////
+
+TrajectoryGenerator::TrajectoryGenerator(StateMachineInterface* sm) :
+    rollout(nullptr),
+    role_count(sm->getRoleCount()) {
+
+    BaseState* bs = sm->newBaseState();
+    this->state_byte_count = bs->byte_count * BaseState::ARRAYTYPE_BYTES;
+    ::free(bs);
+
+    // rollout takes ownership of sm
+    this->rollout = new WeightedRollout(sm);
+
+    const int max_ints = (TrajectoryGenerator::HEADER_INTS + this->role_count +
+                          RolloutBase::MAX_NUMBER_STATES * this->role_count);
+    this->buf.resize(max_ints * sizeof(int32_t) +
+                     (RolloutBase::MAX_NUMBER_STATES + 1) * this->state_byte_count);
+}
+
+TrajectoryGenerator::~TrajectoryGenerator() {
+    delete this->rollout;
+}
+
+///////////////////////////////////////////////////////////////////////////////
+
+int TrajectoryGenerator::generate(const BaseState* start_state) {
+    this->rollout->doRollout(start_state, 0);
+
+    // const, for the public accessors
+    const WeightedRollout* rollout = this->rollout;
+    const int depth = rollout->getDepth();
+
+    int32_t* pt_int = reinterpret_cast <int32_t*> (this->buf.data());
+    *pt_int++ = depth;
+    *pt_int++ = this->role_count;
+    *pt_int++ = this->state_byte_count;
+    *pt_int++ = rollout->isTruncated() ? 1 : 0;
+
+    for (int ii=0; ii<this->role_count; ii++) {
+        *pt_int++ = rollout->getScore(ii);
+    }
+
+    for (int ii=0; ii<depth; ii++) {
+        const JointMove* move = rollout->getMove(ii);
+        for (int jj=0; jj<this->role_count; jj++) {
+            *pt_int++ = move->get(jj);
+        }
+    }
+
+    char* pt_state = reinterpret_cast <char*> (pt_int);
+    std::memcpy(pt_state, rollout->getInitialState()->data, this->state_byte_count);
+    pt_state += this->state_byte_count;
+
+    for (int ii=0; ii<depth; ii++) {
+        std::memcpy(pt_state, rollout->getBaseState(ii)->data, this->state_byte_count);
+        pt_state += this->state_byte_count;
+    }
+
+    return pt_state - this->buf.data();
+}
@@ -0,0 +1,52 @@
+#pragma once
+
+#include "player/rollout.h"
+
+#include "statemachine/statemachine.h"
+#include "statemachine/basestate.h"
+
+#include <vector>
+#include <cstdint>
+
+namespace GGPLib {
+
+    class TrajectoryGenerator {
+        /* Plays whole games with a WeightedRollout, and packs each one into a single contiguous
+           buffer (so it can be handed to python without copying).  Layout, all int32 other than
+           the states:
+
+             header     : depth, role_count, state_byte_count, truncated
+             scores     : role_count (-1 if truncated)
+             moves      : depth * role_count legal choices
+             states     : (depth + 1) * state_byte_count packed bases, starting with the start state
+
+           The buffer is allocated for the longest possible game upfront, so it never moves. */
+
+    public:
+        TrajectoryGenerator(StateMachineInterface* sm);
+        ~TrajectoryGenerator();
+
+    public:
+        void setWeights(int role_index, const float* weights, int count) {
+            this->rollout->setWeights(role_index, weights, count);
+        }
+
+        // returns size of trajectory in bytes
+        int generate(const BaseState* start_state);
+
+        const char* getBuffer() const {
+            return this->buf.data();
+        }
+
+    private:
+        WeightedRollout* rollout;
+        int role_count;
+        int state_byte_count;
+
+        std::vector <char> buf;
+
+    public:
+        static const int HEADER_INTS = 4;
+    };
+
+}
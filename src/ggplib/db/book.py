@@ -0,0 +1,82 @@
+''' opening books - root statistics of long offline searches, stored in the game's directory (next
+to sm_info.json).  See ggplib/scripts/build_book.py. '''
+
+import json
+import binascii
+
+from ggplib.util import log
+from ggplib.db import lookup
+
+BOOK_FILENAME = "book.json"
+
+
+def state_key(base_state):
+    ' the packed base state, as hex (hash codes can collide) '
+    return binascii.hexlify(base_state.to_bytes())
+
+
+class OpeningBook:
+    def __init__(self, game, entries=None, the_game_store=None):
+        self.game = game
+
+        # state_key() -> role_index -> dict(ply=, children=[dict(choice=, visits=, score=)])
+        # (keys are strings, as stored in json)
+        self.entries = entries if entries is not None else {}
+
+        # None is the game's directory in the games store
+        self.the_game_store = the_game_store
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, base_state, role_index, ply, children):
+        ' children are as from get_telemetry() '
+        children = sorted(children, key=lambda c: c["visits"], reverse=True)
+        children = [dict(choice=c["choice"], visits=c["visits"], score=c["score"]) for c in children]
+
+        per_role = self.entries.setdefault(state_key(base_state), {})
+        per_role[str(role_index)] = dict(ply=ply, children=children)
+
+    def get_entry(self, base_state, role_index):
+        per_role = self.entries.get(state_key(base_state))
+        if per_role is None:
+            return None
+
+        return per_role.get(str(role_index))
+
+    def get_choice(self, base_state, role_index):
+        ' returns the most visited choice, or None if not in the book '
+        entry = self.get_entry(base_state, role_index)
+        if entry is None or not entry["children"]:
+            return None
+
+        return entry["children"][0]["choice"]
+
+    def save(self):
+        the_game_store = self.the_game_store
+        if the_game_store is None:
+            the_game_store = get_game_store(self.game)
+
+        the_game_store.save_contents(BOOK_FILENAME, json.dumps(self.entries), overwrite=True)
+        log.info("Saved opening book for %s with %d states" % (self.game, len(self)))
+
+
+def get_game_store(game):
+    return lookup.get_database(verbose=False).games_store.get_directory(game)
+
+
+def load(game, create=False, the_game_store=None):
+    ''' returns the opening book for game, None if there is no book (or an empty book if create).
+        the_game_store defaults to the game's directory in the games store. '''
+    if the_game_store is None:
+        try:
+            the_game_store = get_game_store(game)
+
+        except Exception as exc:
+            log.debug("No game store for %s: %s" % (game, exc))
+            return OpeningBook(game) if create else None
+
+    if not the_game_store.file_exists(BOOK_FILENAME):
+        return OpeningBook(game, the_game_store=the_game_store) if create else None
+
+    return OpeningBook(game, the_game_store.load_json(BOOK_FILENAME), the_game_store=the_game_store)
@@ -1,7 +1,13 @@
 import sys
+import json
+import time
+import hashlib
+import threading
 import traceback
+from collections import OrderedDict
 
 from ggplib.util import log
+from ggplib.util.symbols import tokenize
 from ggplib.statemachine import builder
 from ggplib.db import signature
 
@@ -22,6 +28,12 @@ class GameInfo(object):
         self.sm = None
         self.model = None
 
+        # seconds taken to build the statemachine, on loading
+        self.build_time = None
+
+        # matches of the same game may be started on several threads at once
+        self.load_lock = threading.Lock()
+
     def get_symbol_map(self):
         if self.sigs is None:
             idx, self.sigs = signature.get_index(self.gdl_str, verbose=False)
@@ -33,14 +45,17 @@ class GameInfo(object):
             self.symbol_map = signature.build_symbol_map(self.sigs, verbose=False)
 
     def lazy_load(self, the_game_store):
-        if self.sm is None:
-            # ok here we can cache the game XXX
+        with self.load_lock:
+            if self.sm is None:
+                # ok here we can cache the game XXX
 
-            self.model, self.sm = builder.build_sm(self.gdl_str,
-                                                   the_game_store=the_game_store,
-                                                   add_to_game_store=True)
+                start_time = time.time()
+                self.model, self.sm = builder.build_sm(self.gdl_str,
+                                                       the_game_store=the_game_store,
+                                                       add_to_game_store=True)
+                self.build_time = time.time() - start_time
 
-            log.verbose("Lazy loading done for %s" % self.game)
+                log.verbose("Lazy loading done for %s" % self.game)
 
     def get_sm(self):
         return self.sm.dupe()
@@ -59,6 +74,22 @@ class TempGameInfo(object):
 
 ###############################################################################
 
+# game directory of the store, json of gdl_hash() -> [game, mapping]
+GDL_CACHE_FILENAME = "gdl_cache.json"
+
+
+def gdl_hash(gdl):
+    ''' hash of the gdl tokens (comments and whitespace do not matter).  gdl is a string or
+        symbols, the same rules hash the same either way. '''
+    if isinstance(gdl, str):
+        lines = [line.split(";")[0].strip() for line in gdl.splitlines()]
+        text = " ".join(line for line in lines if line)
+    else:
+        text = " ".join(str(s) for s in gdl)
+
+    return hashlib.sha1(" ".join(tokenize(text))).hexdigest()
+
+
 class LookupFailed(Exception):
     pass
 
@@ -73,6 +104,12 @@ class GameDatabase:
         self.idx_mapping = {}
         self.game_mapping = {}
 
+        # gdl_hash() -> (game, mapping), of previous lookups
+        self.gdl_cache = {}
+        self.gdl_cache_hits = 0
+        self.gdl_cache_misses = 0
+        self.gdl_cache_lock = threading.Lock()
+
     @property
     def all_games(self):
         return self.game_mapping.keys()
@@ -122,6 +159,32 @@ class GameDatabase:
             self.idx_mapping[info.idx] = info
             self.game_mapping[info.game] = info
 
+        self.load_gdl_cache()
+
+    def load_gdl_cache(self):
+        if not self.games_store.file_exists(GDL_CACHE_FILENAME):
+            return
+
+        try:
+            cache = self.games_store.load_json(GDL_CACHE_FILENAME)
+
+        except ValueError as exc:
+            log.warning("Ignoring corrupt %s: %s" % (GDL_CACHE_FILENAME, exc))
+            return
+
+        for key, (game, mapping) in cache.items():
+            # games may have since been removed from the rulesheets
+            if game in self.game_mapping:
+                self.gdl_cache[key] = (game, mapping)
+
+    def add_to_gdl_cache(self, key, game, mapping):
+        with self.gdl_cache_lock:
+            self.gdl_cache[key] = (game, mapping)
+
+            # (last writer wins between processes, it is only a cache)
+            contents = json.dumps(dict((k, list(v)) for k, v in self.gdl_cache.items()))
+            self.games_store.save_contents(GDL_CACHE_FILENAME, contents, overwrite=True)
+
     def get_by_name(self, name):
         if name not in self.game_mapping:
             raise LookupFailed("Did not find game: %s" % name)
@@ -134,8 +197,26 @@ class GameDatabase:
 
         return info
 
-    def lookup(self, gdl_str):
-        idx, sig = signature.get_index(gdl_str, verbose=False)
+    def lookup(self, gdl):
+        ' gdl is a string or symbols '
+        key = gdl_hash(gdl)
+        cached = self.gdl_cache.get(key)
+        if cached is not None:
+            self.gdl_cache_hits += 1
+            game, mapping = cached
+            info = self.game_mapping[game]
+            info.lazy_load(self.games_store.get_directory(game))
+
+            # a copy, the caller may hold onto it
+            return info, dict(mapping) if mapping else None
+
+        self.gdl_cache_misses += 1
+        info, mapping = self.lookup_by_signature(gdl)
+        self.add_to_gdl_cache(key, info.game, mapping)
+        return info, dict(mapping) if mapping else None
+
+    def lookup_by_signature(self, gdl):
+        idx, sig = signature.get_index(gdl, verbose=False)
 
         if idx not in self.idx_mapping:
             raise LookupFailed("Did not find game : %s" % idx)
@@ -143,7 +224,7 @@ class GameDatabase:
 
         info.get_symbol_map()
 
-        # create the symbol map for this gdl_str
+        # create the symbol map for this gdl
         symbol_map = signature.build_symbol_map(sig, verbose=False)
 
         new_mapping = {}
@@ -184,12 +265,15 @@ class GameDatabase:
 # The API:
 
 the_database = None
+database_lock = threading.Lock()
 def get_database(verbose=True):
     global the_database
-    if the_database is None:
-        from ggplib.db.store import get_root
-        the_database = GameDatabase(get_root())
-        the_database.load(verbose=verbose)
+    with database_lock:
+        if the_database is None:
+            from ggplib.db.store import get_root
+            db = GameDatabase(get_root())
+            db.load(verbose=verbose)
+            the_database = db
 
     return the_database
 
@@ -210,30 +294,63 @@ def by_name(name, build_sm=True):
         log.error(traceback.format_exc())
         raise LookupFailed(msg)
 
+# matches may be started from several threads at once (see web/server.py).  Building a
+# statemachine can take minutes, so the lookup of a gdl holds one of a few locks picked by its
+# hash - only starts of the same game (or of an unlucky collision) wait on each other.
+# lookup_lock itself is only held while touching temp_game_infos.
+gdl_locks = [threading.Lock() for _ in range(16)]
+lookup_lock = threading.Lock()
+
+# gdl_hash() -> TempGameInfo, of the most recently used games not in the database.  So a game
+# is built once, rather than once per match, without keeping every game ever played.
+MAX_TEMP_GAME_INFOS = 8
+temp_game_infos = OrderedDict()
+
+
+def get_temp_game_info(key):
+    with lookup_lock:
+        info = temp_game_infos.pop(key, None)
+        if info is not None:
+            # now the most recently used
+            temp_game_infos[key] = info
+        return info
+
+
+def add_temp_game_info(key, info):
+    with lookup_lock:
+        temp_game_infos[key] = info
+        while len(temp_game_infos) > MAX_TEMP_GAME_INFOS:
+            # (any matches still playing it hold their own reference)
+            temp_game_infos.popitem(last=False)
+
+
 def by_gdl(gdl):
-    try:
-        gdl_str = gdl
-        if not isinstance(gdl, str):
-            lines = []
-            for s in gdl:
-                lines.append(str(s))
-            gdl_str = "\n".join(lines)
-
-        db = get_database()
+    ' gdl is a string, or symbols (which are used as is, rather than being serialised and parsed again) '
+    if not isinstance(gdl, str):
+        gdl = list(gdl)
+
+    key = gdl_hash(gdl)
+    with gdl_locks[int(key[:8], 16) % len(gdl_locks)]:
         try:
-            info, mapping = db.lookup(gdl_str)
+            db = get_database()
+            try:
+                info, mapping = db.lookup(gdl)
 
-        except LookupFailed as exc:
-            etype, value, tb = sys.exc_info()
-            traceback.print_exc()
-            raise LookupFailed("Did not find game %s" % exc)
+            except LookupFailed as exc:
+                etype, value, tb = sys.exc_info()
+                traceback.print_exc()
+                raise LookupFailed("Did not find game %s" % exc)
 
-        return mapping, info
+            return mapping, info
 
-    except Exception as exc:
-        # creates temporary files
-        log.error("Lookup failed: %s" % exc)
+        except Exception as exc:
+            # creates temporary files
+            log.error("Lookup failed: %s" % exc)
+
+            info = get_temp_game_info(key)
+            if info is None:
+                model, sm = builder.build_sm(gdl)
+                info = TempGameInfo("unknown", gdl, sm, model)
+                add_temp_game_info(key, info)
 
-        model, sm = builder.build_sm(gdl)
-        info = TempGameInfo("unknown", gdl, sm, model)
-        return None, info
+            return None, info
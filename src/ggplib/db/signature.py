@@ -508,9 +508,13 @@ def build_symbol_map(sig, verbose=False):
 
 ###############################################################################
 
-def get_index(gdl_str, verbose=False):
+def get_index(gdl, verbose=False):
+    ' gdl is either a string, or already symbolised (a sequence of Term/ListTerm - as the web server has) '
     factory = SymbolFactory()
-    ruleset = list(factory.to_symbols(gdl_str))
+    if isinstance(gdl, str):
+        ruleset = list(factory.to_symbols(gdl))
+    else:
+        ruleset = list(gdl)
 
     # XXX bah, only works if rules/facts are in same order
     fact_db = OrderedDict()
@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+
+from ggplib import interface
+from ggplib.db import book, lookup
+from ggplib.db.store import DirectoryStore
+from ggplib.db.helper import get_gdl_for_game
+from ggplib.player import get, bookbuilder
+from ggplib.player.gamemaster import GameMaster
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_book_add_lookup():
+    sm = lookup.by_name("ticTacToe").get_sm()
+    sm.reset()
+    initial_state = sm.get_current_state()
+
+    the_book = book.OpeningBook("ticTacToe")
+    assert the_book.get_choice(initial_state, 0) is None
+
+    children = [dict(choice=3, visits=10, score=0.5),
+                dict(choice=4, visits=100, score=0.6)]
+    the_book.add(initial_state, 0, 0, children)
+
+    assert len(the_book) == 1
+    assert the_book.get_choice(initial_state, 0) == 4
+    assert the_book.get_choice(initial_state, 1) is None
+
+
+def test_build_and_play_from_book():
+    directory = tempfile.mkdtemp()
+    the_game_store = DirectoryStore(directory)
+    assert book.load("ticTacToe", the_game_store=the_game_store) is None
+
+    try:
+        bookbuilder.build("ticTacToe", 2, 0.5, 1, the_game_store=the_game_store)
+        the_book = book.load("ticTacToe", the_game_store=the_game_store)
+        assert the_book is not None
+        assert len(the_book) == 2
+
+        gm = GameMaster(get_gdl_for_game("ticTacToe"))
+
+        a = get.get_player("simplemcts")
+        a.max_tree_search_time = 0.25
+        a.use_opening_book = True
+        a.opening_book_store = the_game_store
+
+        b = get.get_player("simplemcts")
+        b.max_tree_search_time = 0.25
+
+        gm.add_player(a, "xplayer")
+        gm.add_player(b, "oplayer")
+
+        gm.start(meta_time=2, move_time=1)
+        gm.play_to_end()
+
+        # first move was from the book
+        telemetry = gm.matches[0].move_info[0]["telemetry"]
+        assert telemetry["book"]
+        assert telemetry["tree_playouts"] == 0
+        initial_state = gm.matches[0].get_state(0)
+        assert telemetry["children"][0]["choice"] == the_book.get_choice(initial_state, 0)
+        interface.dealloc_basestate(initial_state)
+
+        for match in gm.matches:
+            match.cleanup()
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_illegal_book_choice():
+    directory = tempfile.mkdtemp()
+    the_game_store = DirectoryStore(directory)
+
+    try:
+        # a book with an illegal choice for the initial state (as a corrupt book could have)
+        info = lookup.by_name("ticTacToe")
+        sm = info.get_sm()
+        sm.reset()
+        initial_state = sm.get_current_state()
+        illegal = [c for c in range(len(info.model.actions[0]))
+                   if c not in sm.get_legal_state(0).to_list()][0]
+
+        the_book = book.OpeningBook("ticTacToe", the_game_store=the_game_store)
+        the_book.add(initial_state, 0, 0, [dict(choice=illegal, visits=100, score=1.0)])
+        the_book.save()
+
+        gm = GameMaster(get_gdl_for_game("ticTacToe"))
+
+        a = get.get_player("simplemcts")
+        a.max_tree_search_time = 0.25
+        a.use_opening_book = True
+        a.opening_book_store = the_game_store
+
+        gm.add_player(a, "xplayer")
+        gm.add_player(get.get_player("random"), "oplayer")
+
+        gm.start(meta_time=2, move_time=1)
+        gm.play_to_end()
+
+        # searched instead
+        telemetry = gm.matches[0].move_info[0]["telemetry"]
+        assert "book" not in telemetry
+        assert telemetry["tree_playouts"] > 0
+
+        for match in gm.matches:
+            match.cleanup()
+
+    finally:
+        shutil.rmtree(directory)
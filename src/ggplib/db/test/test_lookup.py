@@ -96,13 +96,72 @@ def test_not_in_database():
     assert info.game == "unknown"
     sm = info.get_sm()
 
+    # only built once
+    assert lookup.by_gdl(some_simple_game)[1] is info
+
     # run rollouts in c++
     msecs_taken, rollouts, _ = interface.depth_charge(sm, 1)
     rollouts_per_second = (rollouts / float(msecs_taken)) * 1000
     log.info("c++ rollouts per second %.2f" % rollouts_per_second)
 
+    # only the most recently used games are kept
+    other_games = [some_simple_game.replace("(goal white 90)", "(goal white %d)" % score)
+                   for score in range(91, 91 + lookup.MAX_TEMP_GAME_INFOS)]
+    for gdl in other_games:
+        assert lookup.by_gdl(gdl)[1] is not info
+
+    assert len(lookup.temp_game_infos) == lookup.MAX_TEMP_GAME_INFOS
+    assert lookup.gdl_hash(some_simple_game) not in lookup.temp_game_infos
+    assert lookup.by_gdl(other_games[-1])[1] is lookup.temp_game_infos.values()[-1]
+
 
 # this could be potentially super slow first time around
 @pytest.mark.slow
 def test_lookup_for_all_games():
     lookup_all_games()
+
+
+def test_gdl_cache():
+    gdl_str = get_gdl_for_game("ticTacToe").replace("mark", "kram").replace("cell", "bell")
+
+    db = lookup.get_database()
+    key = lookup.gdl_hash(gdl_str)
+    db.gdl_cache.pop(key, None)
+
+    mapping, info = lookup.by_gdl(gdl_str)
+    assert info.game == "ticTacToe"
+    assert mapping["kram"] == "mark"
+    assert key in db.gdl_cache
+
+    # comments and whitespace are not part of the hash
+    assert lookup.gdl_hash("; a comment\n" + gdl_str.replace(" ", "   ")) == key
+
+    # from the cache
+    cached_mapping, cached_info = lookup.by_gdl(gdl_str)
+    assert cached_info is info
+    assert cached_mapping == mapping
+
+    # and persisted in the store
+    from ggplib.db.store import get_root
+    other_db = lookup.GameDatabase(get_root())
+    other_db.load(verbose=False)
+    assert other_db.gdl_cache[key] == ("ticTacToe", mapping)
+
+
+def test_lookup_with_symbols():
+    from ggplib.util.symbols import SymbolFactory
+
+    gdl_str = get_gdl_for_game("ticTacToe").replace("mark", "kram")
+    gdl_symbols = SymbolFactory().symbolize("(%s\n)" % gdl_str)
+
+    assert lookup.gdl_hash(gdl_symbols) == lookup.gdl_hash(gdl_str)
+    assert signature.get_index(gdl_symbols)[0] == signature.get_index(gdl_str)[0]
+
+    db = lookup.get_database()
+    db.gdl_cache.pop(lookup.gdl_hash(gdl_str), None)
+
+    mapping, info = lookup.by_gdl(gdl_symbols)
+    assert info.game == "ticTacToe"
+    assert mapping["kram"] == "mark"
+
+    assert lookup.by_gdl(gdl_str) == (mapping, info)
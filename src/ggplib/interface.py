@@ -1,4 +1,6 @@
 import os
+import struct
+import traceback
 from cffi import FFI
 
 from ggplib.util import log
@@ -21,6 +23,7 @@ def get_lib():
             "boolean" : "int",
             "PlayerBase*" : "void*",
             "DepthChargeTest*" : "void*",
+            "TrajectoryGenerator*" : "void*",
         }
 
         for k, v in remap.items():
@@ -80,6 +83,19 @@ class BaseState:
     def len(self):
         return lib.BaseState__len(self.c_base_state)
 
+    def byte_count(self):
+        return lib.BaseState__byteCount(self.c_base_state)
+
+    def to_bytes(self):
+        ' the packed bases, as a string of byte_count() bytes '
+        buf = ffi.new("char[]", self.byte_count())
+        lib.BaseState__getBytes(self.c_base_state, buf)
+        return ffi.buffer(buf)[:]
+
+    def from_bytes(self, buf):
+        assert len(buf) == self.byte_count()
+        lib.BaseState__setBytes(self.c_base_state, buf)
+
     def __eq__(self, other):
         return self.equals(other)
 
@@ -222,6 +238,11 @@ def dealloc_statemachine(sm):
 
 ###############################################################################
 
+TELEMETRY_FIELDS = ("search_time tree_playout_time rollout_time back_propagate_time "
+                    "tree_playouts rollouts number_of_nodes allocated_memory average_depth "
+                    "decoupled_nodes").split()
+
+
 class CppPlayerWrapper:
     def __init__(self, c_player):
         self.c_player = c_player
@@ -240,9 +261,37 @@ class CppPlayerWrapper:
     def on_apply_move(self, move):
         lib.PlayerBase__onApplyMove(self.c_player, move.c_joint_move)
 
+    def best_choice_so_far(self):
+        ' thread safe, may be called while on_next_move() is running.  None if not known. '
+        choice = lib.PlayerBase__getBestChoiceSoFar(self.c_player)
+        return choice if choice >= 0 else None
+
     def on_next_move(self, finish_time):
         return lib.PlayerBase__onNextMove(self.c_player, finish_time)
 
+    def get_telemetry(self):
+        ' returns a dict of statistics about the last move, or None if not supported by player '
+        c_telemetry = ffi.new("PlayerTelemetry*")
+        if not lib.PlayerBase__getTelemetry(self.c_player, c_telemetry):
+            return None
+
+        res = {}
+        for name in TELEMETRY_FIELDS:
+            res[name] = getattr(c_telemetry, name)
+
+        children = []
+        c_child = ffi.new("PlayerChildTelemetry*")
+        for ii in range(c_telemetry.number_of_children):
+            if lib.PlayerBase__getChildTelemetry(self.c_player, ii, c_child):
+                children.append(dict(choice=c_child.choice,
+                                     visits=c_child.visits,
+                                     score=c_child.score,
+                                     amaf_visits=c_child.amaf_visits,
+                                     amaf_score=c_child.amaf_score))
+
+        res["children"] = children
+        return res
+
 
 ###############################################################################
 # separate function to create player (since will different configuration for each player type)
@@ -258,10 +307,44 @@ def create_legal_player(sm, our_role_index):
     return CppPlayerWrapper(lib.Player__createLegalPlayer(sm.c_statemachine, our_role_index))
 
 
+def create_mcs_player(sm, our_role_index, max_run_time, max_iterations, ucb_constant):
+    return CppPlayerWrapper(lib.Player__createMCSPlayer(sm.c_statemachine, our_role_index,
+                                                        max_run_time, max_iterations, ucb_constant))
+
+
 def create_simple_mcts_player(sm, our_role_index, *args):
     return CppPlayerWrapper(lib.Player__createSimpleMCTSPlayer(sm.c_statemachine, our_role_index, *args))
 
 
+def set_simple_mcts_leaf_evaluator(player, evaluator, role_count, state_byte_count,
+                                   batch_size, policy_size, virtual_loss):
+    ''' evaluator is called as evaluator(count, states, values, priors), with writable buffers
+        (zero copy, use numpy.frombuffer() for arrays).  states are count packed base states of
+        state_byte_count bytes.  values are float32[count * role_count] (0 to 1), and priors are
+        float32[count * role_count * policy_size] indexed by legal choice.
+
+        If the evaluator raises, the search is stopped and the exception is kept in
+        player.leaf_evaluator_error (to be raised once the search has returned). '''
+
+    player.leaf_evaluator_error = None
+
+    def callback(count, c_states, c_values, c_priors):
+        evaluator(count,
+                  ffi.buffer(c_states, count * state_byte_count),
+                  ffi.buffer(c_values, count * role_count * 4),
+                  ffi.buffer(c_priors, count * role_count * policy_size * 4))
+        return 1
+
+    def onerror(exc_type, exc_value, tb):
+        log.error("leaf evaluator failed: %s" % "".join(traceback.format_exception(exc_type, exc_value, tb)))
+        player.leaf_evaluator_error = exc_value
+
+    # must be kept alive as long as the player.  Returns 0 (the search stops) if callback raises.
+    player.c_leaf_evaluator = ffi.callback("LeafEvaluator", callback, error=0, onerror=onerror)
+    lib.Player__setSimpleMCTSLeafEvaluator(player.c_player, player.c_leaf_evaluator,
+                                           batch_size, policy_size, virtual_loss)
+
+
 ###############################################################################
 
 class Logging:
@@ -298,6 +381,82 @@ def depth_charge(sm, seconds):
     return msecs, rollouts, num_state_changes
 
 
+###############################################################################
+
+TRAJECTORY_HEADER_INTS = 4
+
+
+class Trajectory:
+    ' a view onto a packed trajectory (see cpp/player/trajectory.h for the layout) '
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.depth, self.role_count, self.state_byte_count, truncated = struct.unpack_from("<4i", buf, 0)
+        self.truncated = bool(truncated)
+
+        self.scores_offset = TRAJECTORY_HEADER_INTS * 4
+        self.moves_offset = self.scores_offset + self.role_count * 4
+        self.states_offset = self.moves_offset + self.depth * self.role_count * 4
+
+    def get_scores(self):
+        return list(struct.unpack_from("<%di" % self.role_count, self.buf, self.scores_offset))
+
+    def get_joint_move(self, index):
+        return list(struct.unpack_from("<%di" % self.role_count, self.buf,
+                                       self.moves_offset + index * self.role_count * 4))
+
+    def get_state_bytes(self, index):
+        ' index 0 is the start state, depth is the final state '
+        start = self.states_offset + index * self.state_byte_count
+        return self.buf[start:start + self.state_byte_count]
+
+
+class TrajectoryGenerator:
+    def __init__(self, sm):
+        # the c++ generator has its own dupe of sm
+        self.c_generator = lib.TrajectoryGenerator__create(sm.c_statemachine)
+        self.role_count = len(sm.get_roles())
+
+    def set_weights(self, role_index, weights):
+        ' weights has an entry for every action of the role (ie indexed by legal choice) '
+        c_weights = ffi.new("float[]", list(weights))
+        lib.TrajectoryGenerator__setWeights(self.c_generator, role_index, c_weights, len(weights))
+
+    def generate(self, start_state):
+        ' returns a buffer - valid only until the next call to generate() '
+        size = lib.TrajectoryGenerator__generate(self.c_generator, start_state.c_base_state)
+        return ffi.buffer(lib.TrajectoryGenerator__getBuffer(self.c_generator), size)
+
+    def cleanup(self):
+        lib.TrajectoryGenerator__delete(self.c_generator)
+        self.c_generator = None
+
+
+def trajectories(sm, number_of_games, start_state=None, weights=None):
+    ''' generator of Trajectory objects, each a whole game played from start_state (the initial
+        state by default).  weights is an optional list (per role) of per action weights, None for
+        uniform random.  The underlying buffer is reused, copy it to keep it beyond the next
+        iteration. '''
+    generator = TrajectoryGenerator(sm)
+    if weights is not None:
+        for role_index, role_weights in enumerate(weights):
+            if role_weights is not None:
+                generator.set_weights(role_index, role_weights)
+
+    own_state = start_state is None
+    if own_state:
+        start_state = sm.get_initial_state()
+
+    try:
+        for _ in range(number_of_games):
+            yield Trajectory(generator.generate(start_state))
+
+    finally:
+        generator.cleanup()
+        if own_state:
+            dealloc_basestate(start_state)
+
+
 ###############################################################################
 
 def initialise_k273(log_level, log_name_base="logfile"):
@@ -1,40 +1,78 @@
-from twisted.internet import reactor
-from twisted.web import server
-
 from ggplib.util import log
 from ggplib import interface
-from ggplib.web.server import GGPServer
+
+# the totals for all matches, when playing more than one match at a time
+MAX_THREADS = 8
+MAX_MEMORY = 1024 * 1024 * 1024 * 12
 
 
-def play_runner(player, port):
+def play_runner(player, port, player_factory=None, max_matches=1, light=False):
+    ''' with a player_factory, plays up to max_matches at once - each with a new player from the
+        factory (player is only used for its name).  light uses the server without twisted (see
+        web/light_server.py), twisted is then never imported. '''
     interface.initialise_k273(1, log_name_base=player.get_name())
     log.initialise()
 
-    ggp = GGPServer()
-    ggp.set_player(player)
-    site = server.Site(ggp)
+    if light:
+        from ggplib.web.light_server import LightGGPServer
+        ggp = LightGGPServer()
+    else:
+        from ggplib.web.server import GGPServer
+        ggp = GGPServer()
+
+    if player_factory is None:
+        ggp.set_player(player)
+    else:
+        ggp.set_player_factory(player_factory, max_matches, MAX_THREADS, MAX_MEMORY)
+
+    log.info("Running player '%s' on port %d, %d matches at once%s" % (player.get_name(), port, max_matches,
+                                                                       " (light server)" if light else ""))
+
+    if light:
+        from ggplib.web.light_server import create_server
+        create_server(ggp, port).serve_forever()
 
-    log.info("Running player '%s' on port %d" % (player.get_name(), port))
+    else:
+        from twisted.internet import reactor
+        from twisted.web import server
 
-    reactor.listenTCP(port, site)
-    reactor.run()
+        reactor.listenTCP(port, server.Site(ggp))
+        reactor.run()
 
 
 def main():
+    ' usage: play.py [--light] player_type port [player_name [max_matches]] '
     import sys
     from ggplib.player.get import get_player
 
+    light = "--light" in sys.argv
+    if light:
+        sys.argv.remove("--light")
+
     player_type = sys.argv[1]
     port = int(sys.argv[2])
 
     # if third argument, set to player name
     try:
         player_name = sys.argv[3]
-        player = get_player(player_type, player_name=player_name)
     except IndexError:
-        player = get_player(player_type)
+        player_name = None
+
+    def player_factory():
+        if player_name is None:
+            return get_player(player_type)
+        return get_player(player_type, player_name=player_name)
+
+    try:
+        max_matches = int(sys.argv[4])
+    except IndexError:
+        max_matches = 1
 
-    play_runner(player, port)
+    player = player_factory()
+    if max_matches > 1:
+        play_runner(player, port, player_factory=player_factory, max_matches=max_matches, light=light)
+    else:
+        play_runner(player, port, light=light)
 
 
 ###############################################################################
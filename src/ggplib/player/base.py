@@ -22,12 +22,27 @@ class MatchPlayer(object):
     def before_apply_info(self):
         return ""
 
+    def get_telemetry(self):
+        ' return a dict of statistics about the last move played (or None) '
+        return None
+
     def on_apply_move(self, move):
         pass
 
     def on_next_move(self, finish_time):
         assert False, "Not implemented"
 
+    def set_resources(self, threads, memory):
+        ''' called before the match starts, when sharing a server with other matches.  The most
+            threads (including the one calling on_next_move()) and (tree) memory in bytes the
+            player should use. '''
+        pass
+
+    def best_choice_so_far(self):
+        ''' called from another thread while on_next_move() is running, if it has overrun.  Returns
+            the best legal choice so far, or None if not known. '''
+        return None
+
     def cleanup(self):
         ' clean up any memory allocated, etc '
         pass
@@ -0,0 +1,87 @@
+''' offline search of the first plies of a game, to build opening books (see ggplib.db.book) '''
+
+import random
+
+from ggplib.util import log
+from ggplib import interface
+from ggplib.db import book
+from ggplib.db.helper import get_gdl_for_game
+from ggplib.player.gamemaster import GameMaster
+from ggplib.player.simplemcts import SimpleMctsPlayer
+
+
+class BookBuilderPlayer(SimpleMctsPlayer):
+    skip_single_moves = True
+    dump_depth = 1
+
+    # searches a long time, and plays a visit weighted move after the first game (so the book
+    # covers more than one line)
+    explore = False
+
+    def on_next_move(self, finish_time):
+        choice = SimpleMctsPlayer.on_next_move(self, finish_time)
+        if not self.explore:
+            return choice
+
+        telemetry = self.get_telemetry()
+        if not telemetry or not telemetry["children"]:
+            return choice
+
+        total_visits = sum(c["visits"] for c in telemetry["children"])
+        if total_visits == 0:
+            return choice
+
+        pick = random.randrange(total_visits)
+        for c in telemetry["children"]:
+            pick -= c["visits"]
+            if pick < 0:
+                return c["choice"]
+
+        return choice
+
+
+def build(game, plies, move_time, number_of_games, the_game_store=None):
+    the_book = book.load(game, create=True, the_game_store=the_game_store)
+
+    gm = GameMaster(get_gdl_for_game(game))
+    roles = gm.sm.get_roles()
+
+    players = []
+    for role in roles:
+        player = BookBuilderPlayer()
+        player.max_tree_search_time = move_time
+        players.append(player)
+        gm.add_player(player, role)
+
+    for game_number in range(number_of_games):
+        for player in players:
+            player.explore = game_number > 0
+
+        gm.reset()
+        gm.start(meta_time=move_time, move_time=move_time + 2)
+
+        last_move = None
+        for ply in range(plies):
+            if gm.finished():
+                break
+
+            state = gm.sm.get_current_state()
+            choosing = [ri for ri in range(len(roles))
+                        if gm.sm.get_legal_state(ri).get_count() > 1]
+
+            last_move = gm.play_single_move(last_move)
+
+            for ri in choosing:
+                telemetry = gm.get_player(ri).get_telemetry()
+                if telemetry and telemetry["children"]:
+                    the_book.add(state, ri, ply, telemetry["children"])
+
+            interface.dealloc_basestate(state)
+
+        log.info("%s: game %d done, book has %d states" % (game, game_number, len(the_book)))
+
+        # abort the remainder of the game
+        for match in gm.matches:
+            match.do_abort()
+
+    the_book.save()
@@ -10,10 +10,14 @@ from ggplib.util.symbols import SymbolFactory
 # XXX match_id needs to be recreated each game
 
 class GameMaster(object):
-    def __init__(self, gdl_str, verbose=False, fast_reset=False):
+    def __init__(self, gdl_str, verbose=False, fast_reset=False, index_moves=False):
         self.verbose = verbose
         self.fast_reset = fast_reset
 
+        # the matches and gamemaster exchange legal choices, rather than move strings (the
+        # matches all have the same statemachine as the gamemaster)
+        self.index_moves = index_moves
+
         # used to convert to base state
         self.symbol_factory = SymbolFactory()
 
@@ -49,6 +53,12 @@ class GameMaster(object):
         self.players.append((player, role))
         self.players_map[role] = player
 
+    def clear_players(self):
+        ' so the gamemaster can be reused with different players (after reset()) '
+        assert self.matches is None
+        self.players = []
+        self.players_map = {}
+
     def get_player(self, role_index):
         return self.players[role_index][0]
 
@@ -158,12 +168,34 @@ class GameMaster(object):
 
         return tuple(new_last_move)
 
+    def play_single_move_index(self, last_choices=None):
+        ''' as play_single_move(), but without any move strings.  Returns the choice for each
+            role. '''
+        assert not self.finished()
+
+        choices = []
+        for role_index, match in enumerate(self.matches):
+            choice = match.do_play_index(last_choices)
+            self.joint_move.set(role_index, choice)
+            choices.append(choice)
+
+        if self.verbose:
+            log.verbose("playing %s" % ([self.sm.legal_to_move(ri, c) for ri, c in enumerate(choices)],))
+
+        self.sm.next_state(self.joint_move, self.next_basestate)
+        self.sm.update_bases(self.next_basestate)
+
+        return tuple(choices)
+
     def finished(self):
         return self.sm.is_terminal()
 
     def play_to_end(self, last_move=None):
         while not self.finished():
-            last_move = self.play_single_move(last_move)
+            if self.index_moves:
+                last_move = self.play_single_move_index(last_move)
+            else:
+                last_move = self.play_single_move(last_move)
 
         if self.verbose:
             log.verbose("Played to depth %d" % self.get_game_depth())
@@ -177,7 +209,10 @@ class GameMaster(object):
 
         # Need to do the final move for player
         for match in self.matches:
-            assert match.do_play(last_move) == "done"
+            if self.index_moves:
+                assert match.do_play_index(last_move) is None
+            else:
+                assert match.do_play(last_move) == "done"
 
             # and stop them
             match.do_stop()
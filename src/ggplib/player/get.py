@@ -1,6 +1,6 @@
 from ggplib.player.random_player import RandomPlayer
 from ggplib.player.legal_player import LegalPlayer
-from ggplib.player.mcs import MCSPlayer
+from ggplib.player.mcs import MCSPlayer, CppMCSPlayer
 from ggplib.player.basic_cpp_players import CppRandomPlayer, CppLegalPlayer
 from ggplib.player.simplemcts import SimpleMctsPlayer, GGTestPlayer1, GGTestPlayer2
 
@@ -11,10 +11,19 @@ python_players = {
     "pyrandom" : RandomPlayer,
     "pylegal" : LegalPlayer,
     "pymcs" : MCSPlayer,
+    "mcs" : CppMCSPlayer,
     "simplemcts" : SimpleMctsPlayer,
     "ggtest1" : GGTestPlayer1,
     "ggtest2" : GGTestPlayer2}
 
+# numpy is optional
+try:
+    from ggplib.player.mcs_numpy import NumpyMCSPlayer
+    python_players["pymcs_numpy"] = NumpyMCSPlayer
+
+except ImportError:
+    pass
+
 
 def get_player(player_type, player_name=None):
     if player_name is None:
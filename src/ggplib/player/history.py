@@ -0,0 +1,97 @@
+''' compact storage of the states and moves of a match.  States are held as packed bytes (see
+BaseState.to_bytes()), and moves as a tuple of legal choices (one per role).
+
+With delta encoding, only every keyframe_interval'th state is stored in full.  The others are
+stored as a sparse xor against the previous state - a list of (offset, xor) pairs - which for most
+games is only a handful of bytes per ply.  The current state is always held in full, older states
+are reconstructed from the nearest keyframe when asked for.
+'''
+
+import struct
+
+KEYFRAME_INTERVAL = 16
+
+# offset (uint16), xor (uint8)
+DELTA_STRUCT = struct.Struct("<HB")
+
+
+def xor_delta(prev_bytes, next_bytes):
+    ' sparse xor of two equally sized packed states '
+    assert len(prev_bytes) == len(next_bytes)
+    prev_bytes = bytearray(prev_bytes)
+    next_bytes = bytearray(next_bytes)
+
+    buf = []
+    for offset in range(len(next_bytes)):
+        xor = prev_bytes[offset] ^ next_bytes[offset]
+        if xor:
+            buf.append(DELTA_STRUCT.pack(offset, xor))
+
+    return "".join(buf)
+
+
+def apply_delta(state_bytes, delta):
+    ' the inverse of xor_delta(), returns next_bytes given prev_bytes '
+    state_bytes = bytearray(state_bytes)
+    for pos in range(0, len(delta), DELTA_STRUCT.size):
+        offset, xor = DELTA_STRUCT.unpack_from(delta, pos)
+        state_bytes[offset] ^= xor
+
+    return str(state_bytes)
+
+
+class MatchHistory(object):
+    def __init__(self, delta_encoding=True, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval if delta_encoding else 1
+        assert self.keyframe_interval >= 1
+
+        # per ply, the packed state (a keyframe) or a delta against the previous ply
+        self.entries = []
+
+        # per ply (less one), tuple of legal choices
+        self.moves = []
+
+        self.current_bytes = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_keyframe(self, ply):
+        return ply % self.keyframe_interval == 0
+
+    def add_state(self, state_bytes):
+        ply = len(self.entries)
+        if self.is_keyframe(ply):
+            self.entries.append(state_bytes)
+        else:
+            self.entries.append(xor_delta(self.current_bytes, state_bytes))
+
+        self.current_bytes = state_bytes
+
+    def add_move(self, choices):
+        self.moves.append(tuple(choices))
+
+    def get_current(self):
+        return self.current_bytes
+
+    def get(self, ply):
+        ' the packed state at ply (negative indexes from the end, as per a list) '
+        if ply < 0:
+            ply += len(self.entries)
+
+        if ply < 0 or ply >= len(self.entries):
+            raise IndexError("ply %s out of range, history has %d states" % (ply, len(self.entries)))
+
+        if ply == len(self.entries) - 1:
+            return self.current_bytes
+
+        keyframe_ply = ply - ply % self.keyframe_interval
+        state_bytes = self.entries[keyframe_ply]
+        for delta in self.entries[keyframe_ply + 1:ply + 1]:
+            state_bytes = apply_delta(state_bytes, delta)
+
+        return state_bytes
+
+    def byte_size(self):
+        ' approximate memory used by the states (ignoring python object overhead) '
+        return sum(len(e) for e in self.entries)
@@ -1,10 +1,13 @@
 import sys
 import time
+import random
 import traceback
 
 from ggplib.util import log
 from ggplib.util.symbols import tokenize
 
+from ggplib.player.history import MatchHistory
+
 from ggplib.db import lookup
 from ggplib import interface
 
@@ -32,11 +35,18 @@ def replace_symbols(s, from_, to_):
     return " ".join(new_symbols).replace('( ', '(').replace(' )', ')')
 
 
+def remap_symbols(s, mapping):
+    ''' as replace_symbols(), but replaces all the symbols in mapping in a single pass.  Also
+        normalises the whitespace. '''
+    new_symbols = [mapping.get(sym, sym) for sym in tokenize(str(s))]
+    return " ".join(new_symbols).replace('( ', '(').replace(' )', ')')
+
+
 ###################################################################################################
 
 class Match:
     def __init__(self, match_id, role, meta_time, move_time, player, gdl,
-                 verbose=True, cushion_time=-1, no_cleanup=False):
+                 verbose=True, cushion_time=-1, no_cleanup=False, delta_encoding=True):
         assert gdl is not None
         self.load_game = True
         self.no_cleanup = no_cleanup
@@ -50,13 +60,26 @@ class Match:
         self.verbose = verbose
         self.cushion_time = cushion_time
 
+        # seconds spent in each phase (lookup, search) of the last do_start() / do_play()
+        self.timings = {}
+
         self.move_info = []
-        self.moves = []
 
-        self.states = []
+        # the packed states and moves of the match (see history.py).  Only the current state is
+        # held as a BaseState.
+        self.delta_encoding = delta_encoding
+        self.history = None
+        self.current_state = None
+        self.next_state = None
 
         # stores the last played move, to check the gamemaster returns the same move
         self.last_played_move = None
+        self.last_played_choice = None
+
+        # (legal choices, random legal choice) only while the player is in on_next_move(), in case
+        # it overruns (see overrun_move())
+        self.fallback = None
+        self.overrun_choice = None
 
         self.joint_move = None
         self.player = player
@@ -66,6 +89,11 @@ class Match:
         self.sm = None
         self.game_depth = 0
 
+        # per role, legal choice -> gamemaster move and gamemaster move -> legal choice (see
+        # build_move_tables())
+        self.gamemaster_moves = None
+        self.gamemaster_choices = None
+
     def fast_reset(self, match_id, player, role):
         assert self.player == player
         assert self.role == role
@@ -79,7 +107,32 @@ class Match:
 
     def get_current_state(self):
         # do not change this
-        return self.states[-1]
+        return self.current_state
+
+    @property
+    def moves(self):
+        ' per ply, a tuple of legal choices '
+        if self.history is None:
+            return []
+        return self.history.moves
+
+    def get_state(self, ply):
+        ''' returns a new BaseState for the state at ply (which the caller must dealloc).  For the
+            current state, use get_current_state(). '''
+        bs = self.sm.new_base_state()
+        bs.from_bytes(self.history.get(ply))
+        return bs
+
+    def get_cushion_time(self):
+        ''' the cushion is owned by whoever creates the match (the servers calibrate it per game
+            server, see CushionCalibrator).  It is fed how late we return by the "late" timing. '''
+        if self.cushion_time > 0:
+            return self.cushion_time
+        return 0.0
+
+    def record_late(self, end_time):
+        ' how much after end_time we are returning '
+        self.timings["late"] = max(0.0, time.time() - end_time)
 
     def do_start(self, initial_basestate=None, game_depth=0):
         ''' Optional initial_basestate.  Used mostly for testing. If none will use the initial
@@ -87,18 +140,18 @@ class Match:
             handled by the base player. '''
 
         enter_time = time.time()
-        end_time = enter_time + self.meta_time
-        if self.cushion_time > 0:
-            end_time -= self.cushion_time
+        end_time = enter_time + self.meta_time - self.get_cushion_time()
 
         if self.verbose:
             log.debug("Match.do_start(), time = %.1f" % (end_time - enter_time))
 
+        timings = {}
         if self.load_game:
             (self.gdl_symbol_mapping,
              self.game_info) = lookup.by_gdl(self.gdl)
 
             self.sm = self.game_info.get_sm()
+            timings["lookup"] = time.time() - enter_time
 
         self.sm.reset()
         if self.verbose:
@@ -124,7 +177,11 @@ class Match:
         else:
             initial_basestate = self.sm.get_initial_state()
 
-        self.states.append(initial_basestate)
+        self.current_state = initial_basestate
+        self.next_state = self.sm.new_base_state()
+
+        self.history = MatchHistory(delta_encoding=self.delta_encoding)
+        self.history.add_state(self.current_state.to_bytes())
 
         # store a joint move internally
         self.joint_move = self.sm.get_joint_move()
@@ -146,58 +203,110 @@ class Match:
                                                                      self.our_role_index))
         assert self.our_role_index != -1
 
+        if self.load_game or self.gamemaster_moves is None:
+            self.build_move_tables()
+
         # starting point for the game (normally zero)
         self.game_depth = game_depth
 
         # FINALLY : call the meta gaming stage on the player
         # note: on_meta_gaming must use self.match.get_current_state()
         self.player.reset(self)
+
+        search_time = time.time()
         self.player.on_meta_gaming(end_time)
+        timings["search"] = time.time() - search_time
+        self.timings = timings
 
-    def apply_move(self, moves):
+        self.record_late(end_time)
+
+    def build_move_tables(self):
+        ''' the symbol mapping is applied once for every move of every role here, rather than for
+            each move played. '''
+        to_gamemaster = {}
+        if self.gdl_symbol_mapping:
+            to_gamemaster = dict((v, k) for k, v in self.gdl_symbol_mapping.items())
+
+        self.gamemaster_moves = []
+        self.gamemaster_choices = []
+        for role_index, actions in enumerate(self.game_info.model.actions):
+            moves = []
+            choices = {}
+            for choice in range(len(actions)):
+                move = self.sm.legal_to_move(role_index, choice)
+                if to_gamemaster:
+                    move = remap_symbols(move, to_gamemaster)
+
+                moves.append(move)
+                choices[move] = choice
+                choices[remap_symbols(move, {})] = choice
+
+            self.gamemaster_moves.append(moves)
+            self.gamemaster_choices.append(choices)
+
+    def gamemaster_move_to_choice(self, role_index, gamemaster_move):
+        ' returns the legal choice, or None if there is no such move '
+        choices = self.gamemaster_choices[role_index]
+        move = str(gamemaster_move)
+        try:
+            return choices[move]
+        except KeyError:
+            # whitespace may differ
+            return choices.get(remap_symbols(move, {}))
+
+    def before_apply(self):
         self.game_depth += 1
-        if self.verbose:
-            log.debug("apply moves: %s" % (moves,))
+
+        # the move sent was the overrun move, whatever the player went on to choose
+        if self.overrun_choice is not None:
+            self.last_played_choice = self.overrun_choice
+            self.last_played_move = self.sm.legal_to_move(self.our_role_index, self.overrun_choice)
+            self.overrun_choice = None
 
         # we give the player an one time opportunity to return debug/extra information
         # about the move it just played
-        self.move_info.append(self.player.before_apply_info())
+        self.move_info.append(dict(info=self.player.before_apply_info(),
+                                   telemetry=self.player.get_telemetry()))
 
         # get the previous state - incase our statemachine is out of sync
         self.sm.update_bases(self.get_current_state())
 
-        # fish tediously for move in available legals
-        our_move = None
-        preserve_move = []
-        for role_index, gamemaster_move in enumerate(moves):
-            move = gamemaster_move
-            # map the gamemaster move
-            if self.gdl_symbol_mapping:
-                for k, v in self.gdl_symbol_mapping.items():
-                    move = replace_symbols(move, k, v)
+    def apply_joint_move(self):
+        ' self.joint_move is set, moves to the next state '
+        self.sm.next_state(self.joint_move, self.next_state)
+        self.current_state.assign(self.next_state)
+        self.sm.update_bases(self.current_state)
+
+        # save for next time / prospserity.  Strings are only created if logging (see move_to_str())
+        self.history.add_move([self.joint_move.get(ri) for ri in range(len(self.sm.get_roles()))])
+        self.history.add_state(self.current_state.to_bytes())
 
-                if self.verbose:
-                    log.debug("remapped move from '%s' -> '%s'" % (gamemaster_move, move))
+        # in case player needs to cleanup some state
+        self.player.on_apply_move(self.joint_move)
+
+    def apply_move(self, moves):
+        if self.verbose:
+            log.debug("apply moves: %s" % (moves,))
 
-            preserve_move.append(move)
+        self.before_apply()
 
-            # find the move
-            found = False
+        our_move = None
+        for role_index, gamemaster_move in enumerate(moves):
+            choice = self.gamemaster_move_to_choice(role_index, gamemaster_move)
+            assert choice is not None, gamemaster_move
 
             ls = self.sm.get_legal_state(role_index)
-            choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
-            for choice in choices:
-                choice_move = self.sm.legal_to_move(role_index, choice)
-                if choice_move == str(move):
-                    found = True
+            assert choice in ls.to_list(), gamemaster_move
 
-                    if role_index == self.our_role_index:
-                        our_move = choice_move
+            # in our mapping
+            move = self.sm.legal_to_move(role_index, choice)
+            if self.verbose and self.gdl_symbol_mapping:
+                log.debug("remapped move from '%s' -> '%s'" % (gamemaster_move, move))
 
-                    self.joint_move.set(role_index, choice)
-                    break
+            if role_index == self.our_role_index:
+                our_move = move
 
-            assert found, move
+            self.joint_move.set(role_index, choice)
 
         assert our_move is not None
 
@@ -211,23 +320,30 @@ class Match:
                 log.critical(msg)
                 raise CriticalError(msg)
 
-        new_base_state = self.sm.new_base_state()
-        self.sm.next_state(self.joint_move, new_base_state)
-        self.sm.update_bases(new_base_state)
+        self.apply_joint_move()
 
-        # save for next time / prospserity
-        self.moves.append(preserve_move)
-        self.states.append(new_base_state)
+    def apply_move_index(self, choices):
+        ''' as apply_move(), but with the legal choice for each role.  Only for local matches, where the
+            gamemaster has the same statemachine (see GameMaster.play_single_move_index()). '''
+        if self.verbose:
+            log.debug("apply choices: %s" % (choices,))
 
-        # in case player needs to cleanup some state
-        self.player.on_apply_move(self.joint_move)
+        self.before_apply()
+
+        for role_index, choice in enumerate(choices):
+            self.joint_move.set(role_index, choice)
+
+        if self.last_played_choice is not None:
+            if self.last_played_choice != choices[self.our_role_index]:
+                msg = "Gamemaster sent back a different choice from played choice %s != %s" % (self.last_played_choice,
+                                                                                               choices[self.our_role_index])
+                log.critical(msg)
+                raise CriticalError(msg)
+
+        self.apply_joint_move()
 
     def legal_to_gamemaster_move(self, index):
-        m = self.sm.legal_to_move(self.our_role_index, index)
-        if self.gdl_symbol_mapping:
-            for k, v in self.gdl_symbol_mapping.items():
-                m = replace_symbols(m, v, k)
-        return m
+        return self.gamemaster_moves[self.our_role_index][index]
 
     def do_play(self, move):
         enter_time = time.time()
@@ -242,13 +358,18 @@ class Match:
             log.info("Current state : '%s'" % self.sm.basestate_to_str(current_state))
         self.sm.update_bases(current_state)
         if self.sm.is_terminal():
+            self.timings = {}
             return "done"
 
-        end_time = enter_time + self.move_time
-        if self.cushion_time > 0:
-            end_time -= self.cushion_time
+        legals = self.sm.get_legal_state(self.our_role_index).to_list()
+        self.fallback = legals, random.choice(legals)
 
+        end_time = enter_time + self.move_time - self.get_cushion_time()
+
+        search_time = time.time()
         legal_choice = self.player.on_next_move(end_time)
+        self.timings = dict(search=time.time() - search_time)
+        self.fallback = None
 
         # we have no idea what on_next_move() left the state machine.  So reverting it back to
         # correct state here.
@@ -259,21 +380,94 @@ class Match:
 
         # store last move (in our own mapping, *not* gamemaster)
         self.last_played_move = self.sm.legal_to_move(self.our_role_index, legal_choice)
+        self.last_played_choice = legal_choice
 
-        # check the move remaps and is a legal choice
-        move = self.legal_to_gamemaster_move(legal_choice)
-        legal_moves = [self.legal_to_gamemaster_move(ls.get_legal(ii)) for ii in range(ls.get_count())]
-        if move not in legal_moves:
-            msg = "Choice was %s not in legal choices %s" % (move, legal_moves)
+        # check it is a legal choice, and remap
+        if legal_choice not in ls.to_list():
+            legal_moves = [self.legal_to_gamemaster_move(c) for c in ls.to_list()]
+            msg = "Choice was %s not in legal choices %s" % (self.legal_to_gamemaster_move(legal_choice),
+                                                              legal_moves)
             log.critical(msg)
             raise CriticalError(msg)
 
+        move = self.legal_to_gamemaster_move(legal_choice)
+
         if self.verbose:
             log.info("(%s) do_play '%s' sending move: %s" % (self.player.name,
                                                              self.role,
                                                              move))
+
+        self.record_late(end_time)
         return move
 
+    def overrun_move(self):
+        ''' the gamemaster move to send when the player is still in on_next_move() after the
+            deadline.  Called from a different thread to do_play(), so must not touch the
+            statemachine.  The best choice so far of the player if it has one, otherwise a random
+            legal choice.  Returns None if the player is not in on_next_move() yet. '''
+        fallback = self.fallback
+        if fallback is None:
+            return None
+
+        self.fallback = None
+        legals, choice = fallback
+        best_choice = self.player.best_choice_so_far()
+        if best_choice in legals:
+            choice = best_choice
+
+        log.warning("(%s) overran move time, sending %s" % (self.player.name,
+                                                            self.legal_to_gamemaster_move(choice)))
+        self.overrun_choice = choice
+        return self.legal_to_gamemaster_move(choice)
+
+    def do_play_index(self, choices):
+        ''' as do_play(), but exchanges legal choices rather than gamemaster move strings.  Returns
+            our choice, or None if the game is finished. '''
+        enter_time = time.time()
+
+        if choices is not None:
+            self.apply_move_index(choices)
+
+        self.sm.update_bases(self.get_current_state())
+        if self.sm.is_terminal():
+            return None
+
+        end_time = enter_time + self.move_time - self.get_cushion_time()
+
+        legal_choice = self.player.on_next_move(end_time)
+
+        # we have no idea what on_next_move() left the state machine.  So reverting it back to
+        # correct state here.
+        self.sm.update_bases(self.get_current_state())
+
+        # check it is a legal choice
+        ls = self.sm.get_legal_state(self.our_role_index)
+        if legal_choice not in [ls.get_legal(ii) for ii in range(ls.get_count())]:
+            msg = "Choice was %s not in legal choices %s" % (legal_choice, ls.to_list())
+            log.critical(msg)
+            raise CriticalError(msg)
+
+        self.last_played_choice = legal_choice
+        self.last_played_move = None
+
+        if self.verbose:
+            log.info("(%s) do_play_index '%s' playing: %s" % (self.player.name,
+                                                             self.role,
+                                                             self.sm.legal_to_move(self.our_role_index,
+                                                                                   legal_choice)))
+
+        return legal_choice
+
+    def move_to_str(self, move):
+        ' moves are either strings, a list of strings or a tuple of choices (see apply_move_index()) '
+        if isinstance(move, str):
+            return move
+
+        if isinstance(move, tuple):
+            return " ".join(self.sm.legal_to_move(ri, choice) for ri, choice in enumerate(move))
+
+        return " ".join(str(t) for t in move)
+
     def do_stop(self):
         assert self.sm.is_terminal(), "should never be called unless game is finished"
         if self.verbose:
@@ -289,12 +483,7 @@ class Match:
             log.info("Moves:")
             buf = [""]
             for move in self.moves:
-                if isinstance(move, str):
-                    move_str = move
-                else:
-                    move_str = " ".join(str(t) for t in move)
-
-                buf.append("\t(" + move_str + ")")
+                buf.append("\t(" + self.move_to_str(move) + ")")
 
             log.info("\n".join(buf))
             log.info("DONE!")
@@ -321,12 +510,12 @@ class Match:
         if self.verbose:
             log.warning("cleaning up c++ stuff")
 
-        # all the basestates
-        for bs in self.states:
-            # cleanup bs
-            interface.dealloc_basestate(bs)
+        # the history is pure python, only the current and scratch basestates need freeing
+        for bs in (self.current_state, self.next_state):
+            if bs is not None:
+                interface.dealloc_basestate(bs)
 
-        self.states = []
+        self.current_state = self.next_state = None
 
         if self.joint_move:
             interface.dealloc_jointmove(self.joint_move)
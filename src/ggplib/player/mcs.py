@@ -7,6 +7,7 @@ import json
 
 from ggplib.util import log
 from ggplib.player.base import MatchPlayer
+from ggplib.player.proxy import ProxyPlayer
 from ggplib import interface
 
 
@@ -126,16 +127,20 @@ class MCSPlayer(MatchPlayer):
         self.depth_charge_state.assign(self.match.get_current_state())
         self.sm.update_bases(self.depth_charge_state)
 
-        self.root = {}
-
         ls = self.sm.get_legal_state(self.match.our_role_index)
         our_choices = [ls.get_legal(ii) for ii in range(ls.get_count())]
 
-        # now create some stats with depth charges
+        # now create some stats with depth charges.  The root is assigned (once it has all the
+        # choices) before searching, so that best_choice_so_far() - called from another thread on
+        # an overrun - sees the stats of this move as they are updated.
+        root = {}
         for choice in our_choices:
             move = self.sm.legal_to_move(self.match.our_role_index, choice)
-            self.root[choice] = MoveStat(choice, move, self.role_count)
+            root[choice] = MoveStat(choice, move, self.role_count)
+
+        self.root = root
 
+        start_time = time.time()
         root_visits = 1
         while True:
             if time.time() > finish_by:
@@ -178,7 +183,16 @@ class MCSPlayer(MatchPlayer):
             root_visits += 1
 
         log.debug("Total visits: %s" % root_visits)
+        self.search_time = time.time() - start_time
+
+    def best_choice_so_far(self):
+        # note the root may be from the last move, the match checks the choice is legal
+        root = self.root
+        if not root:
+            return None
 
+        best = max(root.values(), key=lambda stat: stat.get(self.match.our_role_index))
+        return best.choice
 
     def choose(self):
         assert self.root is not None
@@ -216,6 +230,19 @@ class MCSPlayer(MatchPlayer):
 
         return json.dumps(dict(candidates=candidates), indent=4)
 
+    def get_telemetry(self):
+        if self.root is None:
+            return None
+
+        iterations = sum(stat.visits for stat in self.root.values())
+        children = [dict(choice=stat.choice, visits=stat.visits, score=stat.get(self.match.our_role_index))
+                    for stat in self.root.values()]
+
+        return dict(search_time=self.search_time,
+                    tree_playouts=iterations,
+                    rollouts=iterations,
+                    children=children)
+
     def on_apply_move(self, move):
         self.root = None
 
@@ -230,3 +257,17 @@ class MCSPlayer(MatchPlayer):
         self.perform_mcs(finish_time)
         return self.choose()
 
+
+
+class CppMCSPlayer(ProxyPlayer):
+    ' same as MCSPlayer (which is kept as the reference implementation), but runs in c++ '
+    max_run_time = 1
+    max_iterations = -1
+    ucb_constant = 1.414
+
+    def meta_create_player(self):
+        return interface.create_mcs_player(self.sm,
+                                           self.match.our_role_index,
+                                           self.max_run_time,
+                                           self.max_iterations,
+                                           self.ucb_constant)
@@ -0,0 +1,112 @@
+''' MCSPlayer with the root statistics held in numpy arrays.  numpy is optional (pip install numpy),
+see get.py. '''
+
+import time
+import random
+
+import numpy as np
+
+from ggplib.util import log
+from ggplib.player.mcs import MCSPlayer, MoveStat
+
+
+class NumpyMCSPlayer(MCSPlayer):
+    # number of playouts per selection (only on games with many legal moves, see select_batch())
+    batch_size = 8
+
+    # seconds between publishing the statistics to self.root, see make_root()
+    publish_interval = 0.1
+
+    def select_batch(self, root_visits):
+        ' returns indices into self.choices of the next playouts '
+
+        # any choices, where it hasn't played at least 3 times
+        unexplored = np.flatnonzero(self.visits < 3)
+        if len(unexplored):
+            np.random.shuffle(unexplored)
+            return unexplored[:self.batch_size]
+
+        means = self.score_sums[:, self.match.our_role_index] / self.visits / 100.0
+        ucb = means + self.ucb_constant * np.sqrt(np.log(root_visits) / self.visits)
+
+        # with few choices, batching would distort the selection - so the best of them only
+        batch = min(self.batch_size, len(ucb) // 4)
+        if batch <= 1:
+            best = np.flatnonzero(ucb == ucb.max())
+            return [best[random.randrange(len(best))]]
+
+        return np.argpartition(-ucb, batch - 1)[:batch]
+
+    def playout(self, index, role_legals):
+        ' plays the choice at index, and random moves for the other roles, then a depth charge '
+        self.depth_charge_state.assign(self.match.get_current_state())
+        self.sm.update_bases(self.depth_charge_state)
+
+        for role_index, legals in enumerate(role_legals):
+            if role_index == self.match.our_role_index:
+                self.joint_move.set(role_index, int(self.choices[index]))
+            else:
+                self.joint_move.set(role_index, legals[random.randrange(len(legals))])
+
+        self.sm.next_state(self.joint_move, self.depth_charge_state)
+        return self.do_depth_charge()
+
+    def make_root(self):
+        ' a snapshot of the statistics as MoveStats, so the rest is as per MCSPlayer '
+        root = {}
+        for index, choice in enumerate(self.choices):
+            choice = int(choice)
+            stat = root[choice] = MoveStat(choice, self.moves[index], self.role_count)
+            stat.scores = [float(s) for s in self.score_sums[index]]
+            stat.visits = int(self.visits[index])
+
+        return root
+
+    def perform_mcs(self, finish_by):
+        self.depth_charge_state.assign(self.match.get_current_state())
+        self.sm.update_bases(self.depth_charge_state)
+
+        # the legals at the root do not change, so only get them once
+        role_legals = []
+        for role_index in range(self.role_count):
+            ls = self.sm.get_legal_state(role_index)
+            role_legals.append([ls.get_legal(ii) for ii in range(ls.get_count())])
+
+        self.choices = np.array(role_legals[self.match.our_role_index])
+        self.moves = [self.sm.legal_to_move(self.match.our_role_index, int(choice))
+                      for choice in self.choices]
+        self.visits = np.zeros(len(self.choices), dtype=np.int64)
+        self.score_sums = np.zeros((len(self.choices), self.role_count), dtype=np.float64)
+
+        # published before and during the search, as best_choice_so_far() reads it from another
+        # thread on an overrun
+        self.root = self.make_root()
+
+        start_time = time.time()
+        next_publish_time = start_time + self.publish_interval
+        root_visits = 1
+        while True:
+            if time.time() > finish_by:
+                break
+
+            if time.time() > next_publish_time:
+                self.root = self.make_root()
+                next_publish_time = time.time() + self.publish_interval
+
+            if self.max_iterations > 0 and root_visits > self.max_iterations:
+                break
+
+            if len(self.choices) == 1 and root_visits > 100:
+                break
+
+            batch = self.select_batch(root_visits)
+            for index in batch:
+                self.score_sums[index] += self.playout(index, role_legals)
+
+            self.visits[batch] += 1
+            root_visits += len(batch)
+
+        log.debug("Total visits: %s" % root_visits)
+        self.search_time = time.time() - start_time
+
+        self.root = self.make_root()
@@ -23,6 +23,9 @@ class ProxyPlayer(MatchPlayer):
     def on_meta_gaming(self, finish_time):
         log.info("%s meta Gaming: match: %s" % (self.name, self.match.match_id))
 
+        # reused for another match without a cleanup
+        self.cleanup()
+
         self.sm = self.match.sm.dupe()
 
         self.proxy = self.meta_create_player()
@@ -32,7 +35,10 @@ class ProxyPlayer(MatchPlayer):
         self.proxy.on_meta_gaming(finish_time)
 
     def before_apply_info(self):
-        self.proxy.before_apply_info()
+        return self.proxy.before_apply_info()
+
+    def get_telemetry(self):
+        return self.proxy.get_telemetry()
 
     def on_apply_move(self, move):
         self.sm.update_bases(self.match.get_current_state())
@@ -42,3 +48,10 @@ class ProxyPlayer(MatchPlayer):
         self.sm.update_bases(self.match.get_current_state())
         return self.proxy.on_next_move(finish_time)
 
+    def best_choice_so_far(self):
+        # from the native search (which is thread safe)
+        proxy = self.proxy
+        if proxy is None:
+            return None
+        return proxy.best_choice_so_far()
+
@@ -0,0 +1,296 @@
+''' self play datasets.  Every position of a self play game is written as a fixed width record to
+rotating (optionally gzipped) shard files.  Each shard starts with a small json header describing
+the record layout, so shards can be read without the game.
+
+A record is:
+   packed base state           (byte_count bytes, see BaseState.to_bytes())
+   ply                         (uint16)
+   per role, legal mask        (one bit for each of the role's actions)
+   per role, chosen move       (int16, the legal choice)
+   per role, visit policy      (uint16 per action, the root visit distribution scaled to 65535)
+   per role, final goal value  (uint8)
+'''
+
+import os
+import gzip
+import json
+import struct
+
+from ggplib.util import log
+from ggplib import interface
+from ggplib.db import lookup
+from ggplib.db.helper import get_gdl_for_game
+from ggplib.player.gamemaster import GameMaster
+from ggplib.player.simplemcts import SimpleMctsPlayer
+
+MAGIC = "GGPS"
+POLICY_SCALE = 65535
+
+
+class RecordLayout(object):
+    def __init__(self, game, roles, byte_count, action_counts):
+        self.game = game
+        self.roles = roles
+        self.byte_count = byte_count
+        self.action_counts = action_counts
+
+        self.mask_bytes = [(n + 7) // 8 for n in action_counts]
+
+        fmt = "<%dsH" % byte_count
+        fmt += "".join("%ds" % n for n in self.mask_bytes)
+        fmt += "%dh" % len(roles)
+        fmt += "".join("%dH" % n for n in action_counts)
+        fmt += "%dB" % len(roles)
+        self.struct = struct.Struct(fmt)
+
+    @property
+    def record_size(self):
+        return self.struct.size
+
+    def to_description(self):
+        return dict(game=self.game,
+                    roles=self.roles,
+                    byte_count=self.byte_count,
+                    action_counts=self.action_counts,
+                    record_size=self.record_size)
+
+    @staticmethod
+    def from_description(desc):
+        layout = RecordLayout(desc["game"], desc["roles"], desc["byte_count"], desc["action_counts"])
+        assert layout.record_size == desc["record_size"]
+        return layout
+
+    @staticmethod
+    def from_statemachine(game, sm, model):
+        return RecordLayout(game, sm.get_roles(), sm.new_base_state().byte_count(),
+                            [len(actions) for actions in model.actions])
+
+    def pack(self, state_bytes, ply, legals, choices, policies, goals):
+        ''' legals and policies are per role.  legals is a list of legal choices, policies is a
+            dict of choice -> probability. '''
+        values = [state_bytes, ply]
+
+        for role_legals, mask_bytes in zip(legals, self.mask_bytes):
+            mask = bytearray(mask_bytes)
+            for choice in role_legals:
+                mask[choice // 8] |= 1 << (choice % 8)
+            values.append(str(mask))
+
+        values += choices
+
+        for policy, action_count in zip(policies, self.action_counts):
+            dense = [0] * action_count
+            for choice, p in policy.items():
+                dense[choice] = int(round(p * POLICY_SCALE))
+            values += dense
+
+        values += goals
+        return self.struct.pack(*values)
+
+    def unpack(self, buf):
+        ' returns a dict, the inverse of pack() '
+        values = self.struct.unpack(buf)
+        role_count = len(self.roles)
+
+        state_bytes, ply = values[0], values[1]
+        pos = 2
+
+        legals = []
+        for mask_bytes, action_count in zip(values[pos:pos + role_count], self.action_counts):
+            mask = bytearray(mask_bytes)
+            legals.append([ii for ii in range(action_count) if mask[ii // 8] & (1 << (ii % 8))])
+        pos += role_count
+
+        choices = list(values[pos:pos + role_count])
+        pos += role_count
+
+        policies = []
+        for action_count in self.action_counts:
+            dense = values[pos:pos + action_count]
+            policies.append(dict((ii, v / float(POLICY_SCALE)) for ii, v in enumerate(dense) if v))
+            pos += action_count
+
+        goals = list(values[pos:pos + role_count])
+
+        return dict(state=state_bytes, ply=ply, legals=legals, choices=choices,
+                    policies=policies, goals=goals)
+
+
+###############################################################################
+
+class ShardWriter(object):
+    ''' writes records to directory/<prefix>_<shard number>.bin[.gz], starting a new shard every
+        records_per_shard records.  Use a different prefix per process. '''
+
+    def __init__(self, layout, directory, prefix, records_per_shard=100000, compress=True):
+        self.layout = layout
+        self.directory = directory
+        self.prefix = prefix
+        self.records_per_shard = records_per_shard
+        self.compress = compress
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.f = None
+        self.shard_number = 0
+        self.shard_records = 0
+        self.total_records = 0
+        self.filenames = []
+
+    def open_shard(self):
+        filename = "%s_%05d.bin" % (self.prefix, self.shard_number)
+        if self.compress:
+            filename += ".gz"
+
+        filename = os.path.join(self.directory, filename)
+        self.f = gzip.open(filename, "wb") if self.compress else open(filename, "wb")
+
+        header = json.dumps(self.layout.to_description())
+        self.f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+        self.filenames.append(filename)
+        self.shard_number += 1
+        self.shard_records = 0
+
+    def write(self, record):
+        assert len(record) == self.layout.record_size
+        if self.f is None:
+            self.open_shard()
+
+        self.f.write(record)
+        self.shard_records += 1
+        self.total_records += 1
+
+        if self.shard_records >= self.records_per_shard:
+            self.f.close()
+            self.f = None
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def read_shard(filename):
+    ' generator of unpacked records (dicts) from a shard file '
+    f = gzip.open(filename, "rb") if filename.endswith(".gz") else open(filename, "rb")
+    try:
+        assert f.read(len(MAGIC)) == MAGIC, "not a shard file: %s" % filename
+        header_size = struct.unpack("<I", f.read(4))[0]
+        layout = RecordLayout.from_description(json.loads(f.read(header_size)))
+
+        while True:
+            buf = f.read(layout.record_size)
+            if len(buf) < layout.record_size:
+                break
+
+            yield layout.unpack(buf)
+    finally:
+        f.close()
+
+
+###############################################################################
+
+class SelfPlayPlayer(SimpleMctsPlayer):
+    skip_single_moves = True
+    dump_depth = 0
+    max_tree_search_time = 1.0
+
+
+def root_policy(player, choice):
+    ' visit distribution from the player telemetry, all on choice if there was no search '
+    telemetry = player.get_telemetry()
+    if telemetry and telemetry["children"]:
+        total_visits = float(sum(c["visits"] for c in telemetry["children"]))
+        if total_visits > 0:
+            return dict((c["choice"], c["visits"] / total_visits) for c in telemetry["children"])
+
+    return {choice: 1.0}
+
+
+def cleanup_matches(gm):
+    ' the matches are created with no_cleanup, free them (and the players trees) before the next game '
+    if gm.matches:
+        for match in gm.matches:
+            match.cleanup()
+    gm.matches = None
+
+
+def self_play(game, number_of_games, move_time=1.0, player_cls=SelfPlayPlayer):
+    ''' generator of packed records, one per position.  The records for a game are yielded at the
+        end of the game (they need the final goal values), so only one game is held in memory.  The
+        first value yielded is the RecordLayout. '''
+
+    gm = GameMaster(get_gdl_for_game(game), index_moves=True)
+    roles = gm.sm.get_roles()
+
+    for role in roles:
+        player = player_cls()
+        player.max_tree_search_time = move_time
+        gm.add_player(player, role)
+
+    _, info = lookup.by_gdl(gm.gdl_str)
+    layout = RecordLayout.from_statemachine(game, gm.sm, info.model)
+    yield layout
+
+    try:
+        for game_number in range(number_of_games):
+            cleanup_matches(gm)
+            gm.reset()
+            gm.start(meta_time=move_time, move_time=move_time + 2)
+
+            positions = []
+            last_choices = None
+            ply = 0
+            while not gm.finished():
+                state = gm.sm.get_current_state()
+                state_bytes = state.to_bytes()
+                interface.dealloc_basestate(state)
+
+                legals = [gm.sm.get_legal_state(ri).to_list() for ri in range(len(roles))]
+
+                last_choices = gm.play_single_move_index(last_choices)
+
+                policies = [root_policy(gm.get_player(ri), choice) if len(legals[ri]) > 1 else {choice: 1.0}
+                            for ri, choice in enumerate(last_choices)]
+
+                positions.append((state_bytes, ply, legals, list(last_choices), policies))
+                ply += 1
+
+            gm.play_to_end(last_choices)
+            goals = [gm.get_score(role) for role in roles]
+
+            for position in positions:
+                yield layout.pack(*(position + (goals,)))
+
+            log.info("%s: self play game %d done, %d positions, goals %s" % (game, game_number,
+                                                                             len(positions), goals))
+
+    finally:
+        cleanup_matches(gm)
+        gm.cleanup()
+
+
+def generate(game, number_of_games, directory, prefix,
+             move_time=1.0, records_per_shard=100000, compress=True):
+    ' plays number_of_games and writes them to shards.  Returns the filenames written. '
+    records = self_play(game, number_of_games, move_time=move_time)
+    layout = next(records)
+
+    writer = ShardWriter(layout, directory, prefix, records_per_shard=records_per_shard, compress=compress)
+    try:
+        for record in records:
+            writer.write(record)
+    finally:
+        writer.close()
+
+    log.info("%s: wrote %d records to %d shards" % (game, writer.total_records, len(writer.filenames)))
+    return writer.filenames
+
+
+def generate_worker(args):
+    ''' for use with multiprocessing.Pool.map() (with tournament.worker_init as initializer).  args
+        is (game, number_of_games, directory, prefix, move_time), each worker needs its own prefix. '''
+    game, number_of_games, directory, prefix, move_time = args
+    return generate(game, number_of_games, directory, prefix, move_time=move_time)
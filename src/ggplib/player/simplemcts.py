@@ -3,6 +3,7 @@ import random
 
 from ggplib.util import log
 from ggplib import interface
+from ggplib.db import book
 from ggplib.player.proxy import ProxyPlayer
 
 
@@ -18,7 +19,129 @@ class SimpleMctsPlayer(ProxyPlayer):
     dump_depth = 2
     next_time = 2.5
 
+    # keep searching in the background in between moves
+    ponder = False
+
+    # decoupled statistics for simultaneous moves (rather than all joint moves)
+    decoupled = False
+
+    # let the time manager decide when to stop searching, rather than always using all the time
+    adaptive_time = False
+    min_search_fraction = 0.5
+    dominant_visit_share = 0.75
+
+    # number of rollouts for each new leaf (averaged), and the threads to run them on (0 is inline)
+    rollouts_per_leaf = 1
+    rollout_threads = 0
+
+    # only keep the base state of the root, the rest are replayed from the root when expanding (saves
+    # memory on big trees, at the cost of the replays)
+    compact_basestates = False
+
+    # blend all-moves-as-first statistics from the rollouts into selection (0 disables)
+    rave_equivalence = 0
+
+    # answer directly from the game's opening book, if the state is in there.  opening_book_store
+    # is where the book is loaded from (None is the game's directory in the games store).
+    use_opening_book = False
+    opening_book_store = None
+
+    # replaces rollouts with batches of leaves, evaluated by calling leaf_evaluator(count, states,
+    # values, priors) - see interface.set_simple_mcts_leaf_evaluator().  policy_size defaults to
+    # the most actions of any role.
+    leaf_evaluator = None
+    evaluation_batch_size = 8
+    evaluation_policy_size = None
+    virtual_loss = 1
+
+    book = None
+    book_telemetry = None
+
+    def set_resources(self, threads, memory):
+        # only ever lowers the configuration.  The search (or ponder) thread is one of the threads,
+        # so rollout threads are only worth having with at least two more.
+        self.max_memory = min(self.max_memory, memory)
+
+        rollout_threads = min(self.rollout_threads, threads - 1)
+        self.rollout_threads = rollout_threads if rollout_threads >= 2 else 0
+
+        # pondering keeps a thread busy in between moves, while the other matches are searching
+        if threads <= 1:
+            self.ponder = False
+
+    def on_meta_gaming(self, finish_time):
+        self.book = None
+        if self.use_opening_book:
+            self.book = book.load(self.match.game_info.game, the_game_store=self.opening_book_store)
+            if self.book is not None:
+                log.info("%s using opening book with %d states" % (self.name, len(self.book)))
+
+        ProxyPlayer.on_meta_gaming(self, finish_time)
+
+    def book_choice(self):
+        ' the most visited choice in the book for the current state, if it is legal (or None) '
+        entry = self.book.get_entry(self.match.get_current_state(), self.match.our_role_index)
+        if entry is None or not entry["children"]:
+            return None
+
+        choice = entry["children"][0]["choice"]
+
+        self.sm.update_bases(self.match.get_current_state())
+        if choice not in self.sm.get_legal_state(self.match.our_role_index).to_list():
+            log.warning("%s opening book choice %s is not legal, searching" % (self.name, choice))
+            return None
+
+        # the same fields as a search, so the telemetry can be used the same way
+        self.book_telemetry = dict((name, 0) for name in interface.TELEMETRY_FIELDS)
+        self.book_telemetry.update(book=True, children=entry["children"])
+        return choice
+
+    def on_next_move(self, finish_time):
+        self.book_telemetry = None
+        if self.book is not None:
+            choice = self.book_choice()
+            if choice is not None:
+                log.info("%s playing from opening book: %s" % (self.name,
+                                                               self.sm.legal_to_move(self.match.our_role_index,
+                                                                                     choice)))
+                return choice
+
+        choice = ProxyPlayer.on_next_move(self, finish_time)
+
+        # the search was stopped, rather than playing on values that mean nothing
+        error = getattr(self.proxy, "leaf_evaluator_error", None)
+        if error is not None:
+            self.proxy.leaf_evaluator_error = None
+            raise error
+
+        return choice
+
+    def get_telemetry(self):
+        if self.book_telemetry is not None:
+            return self.book_telemetry
+
+        return ProxyPlayer.get_telemetry(self)
+
     def meta_create_player(self):
+        player = self.create_simple_mcts_player()
+        if self.leaf_evaluator is not None:
+            policy_size = self.evaluation_policy_size
+            if policy_size is None:
+                policy_size = max(len(actions) for actions in self.match.game_info.model.actions)
+
+            bs = self.sm.new_base_state()
+            state_byte_count = bs.byte_count()
+            interface.dealloc_basestate(bs)
+
+            interface.set_simple_mcts_leaf_evaluator(player, self.leaf_evaluator,
+                                                     len(self.sm.get_roles()),
+                                                     state_byte_count,
+                                                     self.evaluation_batch_size,
+                                                     policy_size,
+                                                     self.virtual_loss)
+        return player
+
+    def create_simple_mcts_player(self):
         return interface.create_simple_mcts_player(self.sm,
                                                    self.match.our_role_index,
                                                    self.skip_single_moves,
@@ -29,7 +152,16 @@ class SimpleMctsPlayer(ProxyPlayer):
                                                    self.ucb_constant,
                                                    self.select_random_move_count,
                                                    self.dump_depth,
-                                                   self.next_time)
+                                                   self.next_time,
+                                                   self.ponder,
+                                                   self.decoupled,
+                                                   self.adaptive_time,
+                                                   self.min_search_fraction,
+                                                   self.dominant_visit_share,
+                                                   self.rollouts_per_leaf,
+                                                   self.rollout_threads,
+                                                   self.compact_basestates,
+                                                   self.rave_equivalence)
 
 
 class GGTestPlayer1(SimpleMctsPlayer):
@@ -0,0 +1,83 @@
+import random
+
+from ggplib import interface
+from ggplib.player import get
+from ggplib.player.gamemaster import GameMaster
+from ggplib.player.history import MatchHistory, xor_delta, apply_delta
+from ggplib.db.helper import get_gdl_for_game
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_delta():
+    a = "".join(chr(random.randrange(256)) for _ in range(50))
+    b = list(a)
+    b[3] = "x"
+    b[49] = chr(ord(b[49]) ^ 1)
+    b = "".join(b)
+
+    delta = xor_delta(a, b)
+    assert len(delta) <= 6
+    assert apply_delta(a, delta) == b
+    assert xor_delta(a, a) == ""
+
+
+def test_history():
+    states = ["".join(chr(random.randrange(4)) for _ in range(20)) for _ in range(40)]
+
+    for delta_encoding in (True, False):
+        history = MatchHistory(delta_encoding=delta_encoding, keyframe_interval=8)
+        for ply, state_bytes in enumerate(states):
+            history.add_state(state_bytes)
+            if ply:
+                history.add_move((ply, 0))
+
+            assert history.get_current() == state_bytes
+
+        assert len(history) == len(states)
+        assert len(history.moves) == len(states) - 1
+        for ply in range(len(states)):
+            assert history.get(ply) == states[ply]
+        assert history.get(-1) == states[-1]
+
+    # only keyframes are full size
+    history = MatchHistory(keyframe_interval=8)
+    for ply in range(40):
+        history.add_state(states[0])
+    assert history.byte_size() == 5 * 20
+
+
+def test_match_history():
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+    for role in gm.sm.get_roles():
+        gm.add_player(get.get_player("pyrandom"), role)
+
+    gm.start(meta_time=1, move_time=1)
+    gm.play_to_end()
+
+    match = gm.matches[0]
+    assert len(match.history) == gm.get_game_depth() + 1
+    assert len(match.moves) == gm.get_game_depth()
+
+    # replay the moves, and check against the reconstructed states
+    sm = match.sm.dupe()
+    bs = sm.get_initial_state()
+    joint_move = sm.get_joint_move()
+    for ply, choices in enumerate(match.moves):
+        old_state = match.get_state(ply)
+        assert old_state.to_bytes() == bs.to_bytes()
+        interface.dealloc_basestate(old_state)
+
+        sm.update_bases(bs)
+        for ri, choice in enumerate(choices):
+            joint_move.set(ri, choice)
+        sm.next_state(joint_move, bs)
+
+    assert match.get_current_state().to_bytes() == bs.to_bytes()
+
+    interface.dealloc_basestate(bs)
+    interface.dealloc_jointmove(joint_move)
+    interface.dealloc_statemachine(sm)
@@ -1,5 +1,11 @@
+import time
+import struct
+import threading
+
 from ggplib.player import get
+from ggplib.player.simplemcts import SimpleMctsPlayer
 from ggplib.player.gamemaster import GameMaster
+from ggplib.player.match import Match
 from ggplib.db.helper import get_gdl_for_game
 
 import pytest
@@ -45,6 +51,103 @@ def test_tictactoe_play_test_db_lookup():
     assert 5 <= gm.get_game_depth() <= 9
 
 
+def test_match_move_tables():
+    game_gdl_str = get_gdl_for_game("ticTacToe").replace("mark", "kram").replace("noop", "notamove")
+
+    match = Match("test_match", "xplayer", 2, 2, get.get_player("pylegal"), game_gdl_str,
+                  verbose=False)
+    match.do_start()
+
+    for role_index, moves in enumerate(match.gamemaster_moves):
+        assert moves
+        for choice, move in enumerate(moves):
+            # in the gamemaster's symbols
+            assert "kram" in move or "notamove" in move
+            assert match.gamemaster_move_to_choice(role_index, move) == choice
+            assert match.gamemaster_move_to_choice(role_index, move.replace("(", "( ")) == choice
+
+    match.do_abort()
+
+
+def test_match_overrun_move():
+    from ggplib.player.legal_player import LegalPlayer
+
+    class OverrunPlayer(LegalPlayer):
+        overrun_moves = []
+
+        def on_next_move(self, finish_time):
+            # as the server would, from the reactor thread
+            self.overrun_moves.append(self.match.overrun_move())
+            return LegalPlayer.on_next_move(self, finish_time)
+
+    player = OverrunPlayer()
+    match = Match("test_match", "xplayer", 2, 2, player, get_gdl_for_game("ticTacToe"), verbose=False)
+    match.do_start()
+
+    # not in on_next_move(), so nothing to say
+    assert match.overrun_move() is None
+
+    match.do_play(None)
+    overrun_move = player.overrun_moves[-1]
+    assert overrun_move in match.gamemaster_moves[0]
+
+    # the gamemaster plays the overrun move, rather than the one the player went on to choose
+    noop = [m for m in match.gamemaster_moves[1] if "noop" in m][0]
+    match.do_play([overrun_move, noop])
+    assert match.last_played_choice is not None
+
+    match.do_abort()
+
+
+def test_native_best_choice_so_far():
+    player = get.get_player("simplemcts")
+    player.max_tree_search_time = 1.0
+
+    match = Match("test_match", "xplayer", 2, 5, player, get_gdl_for_game("ticTacToe"), verbose=False)
+    match.do_start()
+    legals = match.sm.get_legal_state(0).to_list()
+
+    # as the server would, from another thread while searching
+    search = threading.Thread(target=match.do_play, args=(None,))
+    search.start()
+    time.sleep(0.5)
+    choice = player.best_choice_so_far()
+    overrun_move = match.overrun_move()
+    search.join()
+
+    # from the native search, rather than the random fallback
+    assert choice in legals
+    assert overrun_move == match.legal_to_gamemaster_move(match.overrun_choice)
+    assert match.overrun_choice in legals
+
+    match.do_abort()
+
+
+@pytest.mark.parametrize("player_name", ["pymcs", "pymcs_numpy"])
+def test_python_best_choice_so_far(player_name):
+    if player_name == "pymcs_numpy":
+        pytest.importorskip("numpy")
+
+    player = get.get_player(player_name)
+    player.max_run_time = 1.0
+
+    match = Match("test_match", "xplayer", 2, 5, player, get_gdl_for_game("ticTacToe"), verbose=False)
+    match.do_start()
+    legals = match.sm.get_legal_state(0).to_list()
+
+    # as the server would, from another thread while searching
+    search = threading.Thread(target=match.do_play, args=(None,))
+    search.start()
+    time.sleep(0.5)
+    choice = player.best_choice_so_far()
+    search.join()
+
+    # from this move's search
+    assert choice in legals
+
+    match.do_abort()
+
+
 def test_tictactoe_cpp_play():
     gm = GameMaster(get_gdl_for_game("ticTacToe"))
 
@@ -172,8 +275,362 @@ def test_speed():
     gm.add_player(a, "red")
     gm.add_player(b, "black")
 
-    import time
     gm.start(meta_time=10, move_time=5)
     s = time.time()
     gm.play_to_end()
     print "DONE", time.time() - s
+
+
+def test_ponder():
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+
+    # add two c++ players, both pondering in the background
+    for role in ("red", "black"):
+        player = get.get_player("simplemcts")
+        player.ponder = True
+        player.max_tree_search_time = 0.5
+        gm.add_player(player, role)
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    # check scores/depth make some sense
+    assert sum(gm.scores.values()) == 100
+    assert gm.get_game_depth() >= 7
+
+
+def test_decoupled_simultaneous():
+    simultaneous_game = """
+  (role left)
+  (role right)
+
+  (init (step 0))
+
+  (succ 0 1)
+  (succ 1 2)
+  (succ 2 3)
+
+  (legal left a)
+  (legal left b)
+  (legal left c)
+  (legal right a)
+  (legal right b)
+  (legal right c)
+
+  (<= (next (step ?y)) (true (step ?x)) (succ ?x ?y))
+  (<= (next same) (does left ?m) (does right ?m))
+
+  (<= (goal left 100) (true same))
+  (<= (goal left 0) (not (true same)))
+  (<= (goal right 0) (true same))
+  (<= (goal right 100) (not (true same)))
+
+  (<= terminal (true (step 3)))
+    """
+
+    gm = GameMaster(simultaneous_game)
+
+    player = get.get_player("simplemcts")
+    player.decoupled = True
+    player.max_tree_search_time = 0.5
+
+    gm.add_player(player, "left")
+    gm.add_player(get.get_player("pyrandom"), "right")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+    assert gm.get_game_depth() == 3
+
+    # the search used decoupled nodes (all but the terminal nodes, in this game)
+    for info in gm.matches[0].move_info:
+        telemetry = info["telemetry"]
+        assert 0 < telemetry["decoupled_nodes"] <= telemetry["number_of_nodes"]
+
+        # growing the decoupled root (when applying a move) is accounted for
+        assert telemetry["allocated_memory"] >= 0
+
+
+# a single player game, where the first move decides the game (and the rest is too big to solve)
+DOMINANT_GAME = """
+  (role player)
+  (init (step 0))
+
+  (succ 0 1) (succ 1 2) (succ 2 3) (succ 3 4) (succ 4 5) (succ 5 6) (succ 6 7) (succ 7 8)
+  (succ 8 9) (succ 9 10) (succ 10 11) (succ 11 12) (succ 12 13) (succ 13 14) (succ 14 15)
+
+  (filler a) (filler b) (filler c)
+
+  (<= (legal player good) (true (step 0)))
+  (<= (legal player bad) (true (step 0)))
+  (<= (legal player ?m) (filler ?m) (not (true (step 0))))
+
+  (<= (next (step ?y)) (true (step ?x)) (succ ?x ?y))
+  (<= (next won) (does player good))
+  (<= (next won) (true won))
+
+  (<= (goal player 100) (true won))
+  (<= (goal player 0) (not (true won)))
+
+  (<= terminal (true (step 15)))
+"""
+
+
+def first_move_search_time(adaptive_time, move_time):
+    gm = GameMaster(DOMINANT_GAME)
+
+    player = get.get_player("simplemcts")
+    player.adaptive_time = adaptive_time
+    player.max_tree_search_time = move_time
+    gm.add_player(player, "player")
+
+    gm.start(meta_time=2, move_time=move_time + 2)
+    gm.play_single_move(None)
+
+    telemetry = player.get_telemetry()
+    for match in gm.matches:
+        match.do_abort()
+
+    return telemetry["search_time"]
+
+
+def test_adaptive_time():
+    move_time = 2.0
+
+    # without the time manager, all the time is used (the tree cannot be solved)
+    assert first_move_search_time(False, move_time) > move_time * 0.9
+
+    # with it, the search stops once the good move dominates (at most min_search_fraction)
+    assert first_move_search_time(True, move_time) < move_time * 0.6
+
+
+def test_telemetry():
+    gm = GameMaster(get_gdl_for_game("ticTacToe"))
+
+    player = get.get_player("simplemcts")
+    player.max_tree_search_time = 0.25
+    gm.add_player(player, "xplayer")
+    gm.add_player(get.get_player("pyrandom"), "oplayer")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    # first move is ours (xplayer moves first)
+    match = gm.matches[0]
+    assert len(match.move_info) == gm.get_game_depth()
+
+    telemetry = match.move_info[0]["telemetry"]
+    assert telemetry["tree_playouts"] > 0
+    assert telemetry["number_of_nodes"] > 0
+    assert len(telemetry["children"]) == 9
+    assert sum(c["visits"] for c in telemetry["children"]) > 0
+
+    # python players don't have any
+    assert gm.matches[1].move_info[0]["telemetry"] is None
+
+
+def test_leaf_parallel_rollouts():
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+
+    a = get.get_player("simplemcts")
+    a.max_tree_search_time = 0.5
+    a.rollouts_per_leaf = 4
+    a.rollout_threads = 2
+
+    b = get.get_player("simplemcts")
+    b.max_tree_search_time = 0.5
+    b.rollouts_per_leaf = 3
+
+    gm.add_player(a, "red")
+    gm.add_player(b, "black")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+
+    telemetry = gm.matches[0].move_info[0]["telemetry"]
+    assert telemetry["rollouts"] > telemetry["tree_playouts"]
+
+
+def test_compact_basestates():
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+
+    a = get.get_player("simplemcts")
+    a.max_tree_search_time = 0.5
+    a.compact_basestates = True
+
+    b = get.get_player("simplemcts")
+    b.max_tree_search_time = 0.5
+
+    gm.add_player(a, "red")
+    gm.add_player(b, "black")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+
+    compact = gm.matches[0].move_info[0]["telemetry"]
+    normal = gm.matches[1].move_info[1]["telemetry"]
+    assert compact["number_of_nodes"] > 0
+
+    # deeper than the root's children, so nodes were expanded from replayed base states
+    assert compact["average_depth"] > 1.5
+
+    # and the nodes without base states are smaller
+    assert (compact["allocated_memory"] / compact["number_of_nodes"] <
+            normal["allocated_memory"] / normal["number_of_nodes"])
+
+
+def test_rave():
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+
+    a = get.get_player("simplemcts")
+    a.max_tree_search_time = 0.5
+    a.rave_equivalence = 500
+
+    # amaf is updated per rollout, with that rollout's moves
+    b = get.get_player("simplemcts")
+    b.max_tree_search_time = 0.5
+    b.rave_equivalence = 500
+    b.rollouts_per_leaf = 4
+
+    gm.add_player(a, "red")
+    gm.add_player(b, "black")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+
+    # the first move of each (black does not move first)
+    for match, ply in ((gm.matches[0], 0), (gm.matches[1], 1)):
+        telemetry = match.move_info[ply]["telemetry"]
+        children = telemetry["children"]
+        assert all(c["amaf_visits"] > 0 for c in children)
+        assert all(0.0 <= c["amaf_score"] <= 1.0 for c in children)
+
+        # every move is played in most rollouts, so amaf sees more than the children's own visits
+        assert sum(c["amaf_visits"] for c in children) > sum(c["visits"] for c in children)
+
+
+def test_cpp_mcs():
+    gm = GameMaster(get_gdl_for_game("ticTacToe"))
+
+    x = get.get_player("mcs")
+    x.max_run_time = 0.25
+
+    o = get.get_player("pymcs")
+    o.max_run_time = 0.25
+
+    gm.add_player(x, "xplayer")
+    gm.add_player(o, "oplayer")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+
+    # same telemetry from both
+    for match in gm.matches:
+        telemetry = match.move_info[0]["telemetry"]
+        assert telemetry["rollouts"] > 0
+        assert sum(c["visits"] for c in telemetry["children"]) == telemetry["rollouts"]
+
+
+def test_numpy_mcs():
+    pytest.importorskip("numpy")
+
+    gm = GameMaster(get_gdl_for_game("connectFour"))
+
+    red = get.get_player("pymcs_numpy")
+    red.max_run_time = 0.25
+
+    black = get.get_player("pymcs")
+    black.max_run_time = 0.25
+
+    gm.add_player(red, "red")
+    gm.add_player(black, "black")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+
+    telemetry = gm.matches[0].move_info[0]["telemetry"]
+    assert telemetry["rollouts"] > 0
+    assert len(telemetry["children"]) == 8
+
+
+def test_index_moves():
+    # with a symbol mapping - which is skipped entirely by index moves
+    game_gdl_str = get_gdl_for_game("ticTacToe", dict(mark="kram",
+                                                      noop="notamove",
+                                                      cell="bell",
+                                                      oplayer="doobie"))
+
+    gm = GameMaster(game_gdl_str, index_moves=True)
+
+    gm.add_player(get.get_player("pyrandom"), "xplayer")
+    gm.add_player(get.get_player("simplemcts"), "doobie")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+    assert 5 <= gm.get_game_depth() <= 9
+
+    # moves are stored as choices, and only converted for logging
+    match = gm.matches[0]
+    assert isinstance(match.moves[0], tuple)
+    assert "mark" in match.move_to_str(match.moves[0])
+
+
+def test_batched_leaf_evaluator():
+    batch_sizes = []
+
+    class EvaluatedPlayer(SimpleMctsPlayer):
+        max_tree_search_time = 0.5
+        evaluation_batch_size = 16
+
+        def leaf_evaluator(self, count, states, values, priors):
+            batch_sizes.append(count)
+            assert len(states) % count == 0
+
+            # a draw everywhere, and a preference for the lowest choices
+            values[:] = struct.pack("<%df" % (len(values) // 4), *([0.5] * (len(values) // 4)))
+            n = len(priors) // 4
+            priors[:] = struct.pack("<%df" % n, *[1.0 / (1 + ii % 10) for ii in range(n)])
+
+    gm = GameMaster(get_gdl_for_game("ticTacToe"))
+    gm.add_player(EvaluatedPlayer(), "xplayer")
+    gm.add_player(get.get_player("random"), "oplayer")
+
+    gm.start(meta_time=2, move_time=1)
+    gm.play_to_end()
+
+    assert sum(gm.scores.values()) == 100
+    assert batch_sizes
+    assert max(batch_sizes) > 1
+
+
+def test_batched_leaf_evaluator_error():
+    class BrokenPlayer(SimpleMctsPlayer):
+        max_tree_search_time = 5
+
+        def leaf_evaluator(self, count, states, values, priors):
+            raise ValueError("broken evaluator")
+
+    match = Match("test_match", "xplayer", 2, 10, BrokenPlayer(), get_gdl_for_game("ticTacToe"), verbose=False)
+    match.do_start()
+
+    # the search stops, and the error is raised (rather than playing on neutral values)
+    start_time = time.time()
+    with pytest.raises(ValueError):
+        match.do_play(None)
+
+    assert time.time() - start_time < 2
+
+    match.do_abort()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+
+from ggplib.player import selfplay
+from ggplib.db import lookup
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_basestate_bytes():
+    sm = lookup.by_name("ticTacToe").get_sm()
+    bs = sm.get_initial_state()
+    buf = bs.to_bytes()
+    assert len(buf) == bs.byte_count()
+
+    other = sm.new_base_state()
+    assert not other.equals(bs)
+    other.from_bytes(buf)
+    assert other.equals(bs)
+
+
+def test_layout_pack_unpack():
+    layout = selfplay.RecordLayout("x", ["a", "b"], 3, [10, 2])
+    record = layout.pack("abc", 7, [[1, 9], [0]], [9, 0], [{1: 0.25, 9: 0.75}, {0: 1.0}], [100, 0])
+    assert len(record) == layout.record_size
+
+    res = layout.unpack(record)
+    assert res["state"] == "abc"
+    assert res["ply"] == 7
+    assert res["legals"] == [[1, 9], [0]]
+    assert res["choices"] == [9, 0]
+    assert abs(res["policies"][0][9] - 0.75) < 0.001
+    assert res["policies"][1] == {0: 1.0}
+    assert res["goals"] == [100, 0]
+
+
+def test_generate():
+    directory = tempfile.mkdtemp()
+    try:
+        filenames = selfplay.generate("ticTacToe", 2, directory, "test",
+                                      move_time=0.2, records_per_shard=4)
+        assert len(filenames) > 1
+
+        records = [r for fn in filenames for r in selfplay.read_shard(fn)]
+        assert len(records) >= 10
+        assert records[0]["ply"] == 0
+        for r in records:
+            assert sum(r["goals"]) == 100
+            for role_index, choice in enumerate(r["choices"]):
+                assert choice in r["legals"][role_index]
+                assert abs(sum(r["policies"][role_index].values()) - 1.0) < 0.01
+
+        assert all(os.path.exists(fn) for fn in filenames)
+    finally:
+        shutil.rmtree(directory)
+
+
+class TrackedPlayer(selfplay.SelfPlayPlayer):
+    instances = []
+
+    def __init__(self):
+        selfplay.SelfPlayPlayer.__init__(self)
+        self.created = 0
+        TrackedPlayer.instances.append(self)
+
+    def meta_create_player(self):
+        self.created += 1
+        return selfplay.SelfPlayPlayer.meta_create_player(self)
+
+
+def test_self_play_cleanup():
+    TrackedPlayer.instances = []
+    records = list(selfplay.self_play("ticTacToe", 3, move_time=0.1, player_cls=TrackedPlayer))
+    assert len(records) > 3
+
+    assert len(TrackedPlayer.instances) == 2
+    for player in TrackedPlayer.instances:
+        assert player.created == 3
+
+        # the last game has been freed too
+        assert player.proxy is None
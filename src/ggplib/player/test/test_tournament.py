@@ -0,0 +1,60 @@
+import os
+import json
+import tempfile
+
+from ggplib.player import tournament
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_create_specs():
+    specs = tournament.create_specs(["ticTacToe"], ["random", "legal"], 3, 1, 1)
+    assert [s.match_key for s in specs] == ["ticTacToe/0", "ticTacToe/1", "ticTacToe/2"]
+    assert specs[0].player_types == ["random", "legal"]
+    assert specs[1].player_types == ["legal", "random"]
+
+
+def test_play_match_cleanup():
+    spec = tournament.MatchSpec("ticTacToe/x", "ticTacToe", ["pyrandom", "pylegal"], 1, 1)
+    for _ in range(2):
+        result = tournament.play_match(spec)
+        assert "error" not in result
+
+        # the matches (and their statemachines) are freed before the gamemaster is reused
+        assert tournament._gamemasters["ticTacToe"].matches is None
+
+
+def test_run_and_resume():
+    fd, results_filename = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+
+    try:
+        tournament.run(["ticTacToe"], ["pyrandom", "pylegal"], 4, results_filename,
+                       processes=2, meta_time=1, move_time=1)
+
+        results = [json.loads(l) for l in open(results_filename)]
+        assert len(results) == 4
+        for result in results:
+            assert "error" not in result
+            assert sum(result["scores"]) == 100
+            assert len(result["move_times"]) == result["depth"]
+
+        # simulate an interruption - a partial line and a missing match
+        lines = open(results_filename).readlines()
+        with open(results_filename, "w") as f:
+            f.writelines(lines[:3])
+            f.write('{"match_key": "ticT')
+
+        assert len(tournament.completed_matches(results_filename)) == 3
+
+        tournament.run(["ticTacToe"], ["pyrandom", "pylegal"], 4, results_filename,
+                       processes=2, meta_time=1, move_time=1)
+
+        assert len(tournament.completed_matches(results_filename)) == 4
+        assert sorted(tournament.summary(results_filename).keys()) == ["pylegal", "pyrandom"]
+
+    finally:
+        os.remove(results_filename)
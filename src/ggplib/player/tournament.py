@@ -0,0 +1,216 @@
+''' runs many local matches across a pool of processes.  Each worker process has its own
+GameMaster (and statemachine) per game.  Results are streamed to a json lines file, one line per
+match, and a tournament can be resumed from the file after an interruption. '''
+
+import os
+import json
+import time
+import traceback
+import multiprocessing
+
+from ggplib.util import log
+from ggplib.player import get
+from ggplib.player.gamemaster import GameMaster
+from ggplib.db.helper import get_gdl_for_game
+
+
+class MatchSpec(object):
+    def __init__(self, match_key, game, player_types, meta_time, move_time):
+        self.match_key = match_key
+        self.game = game
+
+        # one per role, in role order
+        self.player_types = player_types
+        self.meta_time = meta_time
+        self.move_time = move_time
+
+
+###############################################################################
+# in the worker processes
+
+_gamemasters = {}
+
+
+def worker_init():
+    from ggplib.util.init import setup_once
+    setup_once("tournament_%d" % os.getpid())
+
+
+def get_gamemaster(game):
+    if game not in _gamemasters:
+        _gamemasters[game] = GameMaster(get_gdl_for_game(game), index_moves=True)
+
+    gm = _gamemasters[game]
+    gm.reset()
+    gm.clear_players()
+    return gm
+
+
+def play_match(spec):
+    ' plays a single match, returns a result dict (never raises) '
+    result = dict(match_key=spec.match_key,
+                  game=spec.game,
+                  player_types=spec.player_types,
+                  pid=os.getpid())
+
+    start_time = time.time()
+    gm = None
+    try:
+        gm = get_gamemaster(spec.game)
+        roles = gm.sm.get_roles()
+        assert len(roles) == len(spec.player_types)
+
+        for role, player_type in zip(roles, spec.player_types):
+            gm.add_player(get.get_player(player_type), role)
+
+        gm.start(meta_time=spec.meta_time, move_time=spec.move_time)
+
+        move_times = []
+        last_move = None
+        while not gm.finished():
+            ply_start_time = time.time()
+            last_move = gm.play_single_move_index(last_move)
+            move_times.append(round(time.time() - ply_start_time, 4))
+
+        gm.play_to_end(last_move)
+
+        result["roles"] = roles
+        result["scores"] = [gm.get_score(role) for role in roles]
+        result["depth"] = gm.get_game_depth()
+        result["move_times"] = move_times
+
+    except Exception as exc:
+        log.error("match %s failed: %s" % (spec.match_key, exc))
+        log.error(traceback.format_exc())
+        result["error"] = str(exc)
+
+    finally:
+        # the matches are created with no_cleanup, and the gamemaster is reused for the next match -
+        # so free the matches here (and with them the players, their trees and statemachines)
+        if gm is not None and gm.matches:
+            for match in gm.matches:
+                match.cleanup()
+            gm.matches = None
+
+    result["elapsed"] = round(time.time() - start_time, 3)
+    return result
+
+
+###############################################################################
+# in the parent process
+
+def create_specs(games, player_types, number_of_matches, meta_time, move_time):
+    ' seats rotate through the players each match, so every player gets to play every role '
+    specs = []
+    for game in games:
+        for match_number in range(number_of_matches):
+            shift = match_number % len(player_types)
+            seated = player_types[shift:] + player_types[:shift]
+            match_key = "%s/%d" % (game, match_number)
+            specs.append(MatchSpec(match_key, game, seated, meta_time, move_time))
+
+    return specs
+
+
+def completed_matches(results_filename):
+    ' the match keys already in the results file (matches with errors are played again) '
+    completed = set()
+    if not os.path.exists(results_filename):
+        return completed
+
+    for line in open(results_filename):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            result = json.loads(line)
+
+        except ValueError:
+            # a partially written line, from an interruption
+            continue
+
+        if "error" not in result:
+            completed.add(str(result["match_key"]))
+
+    return completed
+
+
+def ends_with_partial_line(results_filename):
+    ' checked with its own handle, as switching an append handle from reading to writing is undefined '
+    if not os.path.exists(results_filename) or os.path.getsize(results_filename) == 0:
+        return False
+
+    with open(results_filename, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != "\n"
+
+
+def run(games, player_types, number_of_matches, results_filename,
+        processes=None, meta_time=5, move_time=2):
+
+    specs = create_specs(games, player_types, number_of_matches, meta_time, move_time)
+
+    completed = completed_matches(results_filename)
+    specs = [s for s in specs if s.match_key not in completed]
+
+    log.info("Tournament: %d matches to play (%d already completed), results to %s" % (len(specs),
+                                                                                         len(completed),
+                                                                                         results_filename))
+    if not specs:
+        return
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    pool = multiprocessing.Pool(processes=processes, initializer=worker_init)
+
+    start_time = time.time()
+    played = 0
+    with open(results_filename, "a") as f:
+        # terminate any partially written line, from an interruption
+        if ends_with_partial_line(results_filename):
+            f.write("\n")
+
+        try:
+            for result in pool.imap_unordered(play_match, specs):
+                played += 1
+                elapsed = time.time() - start_time
+                result["matches_per_hour"] = round(played * 3600.0 / elapsed, 2)
+
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+
+                log.info("Tournament: %d/%d, %s %s %s" % (played, len(specs), result["match_key"],
+                                                          result.get("scores"), result.get("error", "")))
+
+            pool.close()
+
+        except KeyboardInterrupt:
+            log.warning("Tournament interrupted, resume by running again")
+            pool.terminate()
+            raise
+
+        finally:
+            pool.join()
+
+
+def summary(results_filename):
+    ' average score for each player type, over all completed matches '
+    totals = {}
+    for line in open(results_filename):
+        try:
+            result = json.loads(line)
+
+        except ValueError:
+            continue
+
+        if "error" in result:
+            continue
+
+        for player_type, score in zip(result["player_types"], result["scores"]):
+            total = totals.setdefault(player_type, [0, 0])
+            total[0] += score
+            total[1] += 1
+
+    return dict((k, v[0] / float(v[1])) for k, v in totals.items())
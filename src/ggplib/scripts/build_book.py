@@ -0,0 +1,38 @@
+''' builds opening books offline.  For each game, plays the first plies with long searches and
+stores the root statistics in the game's store (see ggplib.db.book).
+
+usage: build_book.py <game|all> [plies] [move_time] [games]
+'''
+
+import sys
+
+from ggplib.util import log
+from ggplib.db import lookup
+from ggplib.player.bookbuilder import build
+
+
+def main(args):
+    game = args[0]
+    plies = int(args[1]) if len(args) > 1 else 4
+    move_time = float(args[2]) if len(args) > 2 else 60.0
+    number_of_games = int(args[3]) if len(args) > 3 else 1
+
+    if game == "all":
+        games = sorted(lookup.get_all_game_names())
+    else:
+        games = [game]
+
+    for game in games:
+        log.info("Building opening book for %s: %d plies, %.1f seconds per move" % (game, plies, move_time))
+        try:
+            build(game, plies, move_time, number_of_games)
+
+        except Exception as exc:
+            log.error("Failed to build book for %s: %s" % (game, exc))
+
+
+if __name__ == "__main__":
+    from ggplib.util.init import setup_once
+    setup_once("build_book")
+
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+''' compares iterations per second of the python and c++ flat monte carlo players.
+
+usage: mcs_bench.py [game] [moves] [move_time]
+'''
+
+import sys
+
+from ggplib.util import log
+from ggplib.player import get
+from ggplib.player.gamemaster import GameMaster
+from ggplib.db.helper import get_gdl_for_game
+
+
+def bench(game, player_type, moves, move_time):
+    gm = GameMaster(get_gdl_for_game(game))
+    roles = gm.sm.get_roles()
+
+    player = get.get_player(player_type)
+    player.max_run_time = move_time
+    gm.add_player(player, roles[0])
+
+    for role in roles[1:]:
+        gm.add_player(get.get_player("random"), role)
+
+    gm.start(meta_time=move_time + 5, move_time=move_time + 5)
+
+    iterations = 0
+    search_time = 0.0
+
+    last_move = None
+    for _ in range(moves):
+        if gm.finished():
+            break
+
+        last_move = gm.play_single_move(last_move)
+
+        telemetry = player.get_telemetry()
+        if telemetry:
+            iterations += telemetry["rollouts"]
+            search_time += telemetry["search_time"]
+
+    for match in gm.matches:
+        match.do_abort()
+
+    return iterations, search_time
+
+
+def main(args):
+    game = args[0] if len(args) > 0 else "connectFour"
+    moves = int(args[1]) if len(args) > 1 else 5
+    move_time = float(args[2]) if len(args) > 2 else 2.0
+
+    results = {}
+    for player_type in ("pymcs", "mcs"):
+        iterations, search_time = bench(game, player_type, moves, move_time)
+        results[player_type] = iterations / max(search_time, 0.001)
+
+    log.info("====================================================")
+    log.info("mcs benchmark game %s, %d moves of %.1f seconds" % (game, moves, move_time))
+    for player_type, per_second in sorted(results.items()):
+        log.info("%s: %.1f iterations per second" % (player_type, per_second))
+
+    if results["pymcs"] > 0:
+        log.info("speedup: %.1fx" % (results["mcs"] / results["pymcs"]))
+    log.info("====================================================")
+
+
+if __name__ == "__main__":
+    from ggplib.util.init import setup_once
+    setup_once("mcs_bench")
+
+    main(sys.argv[1:])
@@ -0,0 +1,34 @@
+''' plays a tournament of local matches across a pool of processes (see ggplib.player.tournament).
+
+usage: tournament.py <games> <player_types> <number_of_matches> <results_file> [processes] [move_time]
+
+games and player_types are comma separated, player types as in ggplib.player.get.  Running again
+with the same results file resumes the tournament.
+'''
+
+import sys
+
+from ggplib.util import log
+from ggplib.player import tournament
+
+
+def main(args):
+    games = args[0].split(",")
+    player_types = args[1].split(",")
+    number_of_matches = int(args[2])
+    results_filename = args[3]
+    processes = int(args[4]) if len(args) > 4 else None
+    move_time = float(args[5]) if len(args) > 5 else 2.0
+
+    tournament.run(games, player_types, number_of_matches, results_filename,
+                   processes=processes, meta_time=move_time * 2, move_time=move_time)
+
+    for player_type, score in sorted(tournament.summary(results_filename).items()):
+        log.info("%s: average score %.2f" % (player_type, score))
+
+
+if __name__ == "__main__":
+    from ggplib.util.init import setup_once
+    setup_once("tournament")
+
+    main(sys.argv[1:])
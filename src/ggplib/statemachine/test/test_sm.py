@@ -137,3 +137,47 @@ def test_dupes_deallocs():
     for game in ("ticTacToe", "connectFour", "breakthrough"):
         gdl_str = helper.get_gdl_for_game(game)
         go(gdl_str)
+
+
+def test_trajectories():
+    gdl_str = helper.get_gdl_for_game("ticTacToe")
+    _, sm = builder.build_sm(gdl_str)
+
+    sm.reset()
+    initial_state = sm.get_initial_state()
+    joint_move = sm.get_joint_move()
+    next_state = sm.new_base_state()
+
+    count = 0
+    for trajectory in interface.trajectories(sm, 20):
+        count += 1
+        assert not trajectory.truncated
+        assert 5 <= trajectory.depth <= 9
+        assert sum(trajectory.get_scores()) == 100
+        assert trajectory.get_state_bytes(0) == initial_state.to_bytes()
+
+        # replay the moves, and check the states
+        sm.update_bases(initial_state)
+        for ii in range(trajectory.depth):
+            for ri, choice in enumerate(trajectory.get_joint_move(ii)):
+                joint_move.set(ri, choice)
+
+            sm.next_state(joint_move, next_state)
+            assert next_state.to_bytes() == trajectory.get_state_bytes(ii + 1)
+            sm.update_bases(next_state)
+
+        assert sm.is_terminal()
+
+    assert count == 20
+
+    # only one action has any weight for the first role, so always played first
+    sm.update_bases(initial_state)
+    first_choice = sm.get_legal_state(0).get_legal(0)
+    weights = [0.0] * (first_choice + 1)
+    weights[first_choice] = 1.0
+
+    for trajectory in interface.trajectories(sm, 5, weights=[weights, None]):
+        assert trajectory.get_joint_move(0)[0] == first_choice
+
+    interface.dealloc_basestate(initial_state)
+    interface.dealloc_basestate(next_state)
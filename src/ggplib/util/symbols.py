@@ -1,3 +1,6 @@
+import sys
+
+
 class Term(str):
     @property
     def is_variable(self):
@@ -58,10 +61,33 @@ def tokenize(s):
     return s.replace('(', ' ( ').replace(')', ' ) ').split()
 
 
+# the words of gdl itself, which every game has
+GDL_KEYWORDS = ("role", "init", "true", "next", "legal", "does", "goal", "terminal",
+                "distinct", "or", "not", "<=", "base", "input")
+
+
 class SymbolFactory(object):
-    def __init__(self):
+    ''' interns symbols, so equal symbols are the same instance.  With a parent, symbols already in
+        the parent are taken from there - and only new symbols go in this pool.  So a long lived
+        parent can hold the common symbols, with a short lived child for each game. '''
+
+    def __init__(self, parent=None):
+        self.parent = parent
         self.symbol_pool = dict()
 
+    def lookup(self, clz, args):
+        ' the interned instance (here or in a parent), or None.  Never creates. '
+        clz_pool = self.symbol_pool.get(clz)
+        if clz_pool is not None:
+            instance = clz_pool.get(args)
+            if instance is not None:
+                return instance
+
+        if self.parent is not None:
+            return self.parent.lookup(clz, args)
+
+        return None
+
     def create(self, clz, *args):
         # make args hashable
         new_args = []
@@ -71,6 +97,11 @@ class SymbolFactory(object):
             new_args.append(arg)
         args = tuple(new_args)
 
+        if self.parent is not None:
+            instance = self.parent.lookup(clz, args)
+            if instance is not None:
+                return instance
+
         # symbol[clz] -> clz_pool[args] -> instance
         try:
             clz_pool = self.symbol_pool[clz]
@@ -120,3 +151,21 @@ class SymbolFactory(object):
         line = list(self.to_symbols(string))
         assert len(line) == 1
         return line[0]
+
+    def symbol_count(self):
+        ' in this pool only (not the parent) '
+        return sum(len(clz_pool) for clz_pool in self.symbol_pool.values())
+
+    def byte_size(self):
+        ''' approximate memory of the symbols in this pool.  A ListTerm is only its tuple, as the
+            symbols in it are interned (and counted) separately. '''
+        return sum(sys.getsizeof(instance)
+                   for clz_pool in self.symbol_pool.values() for instance in clz_pool.values())
+
+
+def keyword_symbol_factory(extra_keywords=()):
+    ' a SymbolFactory of the gdl keywords (and extra_keywords), intended as a parent pool '
+    factory = SymbolFactory()
+    for keyword in GDL_KEYWORDS + tuple(extra_keywords):
+        factory.create(Term, keyword)
+    return factory
@@ -0,0 +1,41 @@
+from ggplib.util.symbols import SymbolFactory, Term, ListTerm, keyword_symbol_factory
+
+GDL = "(role white) (role black) (<= (legal ?r noop) (role ?r) (true (control ?r)))"
+
+
+def test_child_pool():
+    root = keyword_symbol_factory(("play", "nil"))
+    root_count = root.symbol_count()
+    assert root_count > 0
+
+    child = SymbolFactory(parent=root)
+    symbols = list(child.to_symbols(GDL))
+
+    # keywords are the instances of the root
+    assert symbols[0][0] is root.lookup(Term, ("role",))
+    assert symbols[2][0] is root.lookup(Term, ("<=",))
+
+    # the rest are only in the child
+    assert root.symbol_count() == root_count
+    assert child.lookup(Term, ("white",)) is symbols[0][1]
+    assert root.lookup(Term, ("white",)) is None
+    assert child.symbol_count() > 0
+    assert child.byte_size() > 0
+
+    # another child shares the keywords, but not the symbols of the game
+    other = SymbolFactory(parent=root)
+    other_symbols = list(other.to_symbols(GDL))
+    assert other_symbols[0][0] is symbols[0][0]
+    assert other_symbols[0][1] == symbols[0][1]
+    assert other_symbols[0][1] is not symbols[0][1]
+    assert other_symbols[0] is not symbols[0]
+    assert isinstance(other_symbols[0], ListTerm)
+
+
+def test_no_parent():
+    factory = SymbolFactory()
+    a = factory.symbolize("(play m1 nil)")
+    b = factory.symbolize("(play m1 nil)")
+    assert a is b
+    assert factory.lookup(Term, ("m1",)) is a[1]
+    assert factory.lookup(Term, ("nope",)) is None
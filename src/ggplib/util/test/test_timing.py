@@ -0,0 +1,59 @@
+from ggplib.util.timing import RollingPercentiles, RequestTiming, CushionCalibrator
+
+
+def test_rolling_percentiles():
+    p = RollingPercentiles(window_size=10)
+    assert p.percentile(50) is None
+
+    for v in range(20):
+        p.add(v)
+
+    # only the last 10
+    assert len(p) == 10
+    assert p.min() == 10
+    assert p.percentile(0) == 10
+    assert p.percentile(100) == 19
+    assert 14 <= p.percentile(50) <= 15
+
+
+def make_timing(match_id, total, search):
+    timing = RequestTiming("play", match_id)
+    timing.add("process", total)
+    timing.add("search", search)
+    timing.last_time = timing.receive_time + total
+    return timing
+
+
+def test_cushion_calibrator():
+    calibrator = CushionCalibrator(1.5, floor=0.25, min_samples=4)
+
+    # not enough samples yet
+    for _ in range(3):
+        calibrator.on_sent(make_timing("m", 5.2, 5.0))
+    assert calibrator.get_cushion() == 1.5
+
+    calibrator.on_sent(make_timing("m", 5.2, 5.0))
+    assert abs(calibrator.get_cushion() - 0.45) < 0.01
+
+    # a round trip, the gap from the last response to the next request
+    timing = RequestTiming("play", "m")
+    timing.receive_time = calibrator.last_sent["m"] + 0.1
+    calibrator.on_receive(timing)
+    assert abs(calibrator.get_cushion() - 0.55) < 0.01
+
+    # overruns (no search) are not overhead
+    timing = RequestTiming("play", "m")
+    timing.add("process", 9.0)
+    timing.last_time = timing.receive_time + 9.0
+    calibrator.on_sent(timing)
+    assert abs(calibrator.get_cushion() - 0.55) < 0.01
+
+    # the player returning after its end time is overhead too
+    timing = make_timing("m", 5.2, 5.0)
+    timing.add("late", 0.3)
+    calibrator.on_sent(timing)
+    assert abs(calibrator.get_cushion() - 0.85) < 0.01
+
+    assert "search" in calibrator.summary()
+    calibrator.forget("m")
+    assert "m" not in calibrator.last_sent
@@ -0,0 +1,118 @@
+import time
+import collections
+
+
+class RollingPercentiles(object):
+    ' a rolling window of values, with percentiles over the window '
+
+    def __init__(self, window_size=64):
+        self.values = collections.deque(maxlen=window_size)
+
+    def add(self, value):
+        self.values.append(value)
+
+    def percentile(self, p):
+        ' nearest rank percentile, p is 0-100.  None if there are no values. '
+        if not self.values:
+            return None
+
+        ordered = sorted(self.values)
+        index = int(round(p / 100.0 * (len(ordered) - 1)))
+        return ordered[index]
+
+    def min(self):
+        return min(self.values) if self.values else None
+
+    def __len__(self):
+        return len(self.values)
+
+
+class RequestTiming(object):
+    ''' the time spent in each phase of handling a request, from when it was received.  mark(phase)
+        adds the time since the last mark to phase, add() is for phases measured elsewhere (which
+        overlap the marked phases, such as search inside process). '''
+
+    def __init__(self, what=None, match_id=None):
+        self.what = what
+        self.match_id = match_id
+        self.receive_time = self.last_time = time.time()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.time()
+        self.add(phase, now - self.last_time)
+        self.last_time = now
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def total(self):
+        return self.last_time - self.receive_time
+
+
+class CushionCalibrator(object):
+    ''' per game server, derives the cushion from what is observed of a request.
+
+        The cushion has to cover the time from the gamemaster sending a request to us receiving it,
+        plus our time processing the request outside of the search (parsing, applying moves, thread
+        hand over, sending the response) and the response getting back.  The processing overhead is
+        measured directly (total - search), plus how late the player returned after its end time
+        (the "late" phase, see Match.record_late()).  The network time is bounded by the shortest gap
+        between sending a response and receiving the next request of the same match - the
+        gamemaster may wait for other players, but never less than a round trip.
+
+        Until there are min_samples requests, initial_cushion is used. '''
+
+    def __init__(self, initial_cushion, floor=0.25, max_cushion=5.0, min_samples=4,
+                 window_size=64, overhead_percentile=95):
+        self.initial_cushion = initial_cushion
+        self.floor = floor
+        self.max_cushion = max_cushion
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.overhead_percentile = overhead_percentile
+
+        self.overheads = RollingPercentiles(window_size)
+        self.round_trips = RollingPercentiles(window_size)
+
+        # phase -> RollingPercentiles
+        self.phases = {}
+
+        # match_id -> time last response was sent
+        self.last_sent = {}
+
+    def on_receive(self, timing):
+        sent_time = self.last_sent.pop(timing.match_id, None)
+        if sent_time is not None:
+            self.round_trips.add(timing.receive_time - sent_time)
+
+    def on_sent(self, timing):
+        ' timing is complete, the response was just sent '
+        self.last_sent[timing.match_id] = timing.last_time
+
+        for phase, seconds in timing.phases.items():
+            if phase not in self.phases:
+                self.phases[phase] = RollingPercentiles(self.window_size)
+            self.phases[phase].add(seconds)
+
+        # no search means we replied before the player did (an overrun), which is not overhead
+        if "search" in timing.phases:
+            overhead = timing.total() - timing.phases["search"] + timing.phases.get("late", 0.0)
+            self.overheads.add(max(0.0, overhead))
+
+    def forget(self, match_id):
+        self.last_sent.pop(match_id, None)
+
+    def get_cushion(self):
+        if len(self.overheads) < self.min_samples:
+            return self.initial_cushion
+
+        cushion = self.floor + self.overheads.percentile(self.overhead_percentile)
+        if self.round_trips:
+            cushion += self.round_trips.min()
+
+        return min(self.max_cushion, cushion)
+
+    def summary(self):
+        ' phase -> (p50, p95) '
+        return dict((phase, (p.percentile(50), p.percentile(95))) for phase, p in self.phases.items())
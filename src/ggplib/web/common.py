@@ -0,0 +1,94 @@
+''' shared by the twisted (server.py) and the lightweight (light_server.py) ggp servers - so must
+not import twisted. '''
+
+from ggplib.util.symbols import ListTerm, SymbolFactory, keyword_symbol_factory, tokenize
+
+
+###################################################################################################
+# timeout if we don't hear anything for at least this time
+
+GAMESERVER_TIMEOUT = 60 * 20
+
+###################################################################################################
+
+# Indicate how much time to give for communication between gamemaster and player.  This is useful
+# for when matches are scheduled at other locations around the world and the latency can cause
+# timeouts.  This is only the starting point, the cushion is then calibrated for each game server
+# from the observed timings (see CushionCalibrator).
+
+CUSHION_TIME = 1.5
+
+# matches are started and played off the network thread, so it stays responsive (info, abort and
+# timeouts).  If the player has not replied by this fraction of the cushion before the deadline,
+# the server replies on its behalf (see Match.overrun_move()).
+OVERRUN_CUSHION_FRACTION = 0.5
+
+# GET on this path returns the metrics (see metrics.py), rather than being handled as a request
+METRICS_PATH = "/metrics"
+
+# the gdl and protocol keywords are interned once, for all matches.  Everything else is interned
+# in a pool per match (ServedMatch.symbol_factory), which goes with the match on stop or abort.
+PROTOCOL_KEYWORDS = ("info", "start", "play", "stop", "abort", "nil")
+
+ROOT_SYMBOLS = keyword_symbol_factory(PROTOCOL_KEYWORDS)
+
+###################################################################################################
+
+class ServedMatch(object):
+    ' a match being played by the server, and its bookkeeping '
+
+    def __init__(self, the_match, lock, calibrator, symbol_factory, allocation=None):
+        self.match = the_match
+        self.calibrator = calibrator
+
+        # the symbols of the match (with ROOT_SYMBOLS as the parent)
+        self.symbol_factory = symbol_factory
+
+        # start, play, stop and abort for the match run one at a time, in the order received
+        self.lock = lock
+
+        # from the scheduler, None when the server has a single player
+        self.allocation = allocation
+
+        self.timeout_call = None
+
+
+def peek_match_id(content):
+    ' the match id of a request, without parsing all of it.  None if there is not one. '
+    tokens = tokenize(content.lstrip()[:512])
+    if len(tokens) > 2 and tokens[0] == "(":
+        return tokens[2]
+    return None
+
+
+def symbol_factory_for(matches, content):
+    ''' the symbol pool of the match the request is for, or a new pool (for a start, or a request
+        with no match) '''
+    served = matches.get(peek_match_id(content))
+    if served is not None:
+        return served.symbol_factory
+
+    return SymbolFactory(parent=ROOT_SYMBOLS)
+
+
+def deadline(the_match, wait_time):
+    ' seconds from receiving a request, after which the server replies on behalf of the player '
+    return wait_time - the_match.get_cushion_time() * OVERRUN_CUSHION_FRACTION
+
+
+def play_move(move):
+    ' the move of a play request, a list of moves or None for nil '
+    if isinstance(move, ListTerm):
+        return list(move)
+
+    assert move.lower() == 'nil', "Move is %s" % move
+    return None
+
+
+def format_response(res):
+    return res.replace('(', ' ( ').replace(')', ' ) ')
+
+
+def add_timings(timing, match_timings):
+    for phase, seconds in match_timings.items():
+        timing.add(phase, seconds)
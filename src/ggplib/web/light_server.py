@@ -0,0 +1,486 @@
+''' a lightweight ggp server, as GGPServer (server.py) but without twisted - just the standard
+library http server, with a thread per connection (and HTTP/1.1 keep-alive).
+
+The requests for a match are run one at a time, in order, on an Executor - a thread per match, or
+one shared thread when the server has a single player.  The connection thread waits for the result
+up to the deadline, and replies on the player's behalf after that (see Match.overrun_move()).
+'''
+
+import time
+import Queue
+import threading
+import traceback
+import collections
+import SocketServer
+import BaseHTTPServer
+
+from ggplib.util import log
+from ggplib.util.timing import RequestTiming, CushionCalibrator
+
+from ggplib.player import match
+from ggplib.web.scheduler import ResourceScheduler
+from ggplib.web import metrics
+from ggplib.web.common import (GAMESERVER_TIMEOUT, CUSHION_TIME, METRICS_PATH, ServedMatch,
+                               deadline, play_move, add_timings, format_response,
+                               symbol_factory_for)
+
+
+###############################################################################
+
+class Task(object):
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.fn(*self.args)
+
+        except Exception as exc:
+            log.error("ERROR in %s: %s" % (self.fn.__name__, exc))
+            log.error(traceback.format_exc())
+            self.error = exc
+
+        finally:
+            self.done.set()
+
+    def wait(self, timeout=None):
+        ' returns True if the task is done '
+        self.done.wait(timeout)
+        return self.done.is_set()
+
+
+class Executor(object):
+    ' runs tasks one at a time, in the order submitted, on its own thread '
+
+    def __init__(self, name):
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self.loop, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def loop(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            task.run()
+
+    def submit(self, fn, *args):
+        task = Task(fn, args)
+        self.queue.put(task)
+        return task
+
+    def shutdown(self):
+        ' after any tasks already submitted '
+        self.queue.put(None)
+
+
+class Pending(object):
+    ''' a task, which the connection thread waits for (outside of the server lock).  wait_time is
+        from when the request was received. '''
+
+    def __init__(self, task, timing, wait_time, on_overrun):
+        self.task = task
+        self.deadline_time = timing.receive_time + wait_time
+        self.on_overrun = on_overrun
+
+
+###############################################################################
+
+class LightGGPServer(object):
+    ''' the same protocol handling as GGPServer.  Called from many connection threads at once, so
+        the bookkeeping is under self.lock. '''
+
+    player = None
+    player_factory = None
+    scheduler = None
+    max_matches = 1
+    last_info_time = 0
+    info_counts = 0
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+        # match_id -> ServedMatch (with an Executor as the lock)
+        self.matches = {}
+
+        # with a single player, all matches share the one executor (and player)
+        self.shared_executor = Executor("ggp_shared")
+
+        # game server ip -> CushionCalibrator
+        self.calibrators = {}
+
+        # (name, type) -> count, see metrics.COUNTER_HELP
+        self.counters = collections.Counter()
+
+    def set_player(self, player):
+        self.player = player
+        self.player_factory = None
+        self.scheduler = None
+        self.max_matches = 1
+
+    def set_player_factory(self, player_factory, max_matches, threads, memory):
+        ' as GGPServer.set_player_factory() '
+        self.player_factory = player_factory
+        self.player = player_factory()
+        self.scheduler = ResourceScheduler(max_matches, threads, memory)
+
+        # (may be fewer, if there are not enough threads)
+        self.max_matches = self.scheduler.max_matches
+
+    def get_calibrator(self, ip):
+        if ip not in self.calibrators:
+            self.calibrators[ip] = CushionCalibrator(CUSHION_TIME)
+        return self.calibrators[ip]
+
+    def render_metrics(self):
+        with self.lock:
+            return metrics.render(self)
+
+    def on_sent(self, ip, timing):
+        ' only the start and play requests of matches being played are calibrated '
+        if timing.what not in ("start", "play"):
+            return
+
+        with self.lock:
+            if timing.match_id in self.matches:
+                self.get_calibrator(ip).on_sent(timing)
+
+    def handle(self, content, ip, timing):
+        ' returns the response (blocks until there is one) '
+
+        # Tiltyard seems to ping with empty content...
+        if content == "":
+            with self.lock:
+                return self.handle_info()
+
+        symbols = []
+        try:
+            with self.lock:
+                symbol_factory = symbol_factory_for(self.matches, content)
+                symbols = list(symbol_factory.symbolize(content))
+                timing.mark("parse")
+                res = self.dispatch(symbols, ip, timing, symbol_factory)
+
+            if isinstance(res, Pending):
+                res = self.wait_for(res)
+
+        except Exception as exc:
+            log.error("ERROR - aborting: %s" % exc)
+            log.error(traceback.format_exc())
+
+            with self.lock:
+                if len(symbols) > 1 and symbols[1] in self.matches:
+                    self.abort(symbols[1])
+
+            res = "aborted"
+
+        return res
+
+    def dispatch(self, symbols, ip, timing, symbol_factory):
+        # get head
+        if len(symbols) == 0:
+            log.warning('Empty symbols')
+            return self.handle_info()
+
+        head = symbols[0]
+        timing.what = head.lower()
+        self.counters["requests", timing.what] += 1
+        if len(symbols) > 1:
+            timing.match_id = symbols[1]
+            self.get_calibrator(ip).on_receive(timing)
+
+        if head.lower() == "info":
+            return self.handle_info()
+
+        elif head.lower() == "start":
+            log.debug(str(symbols))
+            return self.handle_start(symbols, timing, self.get_calibrator(ip), symbol_factory)
+
+        elif head.lower() == "play":
+            log.debug(str(symbols))
+            return self.handle_play(symbols, timing)
+
+        elif head.lower() == "stop":
+            log.debug(str(symbols))
+            return self.handle_stop(symbols)
+
+        elif head.lower() == "abort":
+            log.debug(str(symbols))
+            return self.handle_abort(symbols)
+
+        log.error("UNHANDLED REQUEST %s" % symbols)
+        return "busy"
+
+    def wait_for(self, pending):
+        ' in the connection thread '
+        task = pending.task
+        if not task.wait(max(0.0, pending.deadline_time - time.time())):
+            res = pending.on_overrun()
+            if res is not None:
+                return res
+
+            # nothing to say yet, have to wait
+            task.wait()
+
+        # the match was aborted by run_or_abort()
+        if task.error is not None:
+            return "aborted"
+
+        return task.result
+
+    def run_or_abort(self, served, fn, *args):
+        ' on the executor.  Errors abort the match, even if the reply has already been sent. '
+        try:
+            return fn(*args)
+
+        except Exception:
+            with self.lock:
+                if self.matches.get(served.match.match_id) is served:
+                    self.abort(served.match.match_id)
+            raise
+
+    def handle_info(self):
+        cur_time = time.time()
+
+        # do info_counts or we get reports of "0 infos in the last minute"
+        self.info_counts += 1
+        if cur_time - self.last_info_time > 60:
+            log.debug("Got %s infos in last minute" % self.info_counts)
+            self.info_counts = 0
+            self.last_info_time = cur_time
+
+        if len(self.matches) < self.max_matches:
+            return "((name %s) (status available))" % self.player.get_name()
+        else:
+            return "((name %s) (status busy))" % self.player.get_name()
+
+    def get_served(self, symbols, what):
+        match_id = symbols[1]
+        served = self.matches.get(match_id)
+        if served is None:
+            log.warning("rx'd '%s' for unknown match %s (playing %s)" % (what, match_id, self.matches.keys()))
+        return served
+
+    def handle_start(self, symbols, timing, calibrator, symbol_factory):
+        assert len(symbols) == 6
+        match_id = symbols[1]
+        role = symbols[2]
+        gdl = symbols[3]
+        meta_time = int(symbols[4])
+        move_time = int(symbols[5])
+
+        if match_id in self.matches or len(self.matches) >= self.max_matches:
+            log.debug("GOT A START message for %s while already playing %s" % (match_id, self.matches.keys()))
+            self.counters["matches_refused", None] += 1
+            return "busy"
+
+        log.info("Starting new match %s" % match_id)
+        self.counters["matches_started", None] += 1
+        if self.player_factory is None:
+            served = ServedMatch(None, self.shared_executor, calibrator, symbol_factory)
+            player = self.player
+
+        else:
+            served = ServedMatch(None, Executor("ggp_%s" % match_id), calibrator, symbol_factory,
+                                 self.scheduler.allocate(match_id))
+            player = self.player_factory()
+            player.set_resources(served.allocation.threads, served.allocation.memory)
+
+        served.match = match.Match(match_id, role, meta_time, move_time, player, gdl,
+                                   cushion_time=calibrator.get_cushion())
+        self.matches[match_id] = served
+
+        # start gameserver timeout
+        self.update_gameserver_timeout(served, meta_time)
+
+        task = served.lock.submit(self.run_or_abort, served, self.start_match, served, timing)
+        return Pending(task, timing, deadline(served.match, meta_time), lambda: "ready")
+
+    def start_match(self, served, timing):
+        ' on the executor '
+        try:
+            served.match.do_start()
+            add_timings(timing, served.match.timings)
+            return "ready"
+
+        except match.BadGame:
+            log.error("Bad game for match %s" % served.match.match_id)
+            with self.lock:
+                if self.matches.get(served.match.match_id) is served:
+                    self.abort(served.match.match_id)
+            return "busy"
+
+    def handle_play(self, symbols, timing):
+        assert len(symbols) == 3
+        served = self.get_served(symbols, "play")
+        if served is None:
+            return "busy"
+
+        move = play_move(symbols[2])
+
+        # update gameserver timeout
+        the_match = served.match
+        self.update_gameserver_timeout(served, the_match.move_time)
+
+        the_match.cushion_time = served.calibrator.get_cushion()
+        task = served.lock.submit(self.run_or_abort, served, self.play_match, the_match, move, timing)
+        return Pending(task, timing, deadline(the_match, the_match.move_time), the_match.overrun_move)
+
+    def play_match(self, the_match, move, timing):
+        ' on the executor '
+        res = the_match.do_play(move)
+        add_timings(timing, the_match.timings)
+        return res
+
+    def handle_stop(self, symbols):
+        assert len(symbols) == 3
+        served = self.get_served(symbols, "stop")
+        if served is None:
+            return "busy"
+
+        move = symbols[2]
+
+        # XXX bug with standford 'player checker'??? XXX need to find out what is going on here?
+        if isinstance(move, str) and move.lower != "nil":
+            move = served.symbol_factory.symbolize("( %s )" % move)
+
+        self.remove(served)
+        self.counters["matches_completed", None] += 1
+        log.info("releasing %d symbols of %s" % (served.symbol_factory.symbol_count(), served.match.match_id))
+
+        # nothing is sent back to the gamemaster, so reply straight away
+        served.lock.submit(self.stop_match, served.match, move)
+        self.release_executor(served)
+        return "done"
+
+    def stop_match(self, the_match, move):
+        ' on the executor '
+        res = the_match.do_play(move)
+        if res != "done":
+            log.error("Game was NOT done %s" % the_match.match_id)
+            the_match.do_abort()
+
+        else:
+            the_match.do_stop()
+
+    def handle_abort(self, symbols):
+        assert len(symbols) == 2
+        served = self.get_served(symbols, "abort")
+        if served is None:
+            return "busy"
+
+        self.abort(served.match.match_id)
+        return "aborted"
+
+    def remove(self, served):
+        ' the match is no longer being played, frees its slot '
+        self.matches.pop(served.match.match_id, None)
+        served.calibrator.forget(served.match.match_id)
+        if self.scheduler is not None:
+            self.scheduler.release(served.match.match_id)
+
+        # cancel any timeout callbacks
+        self.update_gameserver_timeout(served, None)
+
+    def release_executor(self, served):
+        if served.lock is not self.shared_executor:
+            served.lock.shutdown()
+
+    def abort(self, match_id):
+        served = self.matches[match_id]
+        self.remove(served)
+        self.counters["matches_aborted", None] += 1
+
+        # the match may still be in use on the executor, so abort it after that is done
+        served.lock.submit(self.abort_match, served.match)
+        self.release_executor(served)
+
+    def abort_match(self, the_match):
+        try:
+            the_match.do_abort()
+        except Exception as exc:
+            log.critical("CRITICAL ERROR - during abort: %s" % exc)
+            log.critical(traceback.format_exc())
+
+    def update_gameserver_timeout(self, served, wait_time):
+        # cancel the current timeout
+        if served.timeout_call is not None:
+            served.timeout_call.cancel()
+            served.timeout_call = None
+
+        if wait_time is not None:
+            served.timeout_call = threading.Timer(wait_time + GAMESERVER_TIMEOUT,
+                                                  self.gameserver_timeout, [served])
+            served.timeout_call.daemon = True
+            served.timeout_call.start()
+
+    def gameserver_timeout(self, served):
+        log.critical("Timeout from server - forcing aborting %s" % served.match.match_id)
+
+        with self.lock:
+            served.timeout_call = None
+            if self.matches.get(served.match.match_id) is served:
+                self.abort(served.match.match_id)
+
+
+###############################################################################
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        ggp = self.server.ggp
+        timing = RequestTiming()
+
+        length = int(self.headers.getheader("content-length") or 0)
+        content = self.rfile.read(length)
+
+        res = ggp.handle(content, self.client_address[0], timing)
+        timing.mark("process")
+
+        self.send_text(format_response(res), "application/json")
+        timing.mark("serialise")
+
+        ggp.on_sent(self.client_address[0], timing)
+
+    def do_GET(self):
+        ggp = self.server.ggp
+        if self.path == METRICS_PATH:
+            self.send_text(ggp.render_metrics(), metrics.CONTENT_TYPE)
+        else:
+            log.debug("Got GET request from: %s" % self.client_address[0])
+            self.send_text(ggp.handle("", self.client_address[0], RequestTiming()), "application/json")
+
+    def send_text(self, text, content_type):
+        self.send_response(200)
+
+        # 'CORS' - as per GGPServer
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET')
+        self.send_header('Access-Control-Allow-Headers', 'x-prototype-version,x-requested-with')
+        self.send_header('Access-Control-Max-Age', 2520)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', len(text))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, fmt, *args):
+        log.verbose("%s %s" % (self.client_address[0], fmt % args))
+
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def create_server(ggp, port, host=""):
+    ' returns the http server for ggp (a LightGGPServer), call serve_forever() on it.  Port 0 picks a free port. '
+    httpd = ThreadedHTTPServer((host, port), RequestHandler)
+    httpd.ggp = ggp
+    return httpd
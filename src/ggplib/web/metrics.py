@@ -0,0 +1,163 @@
+''' the state of a GGPServer, its players and the game database as plain text in the exposition
+format (as scraped by prometheus).  Served on GET /metrics (see server.py).
+
+Everything here runs on the reactor thread, so only python side state is read - the player
+telemetry is that recorded by the match after each move, rather than asking the (maybe searching)
+player.
+'''
+
+import resource
+
+from ggplib.db import lookup
+from ggplib.web.common import ROOT_SYMBOLS
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+PREFIX = "ggplib_"
+
+COUNTER_HELP = dict(matches_started="Matches started",
+                    matches_completed="Matches played to the end",
+                    matches_aborted="Matches aborted (by the gamemaster, timeouts or errors)",
+                    matches_refused="Starts refused, as already playing",
+                    requests="Requests received, by type")
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Exposition(object):
+    ''' the samples of a metric family must be together in the output, so samples are collected per
+        family (in the order the families were first added), and rendered at the end. '''
+
+    def __init__(self):
+        # name -> list of lines, the first two are the HELP and TYPE lines
+        self.families = {}
+        self.order = []
+
+    def add(self, name, metric_type, help_text, value, **labels):
+        ' metric_type is counter or gauge.  Values of None are skipped. '
+        if value is None:
+            return
+
+        name = PREFIX + name
+        lines = self.families.get(name)
+        if lines is None:
+            lines = self.families[name] = ["# HELP %s %s" % (name, help_text),
+                                           "# TYPE %s %s" % (name, metric_type)]
+            self.order.append(name)
+
+        if labels:
+            label_str = ",".join('%s="%s"' % (k, escape(v)) for k, v in sorted(labels.items()))
+            lines.append("%s{%s} %s" % (name, label_str, value))
+        else:
+            lines.append("%s %s" % (name, value))
+
+    def render(self):
+        return "\n".join(line for name in self.order for line in self.families[name]) + "\n"
+
+
+def get_rss():
+    ' resident set size in bytes (the peak, where /proc is not available) '
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+
+    except (IOError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def last_telemetry(the_match):
+    for info in reversed(the_match.move_info):
+        if info["telemetry"]:
+            return info["telemetry"]
+    return None
+
+
+def add_server(e, ggp):
+    for (name, what), value in sorted(ggp.counters.items()):
+        labels = dict(type=what) if what else {}
+        e.add(name + "_total", "counter", COUNTER_HELP.get(name, name), value, **labels)
+
+    e.add("active_matches", "gauge", "Matches being played", len(ggp.matches))
+    e.add("root_symbols", "gauge", "Symbols interned for all matches (gdl and protocol keywords)",
+          ROOT_SYMBOLS.symbol_count())
+    e.add("max_matches", "gauge", "Matches that can be played at once", ggp.max_matches)
+
+    for ip, calibrator in sorted(ggp.calibrators.items()):
+        e.add("cushion_seconds", "gauge", "Calibrated cushion, per game server", calibrator.get_cushion(), ip=ip)
+
+        for phase, (p50, p95) in sorted(calibrator.summary().items()):
+            for quantile, value in (("0.5", p50), ("0.95", p95)):
+                # a gauge (a summary would need _sum and _count)
+                e.add("request_phase_seconds", "gauge", "Time in each phase of a request, per game server",
+                      value, ip=ip, phase=phase, quantile=quantile)
+
+
+def add_matches(e, ggp):
+    for match_id, served in sorted(ggp.matches.items()):
+        the_match = served.match
+        game_info = getattr(the_match, "game_info", None)
+        e.add("match_info", "gauge", "Matches being played", 1,
+              match_id=match_id, role=the_match.role,
+              game=game_info.game if game_info else "",
+              player=the_match.player.get_name())
+
+        e.add("match_depth", "gauge", "Moves played in the match", the_match.game_depth, match_id=match_id)
+
+        e.add("match_symbols", "gauge", "Symbols interned for the match",
+              served.symbol_factory.symbol_count(), match_id=match_id)
+        e.add("match_symbol_bytes", "gauge", "Approximate memory of the symbols interned for the match",
+              served.symbol_factory.byte_size(), match_id=match_id)
+
+        if the_match.history is not None:
+            e.add("match_history_bytes", "gauge", "Memory used by the match history",
+                  the_match.history.byte_size(), match_id=match_id)
+
+        if served.allocation is not None:
+            e.add("match_allocated_threads", "gauge", "Threads allocated to the match by the scheduler",
+                  served.allocation.threads, match_id=match_id)
+            e.add("match_allocated_memory_bytes", "gauge", "Tree memory allocated to the match by the scheduler",
+                  served.allocation.memory, match_id=match_id)
+
+        telemetry = last_telemetry(the_match)
+        if telemetry is None or "rollouts" not in telemetry:
+            continue
+
+        if telemetry["search_time"] > 0:
+            e.add("rollouts_per_second", "gauge", "Rollouts per second of the last search",
+                  telemetry["rollouts"] / telemetry["search_time"], match_id=match_id)
+
+        e.add("tree_playouts", "gauge", "Tree playouts of the last search",
+              telemetry["tree_playouts"], match_id=match_id)
+        e.add("tree_nodes", "gauge", "Nodes in the tree after the last search",
+              telemetry["number_of_nodes"], match_id=match_id)
+        e.add("tree_memory_bytes", "gauge", "Memory allocated by the tree after the last search",
+              telemetry["allocated_memory"], match_id=match_id)
+
+
+def add_database(e):
+    # not loaded until the first match
+    db = lookup.the_database
+    if db is None:
+        return
+
+    lookups = db.gdl_cache_hits + db.gdl_cache_misses
+    e.add("lookup_cache_hits_total", "counter", "Game lookups answered from the gdl cache", db.gdl_cache_hits)
+    e.add("lookup_cache_misses_total", "counter", "Game lookups by signature", db.gdl_cache_misses)
+    if lookups:
+        e.add("lookup_cache_hit_rate", "gauge", "Fraction of game lookups answered from the gdl cache",
+              db.gdl_cache_hits / float(lookups))
+
+    for game, info in sorted(db.game_mapping.items()):
+        e.add("statemachine_build_seconds", "gauge", "Time to build the statemachine of a game",
+              info.build_time, game=game)
+
+
+def render(ggp):
+    e = Exposition()
+    add_server(e, ggp)
+    add_matches(e, ggp)
+    add_database(e)
+    e.add("resident_memory_bytes", "gauge", "Resident set size of the process", get_rss())
+    return e.render()
@@ -0,0 +1,65 @@
+''' divides a budget of threads and tree memory between the concurrent matches of a server.
+
+The c++ players size their trees (and rollout thread pools) when they are created, at the start of a
+match, so an allocation cannot change once a match is running.  Each match gets an equal share of
+the budget per match slot.  A match needs at least one thread (for its search), so there are never
+more slots than threads - further matches are refused.  The threads of a share include the search
+thread (see MatchPlayer.set_resources()).
+'''
+
+from ggplib.util import log
+
+
+class Allocation(object):
+    def __init__(self, match_id, threads, memory):
+        self.match_id = match_id
+        self.threads = threads
+        self.memory = memory
+
+    def __repr__(self):
+        return "(%s threads:%d memory:%dMB)" % (self.match_id, self.threads, self.memory / (1024 * 1024))
+
+
+class ResourceScheduler(object):
+    def __init__(self, max_matches, threads, memory):
+        assert max_matches >= 1 and threads >= 1
+        if max_matches > threads:
+            log.warning("scheduler: only %d threads, playing %d matches at once rather than %d" % (threads,
+                                                                                                  threads,
+                                                                                                  max_matches))
+            max_matches = threads
+
+        self.max_matches = max_matches
+        self.threads = threads
+        self.memory = memory
+
+        # match_id -> Allocation
+        self.allocations = {}
+
+    def is_full(self):
+        return len(self.allocations) >= self.max_matches
+
+    def allocate(self, match_id):
+        ' returns an Allocation, or None if there are no free slots '
+        assert match_id not in self.allocations
+        if self.is_full():
+            return None
+
+        allocation = Allocation(match_id,
+                                self.threads // self.max_matches,
+                                self.memory // self.max_matches)
+
+        self.allocations[match_id] = allocation
+        log.info("scheduler: allocated %s, %d/%d matches" % (allocation,
+                                                             len(self.allocations),
+                                                             self.max_matches))
+        return allocation
+
+    def release(self, match_id):
+        self.allocations.pop(match_id, None)
+
+    def allocated_threads(self):
+        return sum(a.threads for a in self.allocations.values())
+
+    def allocated_memory(self):
+        return sum(a.memory for a in self.allocations.values())
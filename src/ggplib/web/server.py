@@ -6,62 +6,106 @@ import sys
 import time
 import pprint
 import traceback
+import collections
 
 from twisted.internet import reactor
-from twisted.internet import task
+from twisted.internet import threads
+from twisted.internet import defer
+from twisted.python import failure
 
 from twisted.web import server
 from twisted.web.resource import Resource
 
-from ggplib.util.symbols import SymbolFactory, ListTerm
+from ggplib.util.timing import RequestTiming, CushionCalibrator
 from ggplib.util import log
 
 from ggplib.player import match
+from ggplib.web.scheduler import ResourceScheduler
+from ggplib.web import metrics
+from ggplib.web.common import (GAMESERVER_TIMEOUT, CUSHION_TIME, METRICS_PATH, ServedMatch,
+                               deadline, play_move, add_timings, format_response,
+                               symbol_factory_for)
 
 
-###################################################################################################
-# timeout if we don't hear anything for at least this time
-
-GAMESERVER_TIMEOUT = 60 * 20
-
-###################################################################################################
-
-# Indicate how much time to give for communication between gamemaster and player.  This is useful
-# for when matches are scheduled at other locations around the world and the latency can cause
-# timeouts.
-
-CUSHION_TIME = 1.5
-
 ###############################################################################
 
 class GGPServer(Resource):
-    ''' a server deal withs the ggp web service like protocol.  It has only one player, which is
-      passed into each new match. '''
+    ''' a server deal withs the ggp web service like protocol.
+
+      Either it has only one player (set_player()), which is passed into each new match - and so
+      plays one match at a time.  Or a player factory (set_player_factory()), where each match gets
+      its own player, and up to max_matches are played at once.  The threads and tree memory of the
+      players are divided between the matches by a ResourceScheduler.  The game database and the
+      statemachines built from it are per process, so are shared by all the matches.  Symbols are
+      interned per match (see common.ROOT_SYMBOLS).
+
+      start, play and stop run on the twisted thread pool - one at a time for a match, in the order
+      they were received.  cffi releases the GIL for the duration of the native calls, so c++
+      players search without blocking the reactor (or each other). '''
 
-    symbol_factory = SymbolFactory()
-    current_match = None
     player = None
+    player_factory = None
+    scheduler = None
+    max_matches = 1
     last_info_time = 0
     info_counts = 0
 
-    timeout_deferred = None
+    def __init__(self):
+        Resource.__init__(self)
+
+        # match_id -> ServedMatch
+        self.matches = {}
+
+        # with a single player, all matches share the one lock (and player)
+        self.shared_lock = defer.DeferredLock()
+
+        # game server ip -> CushionCalibrator
+        self.calibrators = {}
+
+        # (name, type) -> count, see metrics.COUNTER_HELP
+        self.counters = collections.Counter()
 
     def set_player(self, player):
         self.player = player
+        self.player_factory = None
+        self.scheduler = None
+        self.max_matches = 1
+
+    def set_player_factory(self, player_factory, max_matches, threads, memory):
+        ''' player_factory() returns a new player for each match.  threads and memory (bytes) are
+            the totals for all the matches. '''
+        self.player_factory = player_factory
+        self.player = player_factory()
+        self.scheduler = ResourceScheduler(max_matches, threads, memory)
+
+        # (may be fewer, if there are not enough threads)
+        self.max_matches = self.scheduler.max_matches
+
+        # the thread pool needs a thread per match
+        reactor.suggestThreadPoolSize(self.max_matches + 2)
+
+    def get_calibrator(self, ip):
+        if ip not in self.calibrators:
+            self.calibrators[ip] = CushionCalibrator(CUSHION_TIME)
+        return self.calibrators[ip]
 
     def getChild(self, *args):
         return self
 
     def render_GET(self, request):
+        if request.path == METRICS_PATH:
+            request.setHeader('Content-type', metrics.CONTENT_TYPE)
+            return metrics.render(self)
+
         log.debug("Got GET request from: %s" % request.getClientIP())
-        return self.handle(request)
+        return self.handle(request, RequestTiming())
 
     def render_POST(self, request):
         # log.debug("Got POST request from: %s" % request.getClientIP())
         # log.debug("HEADERS : %s" % pprint.pformat(request.getAllHeaders()))
 
-        res = self.handle(request)
-        res = res.replace('(', ' ( ').replace(')', ' ) ')
+        timing = RequestTiming()
+        res = self.handle(request, timing)
 
         # 'CORS' - stuff I don't understand.  Was needed to run standford 'player checker'.
         request.setHeader('Access-Control-Allow-Origin', '*')
@@ -71,17 +115,85 @@ class GGPServer(Resource):
         request.setHeader('Access-Control-Max-Age', 2520)
         request.setHeader('Content-type', 'application/json')
 
-        return res
+        if isinstance(res, defer.Deferred):
+            res.addCallback(self.finish_request, request, timing)
+            return server.NOT_DONE_YET
+
+        return format_response(res)
+
+    def finish_request(self, res, request, timing):
+        if request.finished or request._disconnected:
+            log.warning("request gone before response %s was sent" % res)
+            return
+
+        timing.mark("process")
+        request.write(format_response(res))
+        request.finish()
+        timing.mark("serialise")
+
+        self.get_calibrator(request.getClientIP()).on_sent(timing)
+        log.debug("%s %s timings %s" % (timing.what, timing.match_id,
+                                        " ".join("%s:%.3f" % kv for kv in sorted(timing.phases.items()))))
+
+    def on_error(self, fail, match_id):
+        log.error("ERROR - aborting %s: %s" % (match_id, fail.getErrorMessage()))
+        log.error(fail.getTraceback())
+
+        if match_id in self.matches:
+            self.abort(match_id)
+
+        return "aborted"
+
+    def run_in_thread(self, served, fn, *args):
+        ' runs fn(*args) on the thread pool, after any previous work for the match.  Returns a deferred. '
+        return served.lock.run(threads.deferToThread, fn, *args)
+
+    def with_deadline(self, d, wait_time, on_overrun, match_id):
+        ''' returns a deferred which fires with the result of d, or with on_overrun() if d has not
+            fired after wait_time seconds (and on_overrun() has something to say, ie is not None).
+            The work behind d carries on regardless.  Errors abort the match. '''
+        result = defer.Deferred()
+
+        def overrun():
+            if not result.called:
+                res = on_overrun()
+                if res is not None:
+                    result.callback(res)
+
+        delayed_call = reactor.callLater(max(0.0, wait_time), overrun)
+
+        def done(res):
+            if delayed_call.active():
+                delayed_call.cancel()
+
+            if isinstance(res, failure.Failure):
+                res = self.on_error(res, match_id)
+
+            if not result.called:
+                result.callback(res)
+
+        d.addBoth(done)
+        return result
 
-    def handle(self, request):
+    def get_served(self, symbols, what):
+        match_id = symbols[1]
+        served = self.matches.get(match_id)
+        if served is None:
+            log.warning("rx'd '%s' for unknown match %s (playing %s)" % (what, match_id, self.matches.keys()))
+        return served
+
+    def handle(self, request, timing):
         content = request.content.getvalue()
 
         # Tiltyard seems to ping with empty content...
         if content == "":
             return self.handle_info()
 
+        symbols = []
         try:
-            symbols = list(self.symbol_factory.symbolize(content))
+            symbol_factory = symbol_factory_for(self.matches, content)
+            symbols = list(symbol_factory.symbolize(content))
+            timing.mark("parse")
 
             # get head
             if len(symbols) == 0:
@@ -89,17 +201,23 @@ class GGPServer(Resource):
                 return self.handle_info()
 
             head = symbols[0]
+            timing.what = head.lower()
+            self.counters["requests", timing.what] += 1
+            if len(symbols) > 1:
+                timing.match_id = symbols[1]
+                self.get_calibrator(request.getClientIP()).on_receive(timing)
             if head.lower() == "info":
                 res = self.handle_info()
 
             elif head.lower() == "start":
                 log.debug("HEADERS : %s" % pprint.pformat(request.getAllHeaders()))
                 log.debug(str(symbols))
-                res = self.handle_start(symbols)
+                res = self.handle_start(symbols, timing, self.get_calibrator(request.getClientIP()),
+                                        symbol_factory)
 
             elif head.lower() == "play":
                 log.debug(str(symbols))
-                res = self.handle_play(symbols)
+                res = self.handle_play(symbols, timing)
 
             elif head.lower() == "stop":
                 log.debug(str(symbols))
@@ -116,8 +234,8 @@ class GGPServer(Resource):
             log.error("ERROR - aborting: %s" % exc)
             log.error(traceback.format_exc())
 
-            if self.current_match:
-                self.abort()
+            if len(symbols) > 1 and symbols[1] in self.matches:
+                self.abort(symbols[1])
 
             res = "aborted"
 
@@ -133,12 +251,12 @@ class GGPServer(Resource):
             self.info_counts = 0
             self.last_info_time = cur_time
 
-        if self.current_match is None:
+        if len(self.matches) < self.max_matches:
             return "((name %s) (status available))" % self.player.get_name()
         else:
             return "((name %s) (status busy))" % self.player.get_name()
 
-    def handle_start(self, symbols):
+    def handle_start(self, symbols, timing, calibrator, symbol_factory):
         assert len(symbols) == 6
         match_id = symbols[1]
         role = symbols[2]
@@ -146,118 +264,165 @@ class GGPServer(Resource):
         meta_time = int(symbols[4])
         move_time = int(symbols[5])
 
-        if self.current_match is not None:
-            log.debug("GOT A START message for %s while already playing match" % match_id)
+        if match_id in self.matches:
+            log.warning("GOT A START message for %s while already playing it" % match_id)
+            self.counters["matches_refused", None] += 1
             return "busy"
+
+        if len(self.matches) >= self.max_matches:
+            log.debug("GOT A START message for %s while already playing %s" % (match_id, self.matches.keys()))
+            self.counters["matches_refused", None] += 1
+            return "busy"
+
+        log.info("Starting new match %s" % match_id)
+        self.counters["matches_started", None] += 1
+        if self.player_factory is None:
+            served = ServedMatch(None, self.shared_lock, calibrator, symbol_factory)
+            player = self.player
+
         else:
-            log.info("Starting new match %s" % match_id)
-            self.current_match = match.Match(match_id, role, meta_time, move_time, self.player, gdl, cushion_time=CUSHION_TIME)
-            try:
-                # start gameserver timeout
-                self.update_gameserver_timeout(self.current_match.meta_time)
+            served = ServedMatch(None, defer.DeferredLock(), calibrator, symbol_factory,
+                                 self.scheduler.allocate(match_id))
+            player = self.player_factory()
+            player.set_resources(served.allocation.threads, served.allocation.memory)
 
-                self.current_match.do_start()
-                return "ready"
+        served.match = match.Match(match_id, role, meta_time, move_time, player, gdl,
+                                   cushion_time=calibrator.get_cushion())
+        self.matches[match_id] = served
 
-            except match.BadGame:
-                return "busy"
+        # start gameserver timeout
+        self.update_gameserver_timeout(served, meta_time)
 
-    def handle_play(self, symbols):
-        assert len(symbols) == 3
-        match_id = symbols[1]
-        if self.current_match is None:
-            log.warning("rx'd play for non-current match %s" % match_id)
-            return "busy"
-        if self.current_match.match_id != match_id:
-            log.error("rx'd play different from current match (%s != %s)" % (match_id, self.current_match.match_id))
+        def started(res):
+            if res == "busy" and self.matches.get(match_id) is served:
+                self.abort(match_id)
+            return res
+
+        d = self.run_in_thread(served, self.start_match, served.match, timing)
+        d.addCallback(started)
+        return self.with_deadline(d, deadline(served.match, meta_time), lambda: "ready", match_id)
+
+    def start_match(self, the_match, timing):
+        ' on the thread pool '
+        try:
+            the_match.do_start()
+            add_timings(timing, the_match.timings)
+            return "ready"
+
+        except match.BadGame:
+            log.error("Bad game for match %s" % the_match.match_id)
             return "busy"
 
-        move = symbols[2]
+    def handle_play(self, symbols, timing):
+        assert len(symbols) == 3
+        served = self.get_served(symbols, "play")
+        if served is None:
+            return "busy"
 
-        if isinstance(move, ListTerm):
-            move = list(move)
-        else:
-            assert move.lower() == 'nil', "Move is %s" % move
-            move = None
+        move = play_move(symbols[2])
 
         # update gameserver timeout
-        self.update_gameserver_timeout(self.current_match.move_time)
-        return self.current_match.do_play(move)
+        the_match = served.match
+        self.update_gameserver_timeout(served, the_match.move_time)
+
+        the_match.cushion_time = served.calibrator.get_cushion()
+        d = self.run_in_thread(served, self.play_match, the_match, move, timing)
+        return self.with_deadline(d, deadline(the_match, the_match.move_time),
+                                  the_match.overrun_move, the_match.match_id)
+
+    def play_match(self, the_match, move, timing):
+        ' on the thread pool '
+        res = the_match.do_play(move)
+        add_timings(timing, the_match.timings)
+        return res
 
     def handle_stop(self, symbols):
         assert len(symbols) == 3
-        match_id = symbols[1]
-        if self.current_match is None:
-            log.warning("rx'd 'stop' for non-current match %s" % match_id)
-            return "busy"
-        if self.current_match.match_id != match_id:
-            log.error("rx'd 'stop' different from current match (%s != %s)" % (match_id, self.current_match.match_id))
+        served = self.get_served(symbols, "stop")
+        if served is None:
             return "busy"
 
         move = symbols[2]
 
         # XXX bug with standford 'player checker'??? XXX need to find out what is going on here?
         if isinstance(move, str) and move.lower != "nil":
-            move = self.symbol_factory.symbolize("( %s )" % move)
+            move = served.symbol_factory.symbolize("( %s )" % move)
+
+        self.remove(served)
+        self.counters["matches_completed", None] += 1
+        log.info("releasing %d symbols of %s" % (served.symbol_factory.symbol_count(), served.match.match_id))
+        log.info("cushion for %s now %.2f, timings (p50, p95) %s" % (served.match.match_id,
+                                                                     served.calibrator.get_cushion(),
+                                                                     served.calibrator.summary()))
+
+        # nothing is sent back to the gamemaster, so reply straight away
+        d = self.run_in_thread(served, self.stop_match, served.match, move)
+        d.addErrback(log_failure, "stop of %s" % served.match.match_id)
+        return "done"
 
-        res = self.current_match.do_play(move)
+    def stop_match(self, the_match, move):
+        ' on the thread pool '
+        res = the_match.do_play(move)
         if res != "done":
-            log.error("Game was NOT done %s" % self.current_match.match_id)
+            log.error("Game was NOT done %s" % the_match.match_id)
+            the_match.do_abort()
 
         else:
-            # cancel any timeout callbacks
-            self.update_gameserver_timeout(None)
-            self.current_match.do_stop()
-
-        self.current_match = None
-        return "done"
+            the_match.do_stop()
 
     def handle_abort(self, symbols):
         assert len(symbols) == 2
-        match_id = symbols[1]
-
-        if self.current_match is None:
-            log.warning("rx'd 'abort' for non-current match %s" % match_id)
+        served = self.get_served(symbols, "abort")
+        if served is None:
             return "busy"
 
-        if self.current_match.match_id != match_id:
-            log.error("rx'd 'abort' different from current match (%s != %s)" % (match_id, self.current_match.match_id))
-            return "busy"
+        self.abort(served.match.match_id)
+        return "aborted"
+
+    def remove(self, served):
+        ' the match is no longer being played, frees its slot '
+        self.matches.pop(served.match.match_id, None)
+        served.calibrator.forget(served.match.match_id)
+        if self.scheduler is not None:
+            self.scheduler.release(served.match.match_id)
 
         # cancel any timeout callbacks
-        self.abort()
-        return "aborted"
+        self.update_gameserver_timeout(served, None)
 
-    def abort(self):
-        assert self.current_match is not None
+    def abort(self, match_id):
+        served = self.matches[match_id]
+        self.remove(served)
+        self.counters["matches_aborted", None] += 1
 
+        # the match may still be in use on the thread pool, so abort it after that is done
+        served.lock.run(self.abort_match, served.match)
+
+    def abort_match(self, the_match):
         try:
-            res = self.current_match.do_abort()
+            the_match.do_abort()
         except Exception as exc:
             log.critical("CRITICAL ERROR - during abort: %s" % exc)
             log.critical(traceback.format_exc())
 
-        # always set it none
-        self.current_match = None
-
-        # and cancel any timeouts
-        self.update_gameserver_timeout(None)
-
-    def update_gameserver_timeout(self, wait_time):
+    def update_gameserver_timeout(self, served, wait_time):
         # cancel the current timeout
-        if self.timeout_deferred is not None:
-            self.timeout_deferred.cancel()
-            self.timeout_deferred = None
+        if served.timeout_call is not None:
+            if served.timeout_call.active():
+                served.timeout_call.cancel()
+            served.timeout_call = None
 
         if wait_time is not None:
             when_time = wait_time + GAMESERVER_TIMEOUT
-            self.timeout_deferred = task.deferLater(reactor, when_time, self.gameserver_timeout)
+            served.timeout_call = reactor.callLater(when_time, self.gameserver_timeout, served)
+
+    def gameserver_timeout(self, served):
+        log.critical("Timeout from server - forcing aborting %s" % served.match.match_id)
 
-    def gameserver_timeout(self):
-        log.critical("Timeout from server - forcing aborting")
+        served.timeout_call = None
+        if self.matches.get(served.match.match_id) is served:
+            self.abort(served.match.match_id)
 
-        if self.current_match:
-            self.current_match.do_abort()
-            self.current_match = None
 
-        self.timeout_deferred = None
+def log_failure(fail, what):
+    log.error("ERROR during %s: %s" % (what, fail.getErrorMessage()))
+    log.error(fail.getTraceback())
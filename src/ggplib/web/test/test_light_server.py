@@ -0,0 +1,99 @@
+import time
+import httplib
+import threading
+
+from ggplib.util import log
+from ggplib.player.legal_player import LegalPlayer
+from ggplib.db.helper import get_gdl_for_game
+from ggplib.util.timing import RollingPercentiles
+from ggplib.web.common import deadline
+from ggplib.web.light_server import LightGGPServer, create_server
+
+MOVE_TIME = 2
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+class SlowPlayer(LegalPlayer):
+    ' overruns every move '
+
+    def on_next_move(self, finish_time):
+        time.sleep(max(0, finish_time - time.time()) + 2)
+        return LegalPlayer.on_next_move(self, finish_time)
+
+
+def post(conn, body):
+    conn.request("POST", "/", body, {"Content-Type": "text/acl"})
+    response = conn.getresponse()
+    assert response.status == 200
+    return response.read()
+
+
+def pinger(port, count, latencies):
+    # keep-alive, one connection for all the pings
+    conn = httplib.HTTPConnection("127.0.0.1", port)
+    for _ in range(count):
+        start_time = time.time()
+        assert "status" in post(conn, "(info)")
+        latencies.append(time.time() - start_time)
+        time.sleep(0.01)
+    conn.close()
+
+
+def test_match_under_info_load():
+    ggp = LightGGPServer()
+    ggp.set_player(SlowPlayer())
+
+    httpd = create_server(ggp, 0, host="127.0.0.1")
+    port = httpd.server_address[1]
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    try:
+        conn = httplib.HTTPConnection("127.0.0.1", port)
+        gdl = get_gdl_for_game("ticTacToe")
+        assert "ready" in post(conn, "(start m1 xplayer (%s\n) 5 %d)" % (gdl, MOVE_TIME))
+        assert "busy" in post(conn, "(info)")
+
+        # when the server replies for the player
+        wait_time = deadline(ggp.matches["m1"].match, MOVE_TIME)
+        assert 0 < wait_time < MOVE_TIME
+
+        latencies = []
+        pingers = [threading.Thread(target=pinger, args=(port, 50, latencies)) for _ in range(4)]
+        for t in pingers:
+            t.start()
+
+        # the player overruns, so the server replies for it at wait_time - before the move time
+        # (which leaves the rest of the cushion for a loaded machine)
+        start_time = time.time()
+        move = post(conn, "(play m1 nil)")
+        assert "mark" in move
+        assert time.time() - start_time < MOVE_TIME
+
+        for t in pingers:
+            t.join()
+
+        assert "aborted" in post(conn, "(abort m1)")
+        conn.close()
+
+        # the pings were answered while the player was searching
+        p = RollingPercentiles(len(latencies))
+        for latency in latencies:
+            p.add(latency)
+
+        log.info("info latency p50 %.4f p95 %.4f max %.4f" % (p.percentile(50), p.percentile(95), p.percentile(100)))
+        assert len(latencies) == 200
+
+        # (if the pings were queued behind the search, they would take as long as the move)
+        assert p.percentile(95) < wait_time / 2
+
+        assert "ggplib_matches_aborted_total 1" in ggp.render_metrics()
+
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
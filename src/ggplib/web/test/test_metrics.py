@@ -0,0 +1,47 @@
+from ggplib.player import get
+from ggplib.web import metrics
+from ggplib.web.server import GGPServer
+
+
+def setup():
+    from ggplib.util.init import setup_once
+    setup_once()
+
+
+def test_exposition():
+    e = metrics.Exposition()
+    e.add("things_total", "counter", "Some things", 3)
+    e.add("things_total", "counter", "Some things", 4, thing='a"b')
+    e.add("missing", "gauge", "Not known", None)
+
+    lines = e.render().splitlines()
+    assert lines == ["# HELP ggplib_things_total Some things",
+                     "# TYPE ggplib_things_total counter",
+                     "ggplib_things_total 3",
+                     'ggplib_things_total{thing="a\\"b"} 4']
+
+
+def test_exposition_families():
+    e = metrics.Exposition()
+    for match_id in ("a", "b"):
+        e.add("depth", "gauge", "Depth", 1, match_id=match_id)
+        e.add("nodes", "gauge", "Nodes", 2, match_id=match_id)
+
+    # all the samples of a family are together
+    lines = e.render().splitlines()
+    assert [l.split("{")[0] for l in lines if not l.startswith("#")] == ["ggplib_depth", "ggplib_depth",
+                                                                        "ggplib_nodes", "ggplib_nodes"]
+    assert lines.count("# TYPE ggplib_depth gauge") == 1
+
+
+def test_render_server():
+    ggp = GGPServer()
+    ggp.set_player(get.get_player("pyrandom"))
+    ggp.counters["requests", "info"] += 2
+
+    text = metrics.render(ggp)
+    assert 'ggplib_requests_total{type="info"} 2' in text
+    assert "ggplib_active_matches 0" in text
+
+    rss = [l for l in text.splitlines() if l.startswith("ggplib_resident_memory_bytes ")]
+    assert len(rss) == 1 and int(rss[0].split()[1]) > 0
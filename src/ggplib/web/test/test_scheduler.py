@@ -0,0 +1,51 @@
+from ggplib.web.scheduler import ResourceScheduler
+
+
+def test_allocate_and_release():
+    gb = 1024 * 1024 * 1024
+    scheduler = ResourceScheduler(3, 8, 12 * gb)
+
+    a = scheduler.allocate("a")
+    b = scheduler.allocate("b")
+    c = scheduler.allocate("c")
+    for allocation in (a, b, c):
+        assert allocation.threads == 2
+        assert allocation.memory == 4 * gb
+
+    # never oversubscribed
+    assert scheduler.is_full()
+    assert scheduler.allocate("d") is None
+    assert scheduler.allocated_threads() <= 8
+    assert scheduler.allocated_memory() <= 12 * gb
+
+    scheduler.release("b")
+    assert not scheduler.is_full()
+    assert scheduler.allocate("d").memory == 4 * gb
+
+    # at least one thread per match, so fewer matches than asked for
+    scheduler = ResourceScheduler(4, 2, gb)
+    assert scheduler.max_matches == 2
+    assert scheduler.allocate("a").threads == 1
+    assert scheduler.allocate("b").threads == 1
+    assert scheduler.allocate("c") is None
+    assert scheduler.allocated_threads() <= 2
+
+
+def test_player_resources():
+    from ggplib.player.simplemcts import SimpleMctsPlayer
+
+    player = SimpleMctsPlayer()
+    player.rollout_threads = 8
+    player.ponder = True
+    player.set_resources(4, 1024)
+
+    # the search thread is one of the 4
+    assert player.rollout_threads == 3
+    assert player.ponder
+    assert player.max_memory == 1024
+
+    player.set_resources(2, 1024)
+    assert player.rollout_threads == 0
+
+    player.set_resources(1, 1024)
+    assert not player.ponder